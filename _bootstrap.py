@@ -38,15 +38,27 @@ path for all of these scripts: do not add an __init__.py to a topic directory, a
 not add a file to the api_client directory whose name shadows a module from the
 standard library. Either would break every script at once.
 
+A script that works through many projects can spread them over several threads with
+run_in_parallel(). Everything the work prints for a project is held back and printed
+with that project, in the original order, so the output reads as it would if the
+projects had been processed one at a time:
+
+      api_mosaic = init(args, pool_size = args.workers)
+      for project_id, summary in run_in_parallel(set_project_filters, project_ids, args.workers):
+        ...
+
 Note that unlike the preamble it replaces, this module locates the api client from
 the position of the script rather than by splitting its path on the string
 'api_client', so the directory no longer has to carry that name.
 """
 
 import argparse
+import io
 import os
 import sys
+import threading
 
+from concurrent.futures import ThreadPoolExecutor
 from types import SimpleNamespace
 
 # If the script fails, provide an error message and exit, alternatively provide a warning
@@ -77,8 +89,9 @@ def base_parser():
 
   return parser, groups
 
-# Import the api client and open the Mosaic endpoints described by the config file
-def init(args):
+# Import the api client and open the Mosaic endpoints described by the config file. A script
+# making requests from several threads should set pool_size to at least the number of threads
+def init(args, *, pool_size = None):
 
   # The script has already put its own api_client directory on the path. Only look
   # elsewhere if a different one was asked for
@@ -99,8 +112,63 @@ def init(args):
     fail('The config file does not exist: ' + str(args.client_config))
 
   try:
-    api_mosaic = Mosaic(config_file = args.client_config)
+    if pool_size:
+      api_mosaic = Mosaic(config_file = args.client_config, pool_size = pool_size)
+    else:
+      api_mosaic = Mosaic(config_file = args.client_config)
   except Exception as e:
     fail('Failed to open the Mosaic api client. Error was: ' + str(e))
 
   return api_mosaic
+
+# Writes to stdout go to the buffer of the current thread if it has one, otherwise straight to stdout
+class _ThreadOutput(object):
+  def __init__(self, stream):
+    self.stream = stream
+    self.local = threading.local()
+
+  def write(self, text):
+    buffer = getattr(self.local, 'buffer', None)
+    return (buffer if buffer is not None else self.stream).write(text)
+
+  def flush(self):
+    self.stream.flush()
+
+  def __getattr__(self, name):
+    return getattr(self.stream, name)
+
+# Call function(item) for every item on a pool of worker threads, and yield (item, result) pairs in
+# the order of the items. The output of each call is printed when its item is yielded. If a call
+# fails, including through fail(), its output is printed, no further items are started and the
+# error is raised. With a single worker the items are processed in turn, without threads
+def run_in_parallel(function, items, workers):
+  items = list(items)
+  if not workers or workers < 2:
+    for item in items:
+      yield item, function(item)
+    return
+
+  output = _ThreadOutput(sys.stdout)
+  sys.stdout = output
+
+  def run(item):
+    output.local.buffer = io.StringIO()
+    try:
+      return output.local.buffer, function(item), None
+    except BaseException as e:
+      return output.local.buffer, None, e
+    finally:
+      output.local.buffer = None
+
+  executor = ThreadPoolExecutor(max_workers = workers)
+  try:
+    futures = [executor.submit(run, item) for item in items]
+    for item, future in zip(items, futures):
+      buffer, result, error = future.result()
+      output.stream.write(buffer.getvalue())
+      if error:
+        raise error
+      yield item, result
+  finally:
+    executor.shutdown(wait = True, cancel_futures = True)
+    sys.stdout = output.stream
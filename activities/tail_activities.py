@@ -0,0 +1,92 @@
+import json
+import os
+import shlex
+import subprocess
+import sys
+
+from pprint import pprint
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from _bootstrap import base_parser, init, warning, fail
+from activity_tailer import ActivityTailer
+
+def main():
+
+  # Parse the command line
+  args = parse_command_line()
+
+  api_mosaic = init(args, pool_size = args.workers)
+
+  # Get the projects to follow. If none are given, all projects are followed
+  project_ids = None
+  if args.project_ids:
+    project_ids = [project_id.strip() for project_id in args.project_ids.split(',')]
+  if args.collection_id:
+    collection = api_mosaic.get_project(args.collection_id)
+    collection_data = collection.get_project()
+    if not collection_data['is_collection']:
+      fail('Project ' + str(args.collection_id) + ' is not a collection')
+    project_ids = (project_ids or []) + collection_data['collection_project_ids']
+  if args.discover_interval and project_ids is not None:
+    fail('--discover_interval / -di can only be used when following all projects')
+
+  tailer = ActivityTailer(api_mosaic, project_ids, cursor_path = args.cursor, workers = args.workers, min_interval = args.min_interval, max_interval = args.max_interval, discover_interval = args.discover_interval, replay = args.replay)
+
+  # Print each activity, and optionally run a command for it. The command is given the project id, activity id and
+  # activity type as arguments, and the activity as json on stdin
+  activity_types = [activity_type.strip() for activity_type in args.activity_types.split(',')] if args.activity_types else [None]
+  for activity_type in activity_types:
+    tailer.on(activity_type, print_activity)
+    if args.command:
+      tailer.on(activity_type, lambda project_id, activity: run_command(args.command, project_id, activity))
+
+  print('Following the activities of ', len(tailer), ' projects', sep = '')
+  try:
+    for project_id, activity, errors in tailer.run(rounds = args.rounds):
+      for handler, error in errors:
+        if project_id is None:
+          warning('Failed to read the list of projects. Error was: ' + str(error))
+        elif activity is None:
+          warning('Failed to read the activities of project ' + str(project_id) + '. Error was: ' + str(error))
+        else:
+          warning('Handling activity ' + str(activity['id']) + ' of project ' + str(project_id) + ' failed. Error was: ' + str(error))
+  except ValueError as e:
+    fail(str(e))
+  except KeyboardInterrupt:
+    tailer.save()
+
+# Print an activity
+def print_activity(project_id, activity):
+  print(project_id, activity['id'], activity['type'], activity.get('message'), sep = '\t', flush = True)
+
+# Run the command for an activity, raising an exception if it fails
+def run_command(command, project_id, activity):
+  subprocess.run(shlex.split(command) + [str(project_id), str(activity['id']), activity['type']], input = json.dumps(activity), text = True, check = True)
+
+# Input options
+def parse_command_line():
+  parser, groups = base_parser()
+  project_arguments = groups.project
+  optional_arguments = groups.optional
+
+  # The projects to follow
+  project_arguments.add_argument('--project_ids', '-p', required = False, metavar = 'string', help = 'A comma separated list of project ids to follow. Default: all projects')
+  project_arguments.add_argument('--collection_id', '-l', required = False, metavar = 'integer', help = 'Follow all the projects in this collection')
+
+  # The activities to handle and what to do with them
+  optional_arguments.add_argument('--activity_types', '-t', required = False, metavar = 'string', help = 'A comma separated list of activity types to handle. Default: all')
+  optional_arguments.add_argument('--command', '-x', required = False, metavar = 'string', help = 'A command to run for each activity. It is given the project id, activity id and activity type as arguments, and the activity as json on stdin')
+  optional_arguments.add_argument('--cursor', '-u', required = False, metavar = 'string', help = 'A file to keep the newest activity handled for each project in, so a restarted tailer carries on where it stopped')
+  optional_arguments.add_argument('--replay', '-r', required = False, action = 'store_true', help = 'Handle all the past activities of projects without a cursor, not just new ones')
+
+  # Polling
+  optional_arguments.add_argument('--min_interval', '-mi', required = False, type = float, default = 30, metavar = 'float', help = 'The shortest wait in seconds between polls of a project. Default: 30')
+  optional_arguments.add_argument('--max_interval', '-ma', required = False, type = float, default = 600, metavar = 'float', help = 'The longest wait in seconds between polls of a quiet project. Default: 600')
+  optional_arguments.add_argument('--discover_interval', '-di', required = False, type = float, metavar = 'float', help = 'When following all projects, look for new projects this often, in seconds')
+  optional_arguments.add_argument('--rounds', '-n', required = False, type = int, metavar = 'integer', help = 'Stop after this many rounds of polling. Default: run until stopped')
+  optional_arguments.add_argument('--workers', '-w', required = False, type = int, default = 10, metavar = 'integer', help = 'The number of projects to poll, and handlers to run, at once. Default: 10')
+
+  return parser.parse_args()
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,285 @@
+"""
+Follow the activities of Mosaic projects as they happen, and call handlers for them, e.g.
+to start annotation when variants are added, rather than rescanning every project on a
+schedule:
+
+    from activity_tailer import ActivityTailer
+
+    tailer = ActivityTailer(mosaic, project_ids, cursor_path='tailer.json')
+    tailer.on('variants_added', start_annotation)
+    tailer.on('sample_added', lambda project_id, activity: print(project_id, activity['message']))
+    for project_id, activity, errors in tailer.run():
+        for handler, error in errors:
+            print('Handler failed', project_id, activity['id'], error)
+
+Handlers are called with (project_id, activity) on a pool of worker threads, and a
+handler registered for None is called for every activity. The types handlers are
+registered for are checked against the activity types of the instance when run() starts.
+
+Each project is polled on its own schedule. The wait before a project is polled again
+starts at min_interval seconds, grows by half after each poll that finds nothing new, up
+to max_interval, and drops back to min_interval when a poll finds something, so busy
+projects are followed closely and quiet ones cost little. The projects due in a round
+are polled concurrently through the pooled session.
+
+The newest activity handled for each project (the cursor) is saved to cursor_path after
+every round, so a restarted tailer carries on where it stopped and does not handle an
+activity twice. The cursor only moves once all the handlers of a round have returned, so
+if the tailer is stopped part way through a round, that round's activities are handled
+again on restart. A handler raising an exception does not stop the tailer; the error is
+yielded by run() and the cursor still moves on. Likewise a project whose activities
+cannot be read (e.g. a server error) is yielded with the error, and its polls are backed
+off; a project that is not found on several polls in a row is no longer followed.
+
+A project with no cursor starts from its activities of the current day that are newer
+than those seen on its first poll, unless replay is set, when all of its activities are
+handled. With discover_interval set, the list of projects is read again every
+discover_interval seconds, and new projects are followed from their first activity, so
+handlers see their project_created.
+"""
+
+import json
+import os
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from mosaic import Project, _today
+
+# The number of polls in a row on which a project is not found before it is no longer followed
+_MAX_NOT_FOUND = 3
+
+
+class ActivityTailer(object):
+    def __init__(self, mosaic, project_ids=None, *, cursor_path=None, workers=None, min_interval=30, max_interval=600, discover_interval=None, replay=False):
+        self._mosaic = mosaic
+        self.cursor_path = cursor_path
+        self.workers = workers if workers else mosaic._pool_size
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.discover_interval = discover_interval
+        self._handlers = {}
+        self._cursors = self._load_cursors()
+        self._intervals = {}
+        self._next_poll = {}
+        self._failures = {}
+        self._next_discover = None
+
+        if project_ids is None:
+            project_ids = [project_info['id'] for project_info in mosaic.get_projects()]
+            if discover_interval:
+                self._next_discover = time.monotonic() + discover_interval
+        for project_id in project_ids:
+            self.add_project(project_id, replay=replay)
+
+
+    def __repr__(self):
+        return f'ActivityTailer({len(self._next_poll)} projects)'
+
+
+    def __len__(self):
+        return len(self._next_poll)
+
+
+    def on(self, activity_type, handler):
+        """
+        Call handler(project_id, activity) for each new activity of activity_type, or of
+        any type if activity_type is None.
+        """
+        self._handlers.setdefault(activity_type, []).append(handler)
+
+
+    def add_project(self, project_id, *, replay=False):
+        """
+        Start following a project. Its first poll is made in the next round.
+        """
+        project_id = int(project_id)
+        if project_id in self._next_poll:
+            return
+        if project_id not in self._cursors:
+            self._cursors[project_id] = {'activity_id': None, 'activity_date': None, 'primed': replay}
+        self._intervals[project_id] = self.min_interval
+        self._next_poll[project_id] = time.monotonic()
+
+
+    def cursor(self, project_id):
+        """
+        Return the id of the newest activity handled for a project, or None.
+        """
+        return self._cursors.get(int(project_id), {}).get('activity_id')
+
+
+    def check_activity_types(self):
+        """
+        Raise a ValueError if a handler is registered for a type the instance does not have.
+        """
+        known = {activity_type['type'] for activity_type in self._mosaic.get_activity_types()['data']}
+        unknown = sorted(activity_type for activity_type in self._handlers if activity_type is not None and activity_type not in known)
+        if unknown:
+            raise ValueError('Unknown activity types: ' + ', '.join(unknown))
+
+
+    def poll(self, project_ids=None):
+        """
+        Read the new activities of the given projects, or of the projects due to be
+        polled, concurrently. Returns (events, failures), where events is a list of
+        (project_id, activity), oldest first within each project, and failures is a list
+        of (project_id, exception) for the projects whose activities could not be read,
+        and moves each project's schedule on. The cursors are not moved until the
+        activities are handled by run().
+        """
+        now = time.monotonic()
+        if project_ids is None:
+            project_ids = [project_id for project_id, next_poll in self._next_poll.items() if next_poll <= now]
+
+        def read(project_id):
+            cursor = self._cursors[project_id]
+            activities = {}
+            project = Project(mosaic=self._mosaic, project_id=project_id)
+            from_date = cursor['activity_date'] if cursor['primed'] else cursor['activity_date'] or _today()
+            for activity in project.get_activities(from_date=from_date):
+                if cursor['activity_id'] is None or activity['id'] > cursor['activity_id']:
+                    activities[activity['id']] = activity
+
+            return [activities[activity_id] for activity_id in sorted(activities)]
+
+        events = []
+        failures = []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [(project_id, executor.submit(read, project_id)) for project_id in project_ids]
+            for project_id, future in futures:
+                try:
+                    activities = future.result()
+                except Exception as e:
+                    failures.append((project_id, e))
+                    self._failed(project_id, e)
+                    continue
+                self._failures.pop(project_id, None)
+                cursor = self._cursors[project_id]
+
+                # The first poll of a project without a cursor only sets it, so activities from
+                # before the tailer started are not handled
+                if not cursor['primed']:
+                    self._advance(project_id, activities)
+                    cursor['primed'] = True
+                    if not cursor['activity_date']:
+                        cursor['activity_date'] = _today()
+                    activities = []
+
+                self._intervals[project_id] = self.min_interval if activities else min(self._intervals[project_id] * 1.5, self.max_interval)
+                self._next_poll[project_id] = time.monotonic() + self._intervals[project_id]
+                events.extend((project_id, activity) for activity in activities)
+
+        return events, failures
+
+
+    def run(self, *, rounds=None):
+        """
+        Poll the projects and handle their activities until stopped, or for the given
+        number of rounds. Yields (project_id, activity, errors) for each activity once its
+        handlers have returned, where errors is a list of (handler, exception) for the
+        handlers that raised one.
+
+        A project whose activities cannot be read is yielded with activity None and
+        errors [(None, exception)], and polled again later. A failed read of the list of
+        projects by discover() is yielded with project_id None. Neither stops the tailer.
+        """
+        self.check_activity_types()
+        completed = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while rounds is None or completed < rounds:
+                if self._next_discover is not None and time.monotonic() >= self._next_discover:
+                    try:
+                        self.discover()
+                    except Exception as e:
+                        self._next_discover = time.monotonic() + self.discover_interval
+                        yield None, None, [(None, e)]
+
+                events, failures = self.poll()
+                for project_id, error in failures:
+                    yield project_id, None, [(None, error)]
+                futures = [(project_id, activity, [(handler, executor.submit(handler, project_id, activity)) for handler in self._handlers_for(activity)])
+                           for project_id, activity in events]
+                for project_id, activity, handler_futures in futures:
+                    errors = []
+                    for handler, future in handler_futures:
+                        try:
+                            future.result()
+                        except Exception as e:
+                            errors.append((handler, e))
+                    yield project_id, activity, errors
+
+                for project_id in {project_id for project_id, _ in events}:
+                    self._advance(project_id, [activity for event_project_id, activity in events if event_project_id == project_id])
+                self.save()
+                completed += 1
+
+                if rounds is None or completed < rounds:
+                    wait = min(self._next_poll.values(), default=time.monotonic() + self.min_interval) - time.monotonic()
+                    if self._next_discover is not None:
+                        wait = min(wait, self._next_discover - time.monotonic())
+                    if wait > 0:
+                        time.sleep(wait)
+
+
+    def discover(self):
+        """
+        Read the list of projects, and follow any new ones from their first activity.
+        Returns the ids of the new projects.
+        """
+        new_project_ids = [project_info['id'] for project_info in self._mosaic.get_projects() if project_info['id'] not in self._next_poll]
+        for project_id in new_project_ids:
+            self.add_project(project_id, replay=True)
+        if self.discover_interval:
+            self._next_discover = time.monotonic() + self.discover_interval
+
+        return new_project_ids
+
+
+    def save(self):
+        """
+        Write the cursors to cursor_path, if it is set. The file is replaced in one step,
+        so a tailer stopped while saving leaves the previous cursors in place.
+        """
+        if not self.cursor_path:
+            return
+        cursors = {str(project_id): cursor for project_id, cursor in self._cursors.items()}
+        with open(self.cursor_path + '.tmp', 'w') as f:
+            json.dump({'projects': cursors}, f, indent=2)
+        os.replace(self.cursor_path + '.tmp', self.cursor_path)
+
+
+    def _load_cursors(self):
+        if not self.cursor_path or not os.path.exists(self.cursor_path):
+            return {}
+        with open(self.cursor_path) as f:
+            cursors = json.load(f)['projects']
+
+        return {int(project_id): cursor for project_id, cursor in cursors.items()}
+
+
+    def _failed(self, project_id, error):
+        # Back off a project that cannot be read, and stop following it once it has not been
+        # found (e.g. it was deleted) on several polls in a row
+        self._failures[project_id] = self._failures.get(project_id, 0) + 1
+        response = getattr(error, 'response', None)
+        if response is not None and response.status_code == 404 and self._failures[project_id] >= _MAX_NOT_FOUND:
+            del self._next_poll[project_id]
+            del self._intervals[project_id]
+            del self._failures[project_id]
+            return
+        self._intervals[project_id] = min(self._intervals[project_id] * 2, self.max_interval)
+        self._next_poll[project_id] = time.monotonic() + self._intervals[project_id]
+
+
+    def _handlers_for(self, activity):
+        return self._handlers.get(activity['type'], []) + self._handlers.get(None, [])
+
+
+    def _advance(self, project_id, activities):
+        cursor = self._cursors[project_id]
+        for activity in activities:
+            if cursor['activity_id'] is None or activity['id'] > cursor['activity_id']:
+                cursor['activity_id'] = activity['id']
+            if activity.get('created_at'):
+                cursor['activity_date'] = max(cursor['activity_date'] or '', str(activity['created_at'])[:10])
@@ -8,6 +8,7 @@ from pprint import pprint
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 from _bootstrap import base_parser, init, warning, fail
+from vcf_reader import VcfReader
 
 def main():
 
@@ -26,35 +27,44 @@ def main():
   else:
     project_ids = [args.project_id]
 
-  # Define the bcftools command
-  bcftools = '/scratch/ucgd/lustre-labs/marth/scratch/calypso/tools/bcftools/bcftools'
-
-  # Define the ClinVar version and vcf file
+  # Define the ClinVar version and open the vcf file and its tabix index once
   clinvar_version = 'clinvar_significance_grch38@' + str(args.clinvar_version)
   file_path = str(args.clinvar_file_path) + '/' if not args.clinvar_file_path.endswith('/') else args.clinvar_file_path
-  clinvar_file = str(args.clinvar_file_path) + 'clinvar_' + str(args.clinvar_version) + '.vcf.gz'
-
-  # Loop over all tasks associated with these projects
+  clinvar_file = file_path + 'clinvar_' + str(args.clinvar_version) + '.vcf.gz'
+  if not exists(clinvar_file):
+    fail('ClinVar vcf file ' + str(clinvar_file) + ' does not exist')
+  if not exists(clinvar_file + '.tbi'):
+    fail('ClinVar vcf file ' + str(clinvar_file) + ' has no tabix index (.tbi)')
+  clinvar = VcfReader(clinvar_file)
+
+  # Loop over all tasks associated with these projects and collect the variants with conflicting
+  # classifications. These are then looked up in the ClinVar file together, in position order
+  conflicting = []
   for task in api_mosaic.get_tasks(categories = None, completed = None, project_ids = project_ids, types = None, order_dir = None):
     project = api_mosaic.get_project(task['project_id'])
-    for variant_id in project.get_variant_set(task['variant_set_id'])['variant_ids']:
-      variant_data = project.get_variant(variant_id, include_annotation_data = 'true')
+    variant_ids = project.get_variant_set(task['variant_set_id'])['variant_ids']
+    for variant_id, variant_data in project.get_variants(variant_ids, include_annotation_data = 'true'):
       for annotation in variant_data:
         if clinvar_version in annotation:
           if 'Conflicting_classifications_of_pathogenicity' in variant_data[annotation]:
-            position = str(variant_data['chr']) + ':' + str(variant_data['r_start'])
-            command = str(bcftools) + ' view -H -i \'REF == "' + str(variant_data['ref']) + '" && ALT == "' + str(variant_data['alt']) + '"\' ' + str(clinvar_file) + ' ' + str(position)
-            for field in os.popen(command).read().split('\t')[7].split(';'):
-              has_path = False
-              url = 'https://udn.mosaic.frameshift.io/#/projects/' + str(task['project_id']) + '/variants?variant_set_id=' + str(task['variant_set_id'])
-              if field.startswith('CLNSIGCONF='):
-                for assertion in field.split('=')[1].split('|'):
-                  if 'athogenic' in assertion:
-                    has_path = True
-                    break
-                if not has_path:
-                  print(task['project_name'], field, url, sep = ',')
-                break
+            variant = (str(variant_data['chr']), int(variant_data['r_start']), str(variant_data['ref']), str(variant_data['alt']))
+            conflicting.append((task, variant))
+  records = clinvar.lookup([variant for _, variant in conflicting])
+  clinvar.close()
+
+  # Output the tasks whose conflicting variants have no pathogenic assertion
+  for task, variant in conflicting:
+    url = 'https://udn.mosaic.frameshift.io/#/projects/' + str(task['project_id']) + '/variants?variant_set_id=' + str(task['variant_set_id'])
+    for record in records[variant][:1]:
+      assertions = record.info_fields().get('CLNSIGCONF')
+      if assertions and assertions is not True:
+        has_path = False
+        for assertion in assertions.split('|'):
+          if 'athogenic' in assertion:
+            has_path = True
+            break
+        if not has_path:
+          print(task['project_name'], 'CLNSIGCONF=' + assertions, url, sep = ',')
 
 # Input options
 def parse_command_line():
@@ -5,21 +5,21 @@ from pprint import pprint
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 from _bootstrap import base_parser, init, fail
+from task_analytics import TaskAggregator, attribute_key
 
 def main():
 
   # Parse the command line
   args = parse_command_line()
 
-  api_mosaic = init(args)
+  api_mosaic = init(args, pool_size = args.workers)
 
-  # Get
-  project = api_mosaic.get_project(34)
-  project_by_site = {}
-  for attribute in project.get_project_attributes():
-    if attribute['name'] == 'Clinical Site':
-      for udn_project in attribute['values']:
-        project_by_site[udn_project['project_id']] = udn_project['value']
+  # Get the site of each project from the collection's project attributes
+  collection = api_mosaic.get_project(args.collection_id)
+  try:
+    site = attribute_key(collection.attribute_value_index(), args.site_attribute, name = 'site')
+  except ValueError as e:
+    fail(str(e))
 
   # Determine which tasks to return based on categories
   categories = None
@@ -76,22 +76,17 @@ def main():
   if args.project_ids:
     project_ids = args.project_ids.split(',') if ',' in args.project_ids else [args.project_ids]
 
-  # Get the requested tasks
-  tasks = {}
-  for task in api_mosaic.get_tasks(categories = categories, completed = completed, project_ids = project_ids, types = types, order_dir=None):
-    if task['project_id'] not in tasks:
-      tasks[task['project_id']] = 1
-    else:
-      tasks[task['project_id']] += 1
+  # Count the requested tasks of each project, grouped by site, in a single pass over the tasks
+  aggregator = TaskAggregator([site, 'project_id'])
+  aggregator.consume(api_mosaic.get_tasks(categories = categories, completed = completed, project_ids = project_ids, types = types, order_dir = None, workers = args.workers))
 
   # Sort the tasks by site
   tasks_by_site = {}
-  for project_id in tasks:
-    site = project_by_site[project_id]
-    if site not in tasks_by_site:
-      tasks_by_site[site] = {'count': 1, 'genes': []}
+  for (site_name, project_id), count in aggregator.rows():
+    if site_name not in tasks_by_site:
+      tasks_by_site[site_name] = {'count': 1, 'genes': []}
     else:
-      tasks_by_site[site]['count'] += 1
+      tasks_by_site[site_name]['count'] += 1
 
     # Get information on the variant
     project = api_mosaic.get_project(project_id)
@@ -99,10 +94,9 @@ def main():
       if variant_set['name'].startswith('ClinVar') and 'Primary' in variant_set['name']:
         variant_set_id = variant_set['id']
         variant_set_info = project.get_variant_set(variant_set_id, include_variant_data = 'true')
-        for variant_id in variant_set_info['variant_ids']:
-          variant_info = project.get_variant(variant_id, include_annotation_data = 'true')
+        for variant_id, variant_info in project.get_variants(variant_set_info['variant_ids'], include_annotation_data = 'true'):
           for gene in variant_info['gene_name@default']:
-            tasks_by_site[site]['genes'].append(gene)
+            tasks_by_site[site_name]['genes'].append(gene)
 
   # Print out the results
   for site in tasks_by_site:
@@ -125,6 +119,13 @@ def parse_command_line():
   # Project ids to check
   parser.add_argument('--project_ids', '-p', required = False, metavar = 'string', help = 'A comma separated list of project ids to check')
 
+  # The collection holding the site of each project, and the attribute giving the site
+  parser.add_argument('--collection_id', '-l', required = False, default = 34, metavar = 'integer', help = 'The collection whose project attributes give the site of each project. Default: 34')
+  parser.add_argument('--site_attribute', '-s', required = False, default = 'Clinical Site', metavar = 'string', help = 'The name or id of the project attribute holding the site. Default: Clinical Site')
+
+  # The number of pages of tasks to request ahead
+  parser.add_argument('--workers', '-w', required = False, type = int, default = 4, metavar = 'integer', help = 'The number of pages of tasks to request at once. Default: 4')
+
   return parser.parse_args()
 
 if __name__ == "__main__":
@@ -16,27 +16,16 @@ def main():
   # Open an api client project object for the defined project
   project = api_mosaic.get_project(args.project_id)
 
-  # Get the project settings
-  available_values = {}
+  # Index the attribute values of all the projects
+  attribute_values = project.attribute_value_index()
+
+  # If values were provided, print out the projects with any of them, otherwise print out the available values
   if args.values:
     requested_values = args.values.split(',') if ',' in args.values else [args.values]
-    project_ids = []
-  for attribute in project.get_project_attributes():
-    if int(attribute['id']) == int(args.attribute_id):
-      for value in attribute['values']:
-        if not args.values:
-          if value['value'] not in available_values:
-            available_values[value['value']] = 1
-          else:
-            available_values[value['value']] += 1
-        else:
-          if value['value'] in requested_values:
-            project_ids.append(str(value['project_id']))
-
-  # If no value were provided, print out the available values
-  if args.values:
-    print(','.join(project_ids))
+    project_ids = attribute_values.projects(int(args.attribute_id), *requested_values)
+    print(','.join([str(project_id) for project_id in sorted(project_ids)]))
   else:
+    available_values = attribute_values.value_counts(int(args.attribute_id))
     for value in available_values:
       print(value, ': ', available_values[value], sep = '')
 
@@ -8,13 +8,14 @@ from pprint import pprint
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 from _bootstrap import base_parser, init, warning, fail
+from task_analytics import TaskAggregator
 
 def main():
 
   # Parse the command line
   args = parse_command_line()
 
-  api_mosaic = init(args)
+  api_mosaic = init(args, pool_size = args.workers)
   project = api_mosaic.get_project(args.project_id)
 
   # Check if this is a collection
@@ -28,16 +29,12 @@ def main():
     project_ids = [args.project_id]
     print('Getting ClinVar variants to review for project: ', data['name'], sep = '')
 
-  # Open the output csv file
-  output = open(args.output_file, 'w')
-  print('#project_name,project_id,url', file = output)
-
-  for task in api_mosaic.get_tasks(categories = None, completed = None, project_ids = project_ids, types = None, order_dir = None):
-    url = 'https://udn.mosaic.frameshift.io/#/projects/' + str(task['project_id']) + '/variants?variant_set_id=' + str(task['variant_set_id'])
-    print(task['project_name'], task['project_id'], url, sep = ',', file = output)
-
-  # Close the output file
-  output.close()
+  # Write each task to the output csv as it is read, counting the tasks of each project
+  url = ('url', lambda task: 'https://udn.mosaic.frameshift.io/#/projects/' + str(task['project_id']) + '/variants?variant_set_id=' + str(task['variant_set_id']))
+  with open(args.output_file, 'w', newline = '') as output:
+    aggregator = TaskAggregator(['project_id'], csv_file = output, csv_columns = [('#project_name', lambda task: task['project_name']), 'project_id', url])
+    aggregator.consume(api_mosaic.get_tasks(categories = None, completed = None, project_ids = project_ids, types = None, order_dir = None, workers = args.workers))
+  print('Wrote ', aggregator.total, ' tasks for ', len(aggregator.counts), ' projects to ', args.output_file, sep = '')
 
 # Input options
 def parse_command_line():
@@ -52,6 +49,9 @@ def parse_command_line():
   # Option to also consider completed tasks
   parser.add_argument('--include_reviewed', '-i', required = False, action = 'store_true', help = 'If set, include tasks marked as completed. By default ClinVar tasks that have not been completed will be considered')
 
+  # The number of pages of tasks to request ahead
+  parser.add_argument('--workers', '-w', required = False, type = int, default = 4, metavar = 'integer', help = 'The number of pages of tasks to request at once. Default: 4')
+
   return parser.parse_args()
 
 # Throw a warning
@@ -6,7 +6,9 @@ from project_setup import set_variant_filters
 
 # Replace every variant filter in a project with the set described by the filter json. This is
 # project_setup/set_variant_filters.py with the deletion of the existing filters always on, so
-# the implementation is shared with that script rather than held as a second copy here.
+# the implementation is shared with that script rather than held as a second copy here. With --sync,
+# filters already matching the json are left alone and changed filters are updated in place, while
+# filters that are not in the json are still deleted.
 #
 # The copy this script used to carry had never run: it read a filter json it never asked for on
 # the command line, called four helper functions it did not define, and built its annotation
@@ -5,6 +5,7 @@ from pprint import pprint
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 from _bootstrap import base_parser, init, fail
+from vcf_reader import read_vcf_header
 
 def main():
 
@@ -25,10 +26,11 @@ def main():
   reference = project.get_project_settings()['reference']
 
   # Get all the samples in the project as well as all files associated with them
+  sample_files = project.sample_file_index()
   mosaic_samples = {}
-  for sample in project.get_samples():
+  for sample in sample_files.samples.values():
     mosaic_samples[sample['name']] = {'id': sample['id'], 'files': {}}
-    for sample_file in project.get_sample_files(sample['id']):
+    for sample_file in sample_files.by_sample_id(sample['id']):
       mosaic_samples[sample['name']]['files'][sample_file['name']] = sample_file['id']
 
   # Check that the input vcf file exists
@@ -36,16 +38,10 @@ def main():
     fail('Could not find file ' + args.vcf_file)
 
   # Get all the samples from the vcf file
-  if not args.tools_dir.endswith('/'):
-    args.tools_dir = args.tools_dir + '/'
-  bcftools = args.tools_dir + 'bcftools/bcftools'
-  if not os.path.exists(bcftools):
-    fail('Could not find bcftools executable')
-  header = os.popen(bcftools + ' view -h ' + str(args.vcf_file)).read()
-  for line in header.split('\n'):
-    if line.startswith('#CHROM'):
-      vcf_samples = line.rstrip().split('\t')[9:]
-      break
+  try:
+    vcf_samples = read_vcf_header(args.vcf_file).samples
+  except (OSError, ValueError) as e:
+    fail('Could not read the header of ' + args.vcf_file + ': ' + str(e))
 
   # Store the file ids to add to the experiment
   experiment_file_ids = []
@@ -96,8 +92,9 @@ def parse_command_line():
   # The vcf file to create an experiment for
   parser.add_argument('--vcf_file', '-v', required = True, metavar = 'string', help = 'The vcf file to create an experiment for')
 
-  # The vcf file to create an experiment for
-  parser.add_argument('--tools_dir', '-t', required = True, metavar = 'string', help = 'The path to a tools directory (where to find bcftools')
+  # The vcf header is now read directly, so bcftools is no longer needed. The argument is kept so
+  # existing command lines still work
+  parser.add_argument('--tools_dir', '-t', required = False, metavar = 'string', help = 'No longer used: the vcf header is read without bcftools')
 
   # If the file is being added to some file systems text needs to be prepended to the url
   parser.add_argument('--url_prepend', '-u', required = True, metavar = 'string', help = 'Text to prepend to the url - e.g. file://')
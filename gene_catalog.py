@@ -0,0 +1,189 @@
+"""
+Resolve gene symbols to Mosaic gene ids locally, from a copy of the genes catalog of a
+reference, rather than with a Mosaic.get_genes search per symbol:
+
+    from gene_catalog import GeneCatalog
+
+    genes = GeneCatalog.load(mosaic, 'GRCh38', cache_dir='~/.mosaic')
+    gene_ids, unresolved, ambiguous = genes.resolve(['BRCA1', 'brca2', 'FAM155A'])
+    project.post_gene_sets('Panel', gene_ids=list(gene_ids.values()))
+
+    for gene in genes.region('17', 43044295, 43125483):
+        print(gene['name'])
+
+The catalog is read with one paged sweep of the genes route (with the pages requested
+ahead concurrently) and, if cache_dir is given, saved there as gzipped json, so later
+loads read no genes from Mosaic until the cache is older than max_age days.
+
+Symbols are matched without regard to case. A symbol that is the name of a gene resolves
+to that gene. Otherwise it resolves through the aliases of the genes, if exactly one gene
+has it as an alias; a symbol that matches several genes, by name or by alias, is reported
+as ambiguous, with the candidates.
+
+The gene records must have the id, name, aliases, chr, r_start and r_end fields the genes
+route returns with include_region, otherwise loading the catalog raises a ValueError.
+
+Region queries use an index of the genes of each chromosome sorted by start. With the
+length of the longest gene on the chromosome, a binary search finds the first gene that
+can overlap a region, so only genes near the region are checked.
+"""
+
+import bisect
+
+from collections import defaultdict
+
+from local_cache import cache_path, is_fresh, read_json, write_json
+
+# The fields every gene record from the genes route (with include_region) must have. chr,
+# r_start and r_end may be null for a gene without a position, and aliases may be empty
+_REQUIRED_FIELDS = ['id', 'name', 'aliases', 'chr', 'r_start', 'r_end']
+
+
+class GeneCatalog(object):
+    def __init__(self, genes, reference=None):
+        self.reference = reference
+        self._genes = {}
+        self._by_name = defaultdict(list)
+        self._by_alias = defaultdict(list)
+        intervals = defaultdict(list)
+
+        for gene in genes:
+            missing = [field for field in _REQUIRED_FIELDS if field not in gene]
+            if missing:
+                raise ValueError(f'Gene record {gene.get("id")} is missing the fields: {", ".join(missing)}')
+            self._genes[gene['id']] = gene
+            if gene['name']:
+                self._by_name[gene['name'].upper()].append(gene['id'])
+            for alias in _aliases(gene):
+                if gene['id'] not in self._by_alias[alias.upper()]:
+                    self._by_alias[alias.upper()].append(gene['id'])
+            interval = _interval(gene)
+            if interval:
+                intervals[interval[0]].append((interval[1], interval[2], gene['id']))
+
+        # For each chromosome, the genes sorted by start, their starts for bisect, and the
+        # length of the longest gene
+        self._intervals = {}
+        for chromosome, genes in intervals.items():
+            genes.sort()
+            self._intervals[chromosome] = ([start for start, _, _ in genes], genes, max(end - start for start, end, _ in genes))
+
+
+    def __repr__(self):
+        return f'GeneCatalog({self.reference}, {len(self)} genes)'
+
+
+    def __len__(self):
+        return len(self._genes)
+
+
+    def __iter__(self):
+        return iter(self._genes.values())
+
+
+    @classmethod
+    def load(cls, mosaic, reference='GRCh38', *, cache_dir=None, max_age=30, workers=None):
+        """
+        Return the catalog of a reference, from the cache in cache_dir if it is there and
+        no more than max_age days old, otherwise from Mosaic, saving it to the cache.
+        """
+        path = cache_path(cache_dir, f'genes_{reference}.json.gz')
+        if is_fresh(path, max_age):
+            return cls.read(path)
+
+        catalog = cls(mosaic.get_genes(reference=reference, region=True, workers=workers if workers else mosaic._pool_size), reference)
+        if path:
+            catalog.save(path)
+
+        return catalog
+
+
+    def save(self, path):
+        """
+        Write the catalog to path as gzipped json, replacing the file in one step.
+        """
+        write_json(path, {'reference': self.reference, 'genes': list(self._genes.values())})
+
+
+    @classmethod
+    def read(cls, path):
+        data = read_json(path)
+
+        return cls(data['genes'], data.get('reference'))
+
+
+    def get(self, gene_id):
+        return self._genes.get(gene_id)
+
+
+    def lookup(self, symbol):
+        """
+        Return the genes a symbol resolves to: the genes with that name, otherwise the
+        genes with it as an alias, or an empty list.
+        """
+        symbol = str(symbol).strip().upper()
+        gene_ids = self._by_name.get(symbol) or self._by_alias.get(symbol, [])
+
+        return [self._genes[gene_id] for gene_id in gene_ids]
+
+
+    def resolve(self, symbols):
+        """
+        Resolve a list of symbols to gene ids. Returns (gene_ids, unresolved, ambiguous),
+        where gene_ids is a dictionary from each resolved symbol to its gene id, in the
+        order given, unresolved is a list of the symbols matching no gene, and ambiguous
+        is a dictionary from each symbol matching several genes to their ids.
+        """
+        gene_ids = {}
+        unresolved = []
+        ambiguous = {}
+        for symbol in symbols:
+            genes = self.lookup(symbol)
+            if len(genes) == 1:
+                gene_ids[symbol] = genes[0]['id']
+            elif genes:
+                ambiguous[symbol] = [gene['id'] for gene in genes]
+            else:
+                unresolved.append(symbol)
+
+        return gene_ids, unresolved, ambiguous
+
+
+    def region(self, chromosome, start, end):
+        """
+        Return the genes overlapping start to end (inclusive) on a chromosome, in order of
+        their start. A 'chr' prefix is ignored if the catalog does not use one.
+        """
+        chromosome = str(chromosome)
+        if chromosome not in self._intervals:
+            chromosome = chromosome[3:] if chromosome.startswith('chr') else 'chr' + chromosome
+            if chromosome not in self._intervals:
+                return []
+        starts, genes, longest = self._intervals[chromosome]
+
+        # No gene starting before start - longest can reach start
+        overlapping = []
+        for i in range(bisect.bisect_left(starts, start - longest), bisect.bisect_right(starts, end)):
+            gene_start, gene_end, gene_id = genes[i]
+            if gene_end >= start:
+                overlapping.append(self._genes[gene_id])
+
+        return overlapping
+
+
+def _aliases(gene):
+    aliases = gene['aliases']
+    if not aliases:
+        return []
+    if isinstance(aliases, str):
+        return [alias.strip() for alias in aliases.split(',') if alias.strip()]
+
+    return [str(alias) for alias in aliases]
+
+
+# Return (chromosome, start, end) for a gene, or None if it has no position
+def _interval(gene):
+    if gene['chr'] is None or gene['r_start'] is None or gene['r_end'] is None:
+        return None
+
+    return str(gene['chr']), int(gene['r_start']), int(gene['r_end'])
@@ -4,14 +4,14 @@ import sys
 from pprint import pprint
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
-from _bootstrap import base_parser, init, fail
+from _bootstrap import base_parser, init, warning, fail
 
 def main():
 
   # Parse the command line
   args = parse_command_line()
 
-  api_mosaic = init(args)
+  api_mosaic = init(args, pool_size = args.workers)
 
   # Open an api client project object for the source project
   try:
@@ -22,6 +22,8 @@ def main():
   # Either the set id or name must be supplied
   if not args.id and not args.name:
     fail('please supply either the id or name of the gene set to copy')
+  if not args.destination_project_ids and not args.collection_id:
+    fail('please supply the projects to copy to with --destination_project_ids / -d and / or --collection_id / -l')
 
   # Get the gene set
   gene_sets = {}
@@ -51,20 +53,27 @@ def main():
     description = gene_sets[set_id]['description']
     gene_ids = gene_sets[set_id]['gene_ids']
 
-    project_ids = args.destination_project_ids.split(',')
-    for project_id in project_ids:
-
-      # Open an api client project object for the defined project
-      try:
-        destination_project = api_mosaic.get_project(project_id)
-      except Exception as e:
-        fail('Failed to open destinateion project with id: ' + str(project_id) + '. Error was: ' + str(e))
-
-      # Create the gene set
-      try:
-        destination_project.post_gene_sets(name, description = description, is_public_to_project = 'true', gene_ids = gene_ids)
-      except Exception as e:
-        fail('failed to create gene set in destination project. Error was: ' + str(e))
+    # Get the projects to copy to, including every project in the given collection
+    project_ids = [project_id.strip() for project_id in args.destination_project_ids.split(',')] if args.destination_project_ids else []
+    if args.collection_id:
+      collection_data = api_mosaic.get_project(args.collection_id).get_project()
+      if not collection_data['is_collection']:
+        fail('Project ' + str(args.collection_id) + ' is not a collection')
+      project_ids += [str(project_id) for project_id in collection_data['collection_project_ids']]
+    project_ids = [project_id for project_id in dict.fromkeys(project_ids) if str(project_id) != str(source_project.id)]
+
+    # Copy the set to all the projects at once. Projects that already have an identical set are skipped, and a set
+    # with the same name but different genes is updated in place rather than duplicated
+    gene_set = {'name': name, 'description': description, 'gene_ids': gene_ids}
+    failures = 0
+    for project_id, action, data, error in api_mosaic.replicate_gene_set(gene_set, project_ids, is_public_to_project = 'true', workers = args.workers):
+      if error:
+        warning('Failed to copy the gene set to project ' + str(project_id) + '. Error was: ' + str(error))
+        failures += 1
+      else:
+        print(project_id, ': ', action, sep = '')
+    if failures:
+      fail('Failed to copy the gene set to ' + str(failures) + ' projects')
 
   # If multiple sets were found, require the id
   else:
@@ -78,13 +87,15 @@ def parse_command_line():
 
   # Provide the ids of the project to copy from and a list of projects to copy to
   project_arguments.add_argument('--source_project_id', '-p', required = True, metavar = 'integer', help = 'The Mosaic project id to copy the gene set from')
-  project_arguments.add_argument('--destination_project_ids', '-d', required = True, metavar = 'string', help = 'A comma separated list of project ids to copy the gene set to')
+  project_arguments.add_argument('--destination_project_ids', '-d', required = False, metavar = 'string', help = 'A comma separated list of project ids to copy the gene set to')
+  project_arguments.add_argument('--collection_id', '-l', required = False, metavar = 'integer', help = 'Copy the gene set to every project in this collection')
 
   # The name of the gene set to copy
   optional_arguments.add_argument('--name', '-n', required = False, metavar = 'string', help = 'The name of the gene set to copy. If id is also set, both will be used')
   optional_arguments.add_argument('--id', '-id', required = False, metavar = 'integer', help = 'The id of the gene set to copy. If id is also set, both will be used')
 
   # Optional arguments
+  optional_arguments.add_argument('--workers', '-w', required = False, type = int, default = 10, metavar = 'integer', help = 'The number of projects to copy the gene set to at once. Default: 10')
   #optional_arguments.add_argument('--description', '-d', required = False, metavar = 'string', help = 'The description of the gene set')
   #optional_arguments.add_argument('--is_public_to_project', '-u', required = False, action = 'store_true', help = 'Publish this gene set for everyone in the project')
   #parser.add_argument('--gene_ids', '-i', required = False, metavar = 'string', help = 'A comma separated list of gene ids')
@@ -4,7 +4,8 @@ import sys
 from pprint import pprint
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
-from _bootstrap import base_parser, init, fail
+from _bootstrap import base_parser, init, warning, fail
+from gene_catalog import GeneCatalog
 
 def main():
 
@@ -23,13 +24,42 @@ def main():
   description = args.description if args.description else None
   is_public_to_project = 'true' if args.is_public_to_project else 'false'
 
-  # If gene names are provided, check that they exist
+  # Get the gene names from the command line and / or a file with a name per line
   gene_names = []
   if args.gene_names:
-    gene_names = args.gene_names.split(',') if ',' in args.gene_names else [args.gene_names]
+    gene_names = [gene_name.strip() for gene_name in args.gene_names.split(',') if gene_name.strip()]
+  if args.gene_file:
+    try:
+      with open(args.gene_file) as f:
+        gene_names += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    except OSError as e:
+      fail('Failed to open the gene file. Error was: ' + str(e))
+
+  # Check that all the gene names exist by resolving them to gene ids in the genes catalog of the project's
+  # reference, before anything is created
+  gene_ids = []
+  if gene_names:
+    reference = args.reference if args.reference else project.data.get('reference', 'GRCh38')
+    try:
+      genes = GeneCatalog.load(api_mosaic, reference, cache_dir = args.cache_dir)
+    except Exception as e:
+      fail('Failed to get the ' + str(reference) + ' genes. Error was: ' + str(e))
+    resolved, unresolved, ambiguous = genes.resolve(gene_names)
+    for gene_name in ambiguous:
+      warning(str(gene_name) + ' matches several genes: ' + ', '.join([genes.get(gene_id)['name'] for gene_id in ambiguous[gene_name]]))
+    if unresolved:
+      warning('The following genes are not in the ' + str(reference) + ' genes: ' + ', '.join(unresolved))
+    if unresolved or ambiguous:
+      fail(str(len(unresolved) + len(ambiguous)) + ' of the ' + str(len(gene_names)) + ' genes could not be resolved')
+    for gene_name in resolved:
+      if resolved[gene_name] not in gene_ids:
+        gene_ids.append(resolved[gene_name])
+    print('Resolved ', len(gene_names), ' gene names to ', len(gene_ids), ' genes', sep = '')
+  if args.validate_only:
+    return
 
   # Create the gene set
-  data = project.post_gene_sets(args.name, description = description, is_public_to_project = is_public_to_project, gene_names = gene_names)
+  data = project.post_gene_sets(args.name, description = description, is_public_to_project = is_public_to_project, gene_ids = gene_ids)
 
 # Input options
 def parse_command_line():
@@ -49,6 +79,12 @@ def parse_command_line():
   optional_arguments.add_argument('--is_public_to_project', '-u', required = False, action = 'store_true', help = 'Publish this gene set for everyone in the project')
   #parser.add_argument('--gene_ids', '-i', required = False, metavar = 'string', help = 'A comma separated list of gene ids')
   optional_arguments.add_argument('--gene_names', '-m', required = False, metavar = 'string', help = 'A comma separated list of gene names')
+  optional_arguments.add_argument('--gene_file', '-f', required = False, metavar = 'string', help = 'A file with a gene name on each line')
+
+  # Resolving the gene names
+  optional_arguments.add_argument('--reference', '-r', required = False, metavar = 'string', help = 'The reference of the genes. Default: the reference of the project')
+  optional_arguments.add_argument('--cache_dir', '-cd', required = False, metavar = 'string', help = 'A directory to cache the genes catalog in, so it is only read from Mosaic once')
+  optional_arguments.add_argument('--validate_only', '-vo', required = False, action = 'store_true', help = 'Only check that the genes exist, without creating the gene set')
 
   return parser.parse_args()
 
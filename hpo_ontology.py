@@ -0,0 +1,309 @@
+"""
+Hold the Human Phenotype Ontology locally, with the ancestors and descendants of every
+term worked out once when it is loaded, so questions about the terms of samples need no
+requests:
+
+    from hpo_ontology import HpoOntology, samples_hpo_terms
+
+    hpo = HpoOntology.load(mosaic, cache_dir='~/.mosaic')
+    hpo.is_a('HP:0001250', 'HP:0000707')
+    terms = samples_hpo_terms(project)
+    hpo.similarity(terms[sample_a], terms[sample_b])
+
+The ontology is read from Mosaic with one paged sweep of the hpo-terms route, or from an
+hp.obo file with HpoOntology.from_obo, and can be cached on disk as gzipped json. The
+terms from Mosaic must have a parents field; if it is missing, or no term has a parent,
+a ValueError is raised rather than building a flat ontology, and an hp.obo file is needed.
+
+Each term is given an index, with every term after its parents, and the ancestors and
+descendants of each term are kept as sorted arrays of indexes. is_a is then a binary
+search, and the closures of sets of terms are unions of small arrays. Obsolete terms are
+dropped, and alternative ids are mapped to the term that replaced them.
+"""
+
+import bisect
+import gzip
+
+from array import array
+from collections import defaultdict
+
+from local_cache import cache_path, is_fresh, read_json, write_json
+
+# The field of a term from the hpo-terms route holding the ids of its parents
+_PARENTS_FIELD = 'parents'
+
+
+class HpoOntology(object):
+    def __init__(self, terms, alt_ids=None):
+        """
+        terms is a dictionary from each HPO id to a dict with its label and the ids of its
+        parents, e.g. {'HP:0001250': {'label': 'Seizure', 'parents': ['HP:0012638']}}.
+        """
+        self.terms = terms
+        self._alt_ids = dict(alt_ids) if alt_ids else {}
+
+        # Order the terms so that every term comes after its parents. Parents that are not
+        # terms (e.g. obsolete terms) are ignored
+        children = defaultdict(list)
+        waiting = {}
+        for hpo_id, term in terms.items():
+            parents = [parent for parent in term.get('parents', []) if parent in terms]
+            waiting[hpo_id] = len(parents)
+            for parent in parents:
+                children[parent].append(hpo_id)
+
+        # The ontology has a single root, so terms with no parents at all means the parents
+        # were lost, and every ancestry query would be wrong
+        if len(terms) > 1 and not children:
+            raise ValueError('None of the HPO terms has a parent. Read the ontology from an hp.obo file instead')
+        order = [hpo_id for hpo_id, count in waiting.items() if count == 0]
+        for hpo_id in order:
+            for child in children[hpo_id]:
+                waiting[child] -= 1
+                if waiting[child] == 0:
+                    order.append(child)
+        if len(order) != len(terms):
+            raise ValueError('The HPO terms contain a cycle')
+
+        self._ids = order
+        self._index = {hpo_id: i for i, hpo_id in enumerate(order)}
+
+        # Build the closures in order, so each term's parents are complete before it
+        ancestors = []
+        descendants = [[] for _ in order]
+        for i, hpo_id in enumerate(order):
+            closure = set()
+            for parent in terms[hpo_id].get('parents', []):
+                if parent in self._index:
+                    closure.add(self._index[parent])
+                    closure.update(ancestors[self._index[parent]])
+            ancestors.append(array('I', sorted(closure)))
+            for ancestor in closure:
+                descendants[ancestor].append(i)
+        self._ancestors = ancestors
+        self._descendants = [array('I', indexes) for indexes in descendants]
+
+
+    def __repr__(self):
+        return f'HpoOntology({len(self)} terms)'
+
+
+    def __len__(self):
+        return len(self._ids)
+
+
+    def __contains__(self, hpo_id):
+        return self.term_id(hpo_id) is not None
+
+
+    @classmethod
+    def load(cls, mosaic, *, cache_dir=None, max_age=30, workers=None):
+        """
+        Return the ontology from the cache in cache_dir if it is there and no more than
+        max_age days old, otherwise from Mosaic, saving it to the cache.
+        """
+        path = cache_path(cache_dir, 'hpo_terms.json.gz')
+        if is_fresh(path, max_age):
+            return cls.read(path)
+
+        ontology = cls.from_mosaic(mosaic, workers=workers)
+        if path:
+            ontology.save(path)
+
+        return ontology
+
+
+    @classmethod
+    def from_mosaic(cls, mosaic, *, workers=None):
+        terms = {}
+        for term in mosaic.get_hpo_terms(None, workers=workers if workers else mosaic._pool_size):
+            if _PARENTS_FIELD not in term:
+                raise ValueError(f'HPO term {term["hpo_id"]} from Mosaic has no {_PARENTS_FIELD} field, so the ontology cannot be built. Read it from an hp.obo file instead')
+            parents = [parent if isinstance(parent, str) else parent['hpo_id'] for parent in term[_PARENTS_FIELD] or []]
+            terms[term['hpo_id']] = {'label': term.get('label'), 'parents': parents}
+
+        return cls(terms)
+
+
+    @classmethod
+    def from_obo(cls, path):
+        """
+        Read the ontology from an hp.obo file.
+        """
+        terms = {}
+        alt_ids = {}
+        term = None
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt') as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith('['):
+                    term = {'parents': [], 'alt_ids': []} if line == '[Term]' else None
+                    continue
+                if term is None or ':' not in line:
+                    continue
+                key, value = line.split(':', 1)
+                value = value.split('!')[0].strip()
+                if key == 'id':
+                    terms[value] = term
+                elif key == 'name':
+                    term['label'] = value
+                elif key == 'is_a':
+                    term['parents'].append(value)
+                elif key == 'alt_id':
+                    term['alt_ids'].append(value)
+                elif key == 'is_obsolete' and value == 'true':
+                    term['obsolete'] = True
+
+        for hpo_id in [hpo_id for hpo_id, term in terms.items() if term.get('obsolete')]:
+            del terms[hpo_id]
+        for hpo_id, term in terms.items():
+            for alt_id in term.pop('alt_ids'):
+                alt_ids[alt_id] = hpo_id
+
+        return cls(terms, alt_ids)
+
+
+    def save(self, path):
+        """
+        Write the terms to path as gzipped json, replacing the file in one step.
+        """
+        write_json(path, {'terms': self.terms, 'alt_ids': self._alt_ids})
+
+
+    @classmethod
+    def read(cls, path):
+        data = read_json(path)
+
+        return cls(data['terms'], data.get('alt_ids'))
+
+
+    def term_id(self, hpo_id):
+        """
+        Return the id of a term given by its id or an alternative id, or None if it is not
+        in the ontology.
+        """
+        hpo_id = self._alt_ids.get(hpo_id, hpo_id)
+
+        return hpo_id if hpo_id in self._index else None
+
+
+    def label(self, hpo_id):
+        hpo_id = self.term_id(hpo_id)
+
+        return self.terms[hpo_id].get('label') if hpo_id else None
+
+
+    def parents(self, hpo_id):
+        return [parent for parent in self.terms[self._term(hpo_id)].get('parents', []) if parent in self._index]
+
+
+    def ancestors(self, hpo_id):
+        """
+        Return the ids of all the ancestors of a term, not including the term itself.
+        """
+        return [self._ids[i] for i in self._ancestors[self._index[self._term(hpo_id)]]]
+
+
+    def descendants(self, hpo_id):
+        """
+        Return the ids of all the descendants of a term, not including the term itself.
+        """
+        return [self._ids[i] for i in self._descendants[self._index[self._term(hpo_id)]]]
+
+
+    def is_a(self, hpo_id, ancestor_id):
+        """
+        Return True if the term is ancestor_id or one of its descendants.
+        """
+        i, ancestor = self._index[self._term(hpo_id)], self._index[self._term(ancestor_id)]
+        if i == ancestor:
+            return True
+        ancestors = self._ancestors[i]
+        position = bisect.bisect_left(ancestors, ancestor)
+
+        return position < len(ancestors) and ancestors[position] == ancestor
+
+
+    def closure(self, hpo_ids):
+        """
+        Return the set of the ids of the given terms and all their ancestors. Ids not in
+        the ontology are ignored.
+        """
+        return {self._ids[i] for i in self._closure(hpo_ids)}
+
+
+    def common_ancestors(self, hpo_id_a, hpo_id_b):
+        """
+        Return the most specific terms that both terms are (i.e. of the terms both are,
+        those with no descendant that both are).
+        """
+        return self._most_specific(self._closure([hpo_id_a]) & self._closure([hpo_id_b]))
+
+
+    def most_specific(self, hpo_ids):
+        """
+        Return the given terms that are not an ancestor of another of them, dropping e.g.
+        the shared ancestors in the overlap of two samples. Ids not in the ontology are
+        ignored.
+        """
+        return self._most_specific({self._index[hpo_id] for hpo_id in map(self.term_id, hpo_ids) if hpo_id is not None})
+
+
+    def overlap(self, hpo_ids_a, hpo_ids_b):
+        """
+        Return the set of terms shared by the closures of two sets of terms, e.g. the
+        phenotypes of two samples.
+        """
+        return {self._ids[i] for i in self._closure(hpo_ids_a) & self._closure(hpo_ids_b)}
+
+
+    def similarity(self, hpo_ids_a, hpo_ids_b):
+        """
+        Return the similarity of two sets of terms, as the number of terms shared by their
+        closures over the number in either closure (0 to 1).
+        """
+        a, b = self._closure(hpo_ids_a), self._closure(hpo_ids_b)
+        union = len(a | b)
+
+        return len(a & b) / union if union else 0.0
+
+
+    def _term(self, hpo_id):
+        term_id = self.term_id(hpo_id)
+        if term_id is None:
+            raise KeyError(f'Unknown HPO term: {hpo_id}')
+
+        return term_id
+
+
+    def _most_specific(self, indexes):
+        redundant = set()
+        for i in indexes:
+            redundant.update(self._ancestors[i])
+
+        return [self._ids[i] for i in sorted(indexes - redundant)]
+
+
+    def _closure(self, hpo_ids):
+        closure = set()
+        for hpo_id in hpo_ids:
+            hpo_id = self.term_id(hpo_id)
+            if hpo_id is not None:
+                i = self._index[hpo_id]
+                closure.add(i)
+                closure.update(self._ancestors[i])
+
+        return closure
+
+
+def samples_hpo_terms(project):
+    """
+    Return a dictionary from the id of each sample in a project with HPO terms to the list
+    of its HPO ids, from a single get_samples_hpo_terms request.
+    """
+    terms = defaultdict(list)
+    for hpo_term in project.get_samples_hpo_terms():
+        terms[hpo_term['sample_id']].append(hpo_term['hpo_id'])
+
+    return dict(terms)
@@ -5,6 +5,7 @@ from pprint import pprint
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 from _bootstrap import base_parser, init, fail
+from mosaic import FINAL_JOB_STATUSES
 
 def main():
 
@@ -13,16 +14,40 @@ def main():
 
   api_mosaic = init(args)
 
-  # Get the project settings
-  print(api_mosaic.get_job_status(args.job_id)['status'])
+  # Get the status of a single job
+  job_ids = [job_id.strip() for job_id in args.job_id.split(',')]
+  if not args.wait and len(job_ids) == 1:
+    print(api_mosaic.get_job_status(job_ids[0])['status'])
+
+  # Get the status of multiple jobs
+  elif not args.wait:
+    for job_id in job_ids:
+      print(job_id, ': ', api_mosaic.get_job_status(job_id)['status'], sep = '')
+
+  # Or wait for all the jobs to finish, printing each change of status
+  else:
+    statuses = {}
+    for job_id, status, job in api_mosaic.wait_for_jobs(job_ids, timeout = args.timeout):
+      statuses[job_id] = status
+      print(job_id, ': ', status, sep = '')
+    unfinished = [job_id for job_id in job_ids if statuses.get(job_id) not in FINAL_JOB_STATUSES]
+    if unfinished:
+      fail('Jobs had not finished after ' + str(args.timeout) + ' seconds: ' + ', '.join(unfinished))
+    if [job_id for job_id in job_ids if statuses[job_id] != 'completed']:
+      fail('Not all jobs completed')
 
 # Input options
 def parse_command_line():
   parser, groups = base_parser()
   required_arguments = groups.required
+  optional_arguments = groups.optional
 
   # The job id to query
-  required_arguments.add_argument('--job_id', '-j', required = True, metavar = 'integer', help = 'The Mosaic redis job is to get the status of')
+  required_arguments.add_argument('--job_id', '-j', required = True, metavar = 'integer', help = 'The Mosaic redis job id to get the status of, or a comma separated list of job ids')
+
+  # Wait for the jobs to finish
+  optional_arguments.add_argument('--wait', '-w', required = False, action = 'store_true', help = 'Wait until the jobs have completed or failed, printing each change of status. Fails if any job did not complete')
+  optional_arguments.add_argument('--timeout', '-t', required = False, type = int, metavar = 'integer', help = 'The most seconds to wait for with --wait. Default: no limit')
 
   return parser.parse_args()
 
@@ -0,0 +1,54 @@
+"""
+Keep data read from Mosaic on disk as gzipped json, e.g. the gene catalog or the HPO
+ontology, so later runs need not read it again until the copy is older than max_age days:
+
+    from local_cache import cache_path, is_fresh, read_json, write_json
+
+    path = cache_path('~/.mosaic', 'genes_GRCh38.json.gz')
+    if is_fresh(path, 30):
+        data = read_json(path)
+    else:
+        data = read_from_mosaic()
+        if path:
+            write_json(path, data)
+
+A file is replaced in one step when it is written, so a reader never sees a partly
+written file.
+"""
+
+import gzip
+import json
+import os
+import time
+
+
+def cache_path(cache_dir, name):
+    """
+    Return the path of the file name in cache_dir, or None if there is no cache_dir.
+    """
+    return os.path.join(os.path.expanduser(cache_dir), name) if cache_dir else None
+
+
+def is_fresh(path, max_age):
+    """
+    Return True if the file at path exists and is no more than max_age days old, or
+    exists at all if max_age is None.
+    """
+    if not path or not os.path.exists(path):
+        return False
+
+    return max_age is None or time.time() - os.path.getmtime(path) < max_age * 86400
+
+
+def read_json(path):
+    with gzip.open(path, 'rt') as f:
+        return json.load(f)
+
+
+def write_json(path, data):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with gzip.open(path + '.tmp', 'wt') as f:
+        json.dump(data, f)
+    os.replace(path + '.tmp', path)
@@ -30,11 +30,12 @@ def main():
 
   # Get the attribute values
   attribute_ids = [int(x) for x in args.attribute_ids.split(',')]
-  for attribute in project.get_project_attributes():
-    if attribute['id'] in attribute_ids:
+  attribute_values = project.attribute_value_index()
+  for attribute in [attribute_values.attribute(attribute_id) for attribute_id in attribute_ids]:
+    if attribute:
       value_list = []
       print('Attribute: ', attribute['id'])
-      for value_info in attribute['values']:
+      for value_info in attribute_values.value_infos(attribute['id']):
         value = value_info['value']
         project_id = value_info['project_id']
         if value:
@@ -0,0 +1,66 @@
+import os
+import sqlite3
+import sys
+
+from pprint import pprint
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from _bootstrap import base_parser, fail
+from mosaic_mirror import Mirror
+
+def main():
+
+  # Parse the command line. The mirror is queried locally, so the Mosaic endpoints are not opened
+  args = parse_command_line()
+
+  if not os.path.exists(args.database):
+    fail('The mirror database does not exist: ' + str(args.database) + '. Create it with sync_mirror.py')
+
+  # Read the query from the command line or a file
+  if args.query:
+    sql = args.query
+  elif args.query_file:
+    try:
+      with open(args.query_file) as f:
+        sql = f.read()
+    except OSError as e:
+      fail('Failed to open the query file. Error was: ' + str(e))
+  else:
+    fail('Either --query / -q or --query_file / -f must be provided')
+
+  # Run the query and print the rows as tab separated values
+  try:
+    mirror = Mirror(args.database)
+  except ValueError as e:
+    fail(str(e))
+  with mirror:
+    if not mirror.synced_at() and not mirror.project_ids():
+      fail('The mirror ' + str(args.database) + ' is empty. Populate it with sync_mirror.py')
+    try:
+      rows = mirror.query(sql)
+    except sqlite3.Error as e:
+      fail('Failed to run the query. Error was: ' + str(e))
+    if rows and not args.no_header:
+      print('\t'.join(rows[0].keys()))
+    for row in rows:
+      print('\t'.join(['' if value is None else str(value) for value in row]))
+
+# Input options
+def parse_command_line():
+  parser, groups = base_parser()
+  required_arguments = groups.required
+  optional_arguments = groups.optional
+  display_arguments = groups.display
+
+  # The mirror database and the query
+  required_arguments.add_argument('--database', '-d', required = True, metavar = 'string', help = 'The SQLite mirror database')
+  optional_arguments.add_argument('--query', '-q', required = False, metavar = 'string', help = 'The SQL query to run')
+  optional_arguments.add_argument('--query_file', '-f', required = False, metavar = 'string', help = 'A file holding the SQL query to run')
+
+  # Display arguments
+  display_arguments.add_argument('--no_header', '-n', required = False, action = 'store_true', help = 'Do not print the column names')
+
+  return parser.parse_args()
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,84 @@
+import os
+import sys
+
+from pprint import pprint
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from _bootstrap import base_parser, init, warning, fail
+from mosaic_mirror import Mirror
+
+def main():
+
+  # Parse the command line
+  args = parse_command_line()
+
+  api_mosaic = init(args, pool_size = args.workers)
+
+  # Get the projects to mirror. If none are given, all projects are mirrored
+  project_ids = None
+  if args.incremental and (args.project_ids or args.collection_id):
+    fail('--incremental / -i updates all the mirrored projects, so cannot be used with --project_ids / -p or --collection_id / -l')
+  if args.project_ids:
+    project_ids = [project_id.strip() for project_id in args.project_ids.split(',')]
+  if args.collection_id:
+    collection = api_mosaic.get_project(args.collection_id)
+    collection_data = collection.get_project()
+    if not collection_data['is_collection']:
+      fail('Project ' + str(args.collection_id) + ' is not a collection')
+    project_ids = (project_ids or []) + [collection.id] + collection_data['collection_project_ids']
+
+  # Report each project as it is mirrored
+  failures = []
+  def progress(project_id, error):
+    if error:
+      warning('Failed to mirror project ' + str(project_id) + '. Error was: ' + str(error))
+      failures.append(project_id)
+    elif args.verbose:
+      print('Mirrored project ', project_id, sep = '')
+
+  try:
+    with Mirror(args.database, rebuild = True) as mirror:
+
+      # Only read what has changed since the last sync, from the project activities
+      if args.incremental:
+        summary = mirror.sync_changes(api_mosaic, workers = args.workers, progress = progress)
+        if args.verbose:
+          for project_id in summary['updated']:
+            print('Project ', project_id, ': updated ', ', '.join(summary['updated'][project_id]), sep = '')
+        print('Applied ', summary['activities'], ' activities: ', len(summary['added']), ' projects added, ', len(summary['updated']), ' updated and ', len(summary['removed']), ' removed', sep = '')
+      else:
+        synced = mirror.sync(api_mosaic, project_ids, workers = args.workers, progress = progress)
+        print('Mirrored ', synced, ' projects to ', args.database, '. The mirror holds ', len(mirror.project_ids()), ' projects', sep = '')
+  except Exception as e:
+    fail('Failed to sync the mirror. Error was: ' + str(e))
+  if failures:
+    fail('Failed to mirror ' + str(len(failures)) + ' projects')
+
+# Input options
+def parse_command_line():
+  parser, groups = base_parser()
+  project_arguments = groups.project
+  required_arguments = groups.required
+  optional_arguments = groups.optional
+  display_arguments = groups.display
+
+  # The mirror database
+  required_arguments.add_argument('--database', '-d', required = True, metavar = 'string', help = 'The SQLite database file to mirror to. It is created if it does not exist')
+
+  # The projects to mirror
+  project_arguments.add_argument('--project_ids', '-p', required = False, metavar = 'string', help = 'A comma separated list of project ids to mirror. Default: all projects')
+  project_arguments.add_argument('--collection_id', '-l', required = False, metavar = 'integer', help = 'Mirror this collection and all of its projects')
+
+  # Only apply the changes since the last sync
+  optional_arguments.add_argument('--incremental', '-i', required = False, action = 'store_true', help = 'Only read again what the project activities show has changed since the last sync. Changes that create no activity are only picked up by a full sync')
+
+  # The number of projects to read at once
+  optional_arguments.add_argument('--workers', '-w', required = False, type = int, default = 10, metavar = 'integer', help = 'The number of projects to read at once. Default: 10')
+
+  # Display arguments
+  display_arguments.add_argument('--verbose', '-v', required = False, action = 'store_true', help = 'Print each project as it is mirrored')
+
+  return parser.parse_args()
+
+if __name__ == "__main__":
+  main()
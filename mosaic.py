@@ -35,10 +35,16 @@ This Mosaic API client is designed to support two workflows:
 """
 
 import configparser
+import gzip
+import os
 import requests
+from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
 import json
 import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from requests.exceptions import HTTPError
 from pprint import pprint
 
@@ -47,6 +53,31 @@ from pprint import pprint
 # Note: Not needed with new infrastructure.
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
+# The statuses of a redis job that will not change. 'unknown' is used by wait_for_jobs
+# for a job whose status can no longer be read
+FINAL_JOB_STATUSES = ('completed', 'failed', 'unknown')
+
+def _today():
+    return time.strftime('%Y-%m-%d', time.gmtime())
+
+
+def _map_ordered(fn, items, workers):
+    """
+    Call fn on each of items on a pool of workers threads, yielding (item, result,
+    error) in the order of items; error is None if the call succeeded, otherwise the
+    exception raised. Calls not yet started are cancelled if the caller stops early.
+    """
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = [(item, executor.submit(fn, item)) for item in items]
+        for item, future in futures:
+            try:
+                yield item, future.result(), None
+            except Exception as e:
+                yield item, None, e
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
 class Store(object):
     def __init__(self, config_file='local.ini'):
         self._config_file = config_file
@@ -66,7 +97,7 @@ class Store(object):
 
 
 class Mosaic(object):
-    def __init__(self, host_type='local', config_file=None, show_traceback=False):
+    def __init__(self, host_type='local', config_file=None, show_traceback=False, pool_size=10):
         # config_file takes precedence over host_type
         if config_file:
             store = Store(config_file)
@@ -98,6 +129,19 @@ class Mosaic(object):
 
         self._request_history = []
 
+        # All requests go through one session, so connections to the host are pooled and
+        # reused. pool_size is the number of connections kept open, which should be at
+        # least the number of threads making requests through this instance
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._pool_size = pool_size
+
+        # Variants fetched by Project.get_variants, keyed on the project id, variant id and
+        # the include flags, so each is only requested once per instance
+        self._variant_cache = {}
+
 #        if not show_traceback:
 #            sys.tracebacklimit = 0
 
@@ -140,8 +184,7 @@ class Mosaic(object):
     """
     Mosaic HTTP request methods.
     """
-    def _http_request(self, method, resource, *, params=None, data=None, file_upload=None, sample_map=None):
-
+    def _format_params(self, params):
         formatted_params = {}
         """
         By forcing square brackets onto list query params, there is no ambiguity on the type.
@@ -154,10 +197,30 @@ class Mosaic(object):
                 else:
                     formatted_params[key] = value
 
+        return formatted_params
+
+
+    def _raise_for_status(self, res, url):
+        # Try to return an error message if one exists.
+        err_msg = None
+        try:
+            res.raise_for_status()
+        except:
+            try:
+                obj = res.json()
+                err_msg = f"\n\nHTTP {res.status_code}\n{url}\n{obj['message']}"
+            except json.JSONDecodeError:
+                err_msg = f'\n\nHTTP {res.status_code}\n{url}\n(No message sent)'
+        if err_msg:
+            raise HTTPError(err_msg, response=res)
+
+
+    def _http_request(self, method, resource, *, params=None, data=None, file_upload=None, sample_map=None):
+
         kwargs = {
-                'headers': self._headers,
+                'headers': dict(self._headers),
                 'verify': self._verify,
-                'params': formatted_params
+                'params': self._format_params(params)
                 }
 
         if file_upload:
@@ -190,18 +253,7 @@ class Mosaic(object):
 
         self._log_request(res.request)
 
-        # Try to return an error message if one exists.
-        err_msg = None
-        try:
-            res.raise_for_status()
-        except:
-            try:
-                obj = res.json()
-                err_msg = f"\n\nHTTP {res.status_code}\n{url}\n{obj['message']}"
-            except json.JSONDecodeError:
-                err_msg = f'\n\nHTTP {res.status_code}\n{url}\n(No message sent)'
-        if err_msg:
-            raise HTTPError(err_msg)
+        self._raise_for_status(res, url)
 
         try:
             return res.json()
@@ -211,15 +263,15 @@ class Mosaic(object):
 
 
     def get(self, resource, *, params=None):
-        return self._http_request(requests.get, resource, params=params)
+        return self._http_request(self._session.get, resource, params=params)
 
 
     def post(self, resource, *, params=None, data=None, file_path=None, sample_map=None):
-        return self._http_request(requests.post, resource, params=params, data=data, file_upload=file_path, sample_map=sample_map)
+        return self._http_request(self._session.post, resource, params=params, data=data, file_upload=file_path, sample_map=sample_map)
 
 
     def patch(self, resource, *, params=None, data=None):
-        return self._http_request(requests.patch, resource, params=params, data=data)
+        return self._http_request(self._session.patch, resource, params=params, data=data)
 
 
     def put(self, resource, *, params=None, data=None):
@@ -237,21 +289,93 @@ class Mosaic(object):
         /samples/35 -- the resource identifier. Thus,
         for us, PUT oftens performs updates.
         """
-        return self._http_request(requests.put, resource, params=params, data=data)
+        return self._http_request(self._session.put, resource, params=params, data=data)
 
 
     def delete(self, resource, *, params=None, data=None):
-        return self._http_request(requests.delete, resource, params=params, data=data)
+        return self._http_request(self._session.delete, resource, params=params, data=data)
+
+
+    def download(self, resource, destination, *, params=None, resume=False, compress=False, chunk_size=1024 * 1024, progress=None):
+        """
+        Stream the response of a GET request to destination, a file path or a writable
+        binary file object, a chunk at a time, rather than holding it in memory as get()
+        does. Returns the number of bytes of the response written, including any written
+        by an earlier, resumed download.
+
+        With resume, an existing file at destination is continued by requesting only the
+        remaining bytes. If the server ignores the range and sends the whole response, the
+        file is written again from the start. Resuming needs a file path and cannot be
+        combined with compress.
+
+        With compress, the response is gzip compressed as it is written.
+
+        progress, if given, is called after each chunk as
+        progress(bytes_written, total_bytes, bytes_per_second), where total_bytes is None
+        if the server did not send the length.
+        """
+        is_path = isinstance(destination, (str, bytes, os.PathLike))
+        if resume and (compress or not is_path):
+            raise ValueError('resume needs a file path as the destination and cannot be used with compress')
+
+        headers = dict(self._headers)
+        offset = 0
+        if resume and os.path.exists(destination):
+            offset = os.path.getsize(destination)
+            if offset:
+                headers['Range'] = f'bytes={offset}-'
+
+        url = f'{self._api_host}/{resource}'
+        with self._session.get(url, headers=headers, params=self._format_params(params), verify=self._verify, stream=True) as res:
+            self._log_request(res.request)
 
+            # A requested range that starts at the end of the file means there is nothing left to download
+            if offset and res.status_code == 416:
+                return offset
+            self._raise_for_status(res, url)
+            if res.status_code != 206:
+                offset = 0
 
-    def get_paged_route_iter(self, resource, *, params=None):
+            length = res.headers.get('Content-Length')
+            total = offset + int(length) if length else None
+
+            output = open(destination, 'ab' if offset else 'wb') if is_path else destination
+            sink = gzip.GzipFile(fileobj=output, mode='wb') if compress else output
+            try:
+                written = offset
+                start_time = time.perf_counter()
+                for chunk in res.iter_content(chunk_size=chunk_size):
+                    sink.write(chunk)
+                    written += len(chunk)
+                    if progress:
+                        seconds = time.perf_counter() - start_time
+                        progress(written, total, (written - offset) / seconds if seconds else 0.0)
+            finally:
+                if compress:
+                    sink.close()
+                if is_path:
+                    output.close()
+
+        return written
+
+
+    def get_paged_route_iter(self, resource, *, params=None, workers=None):
         """
         limit, order_by, order_dir, search come from params, if used.
 
         The defaults for these values are in the API docs.
 
         If you want a specific page, don't use this method.
+
+        If workers is given, the first page is requested to learn the number of pages,
+        and up to workers of the following pages are then requested ahead concurrently
+        through the pooled session. Records are still yielded in page order, and only the
+        pages in flight are held in memory.
         """
+        if workers:
+            yield from self._get_paged_route_prefetch(resource, params=params, workers=workers)
+            return
+
         limit = None
 
         if params:
@@ -283,6 +407,33 @@ class Mosaic(object):
             yield from data
 
 
+    def _get_paged_route_prefetch(self, resource, *, params, workers):
+        params = dict(params) if params else {}
+        if not params.get('limit'):
+            params['limit'] = 50
+
+        def get_page(page):
+            return self.get(resource, params=dict(params, page=page))
+
+        res = get_page(1)
+        yield from res['data']
+        if not res['data']:
+            return
+        # The host may return fewer records per page than the limit asked for
+        pages = -(-res['count'] // len(res['data']))
+
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            futures = {}
+            for page in range(2, pages + 1):
+                for ahead in range(page, min(page + workers, pages + 1)):
+                    if ahead not in futures:
+                        futures[ahead] = executor.submit(get_page, ahead)
+                yield from futures.pop(page).result()['data']
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
     """
     Project API routes.
     """
@@ -303,6 +454,67 @@ class Mosaic(object):
             yield Project(mosaic=self, project_data=pdata)
 
 
+    def bulk_update_attribute_values(self, changes, *, workers=None):
+        """
+        Update project attribute values in many projects at once, without reading any
+        project first. Each change is a dict with the project_id, attribute_id, the new
+        value and is_longitudinal, from the attribute definition. A longitudinal change
+        also needs the value_id of the record to update, and can give its record_date.
+        Both are in the values of a get_project_attributes response, e.g. from an
+        AttributeValueIndex of a collection.
+
+        The changes are made concurrently through the pooled session (workers defaults to
+        the pool size). Yields (change, response, error) for each change, in the order
+        given; error is None if the update succeeded, otherwise the exception raised.
+        """
+        def update(change):
+            project = Project(mosaic=self, project_id=change['project_id'])
+            if change['is_longitudinal']:
+                return project.put_update_attribute_value(change['attribute_id'], change['value_id'], value=change['value'], record_date=change.get('record_date'))
+
+            return project.put_project_attributes(change['attribute_id'], value=change['value'])
+
+        yield from _map_ordered(update, changes, workers if workers else self._pool_size)
+
+
+    def replicate_gene_set(self, gene_set, project_ids, *, is_public_to_project=None, workers=None):
+        """
+        Copy a gene set (a dict with the name, description and gene_ids of a set, as from
+        Project.get_gene_sets) to many projects at once. Each project's gene sets are read
+        first, and the set is only written where needed:
+
+            'skipped' if the project has a set of the same name and the same genes
+            'updated' if it has one set of the same name with different genes, which is
+                      updated in place to the genes of gene_set
+            'created' if it has no set of that name
+
+        A project with several sets of the same name, none with the same genes, is an
+        error, as the set to update is not known. The projects are handled concurrently
+        through the pooled session (workers defaults to the pool size). Yields
+        (project_id, action, response, error) for each project, in the order given.
+        """
+        gene_ids = list(dict.fromkeys(gene_set['gene_ids']))
+        genes = frozenset(gene_ids)
+
+        def replicate(project_id):
+            project = Project(mosaic=self, project_id=project_id)
+            named = [existing for existing in project.get_gene_sets() if existing['name'] == gene_set['name']]
+            if any(frozenset(existing['gene_ids']) == genes for existing in named):
+                return 'skipped', None
+            if len(named) > 1:
+                raise Exception(f'project {project_id} has {len(named)} gene sets named {gene_set["name"]}')
+            if named:
+                return 'updated', project.put_gene_sets(named[0]['id'], description=gene_set.get('description'), gene_ids=gene_ids)
+
+            return 'created', project.post_gene_sets(gene_set['name'], description=gene_set.get('description'), is_public_to_project=is_public_to_project, gene_ids=gene_ids)
+
+        for project_id, result, error in _map_ordered(replicate, project_ids, workers if workers else self._pool_size):
+            if error:
+                yield project_id, None, None, error
+            else:
+                yield project_id, *result, None
+
+
     def create_project(self, name, reference='GRCh38', family_members=None, privacy_level=None, family_name=None):
         """
         family_members looks like e.g.
@@ -481,7 +693,7 @@ class Mosaic(object):
     """
 
 
-    def get_genes(self, gene=None, reference=None, region=None):
+    def get_genes(self, gene=None, reference=None, region=None, *, workers=None):
         params = { }
         if gene:
             params['search'] = gene
@@ -492,7 +704,7 @@ class Mosaic(object):
         else:
             params['reference'] = 'GRCh38'
 
-        yield from self.get_paged_route_iter(f'genes', params=params)
+        yield from self.get_paged_route_iter(f'genes', params=params, workers=workers)
 
 
     """
@@ -500,17 +712,17 @@ class Mosaic(object):
     """
 
     def get_hpo_term(self, hpo_id):
-        return self.get(f'hpo-terms/{hpo_id}', params=params)
+        return self.get(f'hpo-terms/{hpo_id}')
 
 
-    def get_hpo_terms(self, hpo_ids, *, search=None):
+    def get_hpo_terms(self, hpo_ids, *, search=None, workers=None):
         params = { }
         if hpo_ids:
             params['hpo_ids'] = hpo_ids
         if search:
             params['search'] = search
 
-        yield from self.get_paged_route_iter(f'hpo-terms', params=params)
+        yield from self.get_paged_route_iter(f'hpo-terms', params=params, workers=workers)
 
 
     """
@@ -525,6 +737,69 @@ class Mosaic(object):
         return self.get(f'jobs/{job_id}')
 
 
+    def wait_for_jobs(self, job_ids, *, timeout=None, min_interval=1, max_interval=60):
+        """
+        Poll the redis jobs in job_ids until all of them have completed or failed, or
+        until timeout seconds have passed. This is a generator: it yields
+        (job_id, status, job) each time the status of a job changes (including the first
+        status seen), and returns a dictionary of the last status of each job, which is
+        the value of 'yield from' or of StopIteration:
+
+            for job_id, status, job in mosaic.wait_for_jobs(job_ids, timeout=3600):
+                print(job_id, status)
+
+        A job that is not found, e.g. because it has been removed from the queue, is given
+        the status 'unknown'. A job whose status cannot be read for any other reason (a
+        server or connection error) is left pending and read again in the next round.
+
+        Each round requests the status of all the unfinished jobs concurrently through the
+        pooled session. The wait between rounds starts at min_interval seconds, grows by
+        half after each round in which no status changed, up to max_interval, and drops
+        back to min_interval when one does.
+        """
+        # Return the job and its status, or None if the status should be read again
+        def get_job(job_id):
+            try:
+                job = self.get_job_status(job_id)
+            except HTTPError as e:
+                if e.response is not None and e.response.status_code == 404:
+                    return None, 'unknown'
+                return None
+            except requests.RequestException:
+                return None
+
+            return job, job['status']
+
+        statuses = {job_id: None for job_id in job_ids}
+        pending = list(statuses)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        interval = min_interval
+        with ThreadPoolExecutor(max_workers=self._pool_size) as executor:
+            while pending:
+                changed = False
+                for job_id, result in zip(pending, executor.map(get_job, pending)):
+                    if result is None:
+                        continue
+                    job, status = result
+                    if status != statuses[job_id]:
+                        statuses[job_id] = status
+                        changed = True
+                        yield job_id, status, job
+                pending = [job_id for job_id in pending if statuses[job_id] not in FINAL_JOB_STATUSES]
+                if not pending:
+                    break
+
+                interval = min_interval if changed else min(interval * 1.5, max_interval)
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    interval = min(interval, remaining)
+                time.sleep(interval)
+
+        return statuses
+
+
     def get_scheduled_job_logs(self):
         yield from self.get_paged_route_iter(f'jobs/scheduled/logs', params=params)
 
@@ -740,7 +1015,7 @@ class Mosaic(object):
         return self.delete(f'tasks/{task_id}')
 
 
-    def get_tasks(self, *, categories=None, completed=None, project_ids=None, types=None, order_dir=None):
+    def get_tasks(self, *, categories=None, completed=None, project_ids=None, types=None, order_dir=None, workers=None):
         params = { }
         if categories:
             params['categories'] = categories
@@ -753,7 +1028,7 @@ class Mosaic(object):
         if order_dir:
             params['order_dir'] = order_dir
 
-        yield from self.get_paged_route_iter(f'tasks', params=params)
+        yield from self.get_paged_route_iter(f'tasks', params=params, workers=workers)
 
 
     def get_task_types(self):
@@ -1042,8 +1317,8 @@ class Project(object):
         return self._mosaic.post(f'{self._path}/genes/sets', data=data)
 
 
-    def put_gene_sets(self, *, name=None, description=None, is_public_to_project=None, gene_ids=None, gene_names=None):
-        data = { 'name': name }
+    def put_gene_sets(self, gene_set_id, *, name=None, description=None, is_public_to_project=None, gene_ids=None, gene_names=None):
+        data = { }
 
         if name:
             data['name'] = name
@@ -1056,7 +1331,7 @@ class Project(object):
         if gene_names:
             data['gene_names'] = gene_names
 
-        return self._mosaic.put(f'{self._path}/genes/sets', data=data)
+        return self._mosaic.put(f'{self._path}/genes/sets/{gene_set_id}', data=data)
 
     """
     PEDIGREE
@@ -1179,6 +1454,15 @@ class Project(object):
         return self._mosaic.get(f'{self._path}/attributes')
 
 
+    def attribute_value_index(self):
+        """
+        Return an AttributeValueIndex of the project's attributes and their values. For a
+        collection this includes the values of every project in the collection, from the
+        single attributes request.
+        """
+        return AttributeValueIndex(self.get_project_attributes())
+
+
     def get_project_attribute_definitions(self, *, attribute_ids = []):
         params = {}
 
@@ -1761,6 +2045,24 @@ class Project(object):
         return self._mosaic.post(f'{self._path}/samples/{sample_id}/hpo-terms', data=data)
 
 
+    def post_samples_hpo_terms(self, assignments, *, workers=None):
+        """
+        Add HPO terms to many samples at once. Each assignment is a (sample_id, hpo_id,
+        sources) tuple, where sources may be None. The terms are posted concurrently
+        through the pooled session (workers defaults to the pool size). Yields
+        (assignment, response, error) for each, in the order given; error is None if the
+        term was added, otherwise the exception raised.
+
+        Terms the sample already has are not skipped; compare against
+        get_samples_hpo_terms first to avoid posting them.
+        """
+        def post(assignment):
+            sample_id, hpo_id, sources = assignment
+            return self.post_sample_hpo_term(sample_id, hpo_id, sources=sources)
+
+        yield from _map_ordered(post, assignments, workers if workers else self._mosaic._pool_size)
+
+
     """
     SAMPLES
     """
@@ -1854,6 +2156,16 @@ class Project(object):
         return self._mosaic.get(f'{self._path}/files/{file_id}/url')
 
 
+    def sample_file_index(self, *, file_types=None):
+        """
+        Return a SampleFileIndex holding every sample file in the project.
+
+        The index is built from the paged samples/files route plus a single
+        samples request, rather than a get_sample_files request per sample.
+        """
+        return SampleFileIndex(self.get_samples(), self.get_all_sample_files(file_types=file_types))
+
+
     def post_sample_file(self, sample_id, *, url=None, experiment_id=None, library_type=None, name, nickname=None, qc=None, reference, file_type, size=None, uri, vcf_sample_name=None):
         data = {
             'name': name,
@@ -2156,8 +2468,22 @@ class Project(object):
         return self._mosaic.get(f'{self._path}/variants/tsv')
 
 
-    def get_project_variants_list(self):
-        yield from self._mosaic.get_paged_route_iter(f'{self._path}/variants/list')
+    def download_variants_tsv(self, destination, *, resume=False, compress=False, progress=None):
+        """
+        Stream the variants tsv to destination (a file path or binary file object). See
+        Mosaic.download for resume, compress and progress.
+        """
+        return self._mosaic.download(f'{self._path}/variants/tsv', destination, resume=resume, compress=compress, progress=progress)
+
+
+    def get_project_variants_list(self, *, order_by=None, order_dir=None):
+        params = { }
+        if order_by:
+            params['order_by'] = order_by
+        if order_dir:
+            params['order_dir'] = order_dir
+
+        yield from self._mosaic.get_paged_route_iter(f'{self._path}/variants/list', params=params)
 
 
     def get_variant_by_position(self, variant_position, *, include_annotation_data=None, include_genotype_data=None):
@@ -2219,6 +2545,36 @@ class Project(object):
         return self._mosaic.get(f'{self._path}/variants/{variant_id}', params=params)
 
 
+    def get_variants(self, variant_ids, *, include_annotation_data=None, include_genotype_data=None, workers=None):
+        """
+        Yield (variant_id, variant) for each of variant_ids, in the order given, with the
+        same data as get_variant. The variants are requested concurrently through the
+        pooled session (workers defaults to the pool size), and each is yielded as soon as
+        it and all those before it have arrived. Variants already fetched with the same
+        flags through this Mosaic instance are not requested again.
+        """
+        variant_ids = list(variant_ids)
+        flags = (include_annotation_data, include_genotype_data)
+        cache = self._mosaic._variant_cache
+
+        def get_variant(variant_id):
+            key = (self.id, variant_id, flags)
+            if key not in cache:
+                cache[key] = self.get_variant(variant_id, include_annotation_data=include_annotation_data, include_genotype_data=include_genotype_data)
+            return cache[key]
+
+        executor = ThreadPoolExecutor(max_workers=workers if workers else self._mosaic._pool_size)
+        try:
+            futures = {}
+            for variant_id in variant_ids:
+                if variant_id not in futures:
+                    futures[variant_id] = executor.submit(get_variant, variant_id)
+            for variant_id in variant_ids:
+                yield variant_id, futures[variant_id].result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
     def post_variant_file(self, file_path, *, sample_map=None, upload_type=None, disable_successful_notification=None):
         data = { }
 
@@ -2324,6 +2680,238 @@ class Project(object):
 
         return self._mosaic.put(f'{self._path}/{view_type}/views/tabs', data=data)
 
+class SampleFileIndex(object):
+    """
+    An in memory index of the sample files in a project, keyed on the sample id,
+    the sample name, and the file id, name, type and uri.
+
+    Each lookup returns a list of the sample file dicts as returned by the API,
+    or an empty list if nothing matches. Build one with Project.sample_file_index().
+    """
+    def __init__(self, samples, sample_files):
+        self.samples = {}
+        self._sample_ids_by_name = {}
+        for sample in samples:
+            self.samples[sample['id']] = sample
+            self._sample_ids_by_name[sample['name']] = sample['id']
+
+        self._files = {}
+        self._by_sample_id = defaultdict(list)
+        self._by_name = defaultdict(list)
+        self._by_type = defaultdict(list)
+        self._by_uri = defaultdict(list)
+
+        for sample_file in sample_files:
+            self.add(sample_file)
+
+
+    def __repr__(self):
+        return f'SampleFileIndex({len(self.samples)} samples, {len(self._files)} files)'
+
+
+    def __len__(self):
+        return len(self._files)
+
+
+    def __iter__(self):
+        return iter(self._files.values())
+
+
+    def add(self, sample_file):
+        """
+        Add a sample file to the index, e.g. one returned by Project.post_sample_file,
+        so the index stays current without being rebuilt. A file already in the index
+        is replaced.
+        """
+        if sample_file.get('sample_id') is None:
+            raise ValueError(f'Sample file {sample_file["id"]} has no sample_id, so it cannot be indexed by sample')
+        if sample_file['id'] in self._files:
+            self._discard(self._files[sample_file['id']])
+
+        self._files[sample_file['id']] = sample_file
+        self._by_sample_id[sample_file['sample_id']].append(sample_file)
+        self._by_name[sample_file.get('name')].append(sample_file)
+        self._by_type[sample_file.get('type')].append(sample_file)
+        self._by_uri[sample_file.get('uri')].append(sample_file)
+
+
+    def get(self, file_id):
+        return self._files.get(file_id)
+
+
+    def sample_id(self, sample_name):
+        return self._sample_ids_by_name.get(sample_name)
+
+
+    def by_sample_id(self, sample_id):
+        return list(self._by_sample_id.get(sample_id, []))
+
+
+    def by_sample_name(self, sample_name):
+        sample_id = self.sample_id(sample_name)
+
+        return self.by_sample_id(sample_id) if sample_id is not None else []
+
+
+    def by_name(self, file_name):
+        return list(self._by_name.get(file_name, []))
+
+
+    def by_type(self, file_type):
+        return list(self._by_type.get(file_type, []))
+
+
+    def by_uri(self, uri):
+        return list(self._by_uri.get(uri, []))
+
+
+    def _discard(self, sample_file):
+        for index, key in ((self._by_sample_id, sample_file['sample_id']), (self._by_name, sample_file.get('name')),
+                           (self._by_type, sample_file.get('type')), (self._by_uri, sample_file.get('uri'))):
+            index[key] = [indexed for indexed in index[key] if indexed['id'] != sample_file['id']]
+            if not index[key]:
+                del index[key]
+
+
+class AttributeValueIndex(object):
+    """
+    An in memory index of project attribute values, as returned by
+    get_project_attributes (for a collection, the values of all its projects). It
+    maps each attribute to its values and the projects holding them, and each project
+    to its values, so questions about the values need no further requests.
+
+    Attributes can be given by id or by name. Lookups of values return the value dicts
+    as returned by the API, or an empty list if nothing matches. Build one with
+    Project.attribute_value_index().
+    """
+    def __init__(self, attributes):
+        self.attributes = {}
+        self._ids_by_name = {}
+        self._by_value = {}
+        self._by_project = defaultdict(lambda: defaultdict(list))
+
+        for attribute in attributes:
+            self.attributes[attribute['id']] = attribute
+            self._ids_by_name[attribute['name']] = attribute['id']
+            by_value = defaultdict(list)
+            for value_info in attribute.get('values', []):
+                by_value[value_info['value']].append(value_info)
+                self._by_project[value_info['project_id']][attribute['id']].append(value_info)
+            self._by_value[attribute['id']] = by_value
+
+
+    def __repr__(self):
+        return f'AttributeValueIndex({len(self.attributes)} attributes, {len(self._by_project)} projects)'
+
+
+    def __len__(self):
+        return len(self.attributes)
+
+
+    def attribute_id(self, attribute):
+        """
+        Return the id of an attribute given by id (as an int or string) or by name, or
+        None if the index has no such attribute.
+        """
+        if attribute in self.attributes:
+            return attribute
+        if attribute in self._ids_by_name:
+            return self._ids_by_name[attribute]
+        try:
+            return int(attribute) if int(attribute) in self.attributes else None
+        except (TypeError, ValueError):
+            return None
+
+
+    def attribute(self, attribute):
+        return self.attributes.get(self.attribute_id(attribute))
+
+
+    def values(self, attribute):
+        """
+        Return the distinct values of an attribute.
+        """
+        return list(self._by_value.get(self.attribute_id(attribute), {}))
+
+
+    def value_infos(self, attribute, value=None):
+        """
+        Return the values of an attribute, or only those equal to value if it is given.
+        """
+        by_value = self._by_value.get(self.attribute_id(attribute), {})
+        if value is not None:
+            return list(by_value.get(value, []))
+
+        return [value_info for value_infos in by_value.values() for value_info in value_infos]
+
+
+    def value_counts(self, attribute):
+        """
+        Return a dictionary from each value of an attribute to the number of times it is
+        held.
+        """
+        return {value: len(value_infos) for value, value_infos in self._by_value.get(self.attribute_id(attribute), {}).items()}
+
+
+    def project_values(self, project_id, attribute=None):
+        """
+        Return the values held by a project, for one attribute if it is given, otherwise
+        for all attributes.
+        """
+        by_attribute = self._by_project.get(project_id, {})
+        if attribute is not None:
+            return list(by_attribute.get(self.attribute_id(attribute), []))
+
+        return [value_info for value_infos in by_attribute.values() for value_info in value_infos]
+
+
+    def value_counts_by_project(self, attribute):
+        """
+        Return a dictionary from each project holding a value for the attribute to the
+        number of values it holds, e.g. the number of records of a longitudinal attribute.
+        """
+        attribute_id = self.attribute_id(attribute)
+        counts = {}
+        for project_id, by_attribute in self._by_project.items():
+            if by_attribute.get(attribute_id):
+                counts[project_id] = len(by_attribute[attribute_id])
+
+        return counts
+
+
+    def projects(self, attribute, *values):
+        """
+        Return the set of ids of projects holding any of the values for the attribute, or
+        any value at all if no values are given.
+        """
+        by_value = self._by_value.get(self.attribute_id(attribute), {})
+        value_infos = [by_value.get(value, []) for value in values] if values else by_value.values()
+
+        return {value_info['project_id'] for infos in value_infos for value_info in infos}
+
+
+    def query(self, *, all_of=None, any_of=None):
+        """
+        Return the set of ids of projects matching (attribute, value) pairs: every pair in
+        all_of, and at least one pair in any_of. If both are given, projects must match
+        both.
+        """
+        if all_of is None and any_of is None:
+            raise ValueError('query requires all_of or any_of')
+
+        matches = None
+        for attribute, value in all_of or []:
+            projects = self.projects(attribute, value)
+            matches = projects if matches is None else matches & projects
+        if any_of is not None:
+            projects = set()
+            for attribute, value in any_of:
+                projects |= self.projects(attribute, value)
+            matches = projects if matches is None else matches & projects
+
+        return matches if matches is not None else set()
+
+
 # If the script fails, provide an error message and exit, alternatively provide a warning
 def warning(message):
   print('WARNING: ', message, sep = '')
@@ -0,0 +1,578 @@
+"""
+Keep a local SQLite copy of the projects in a Mosaic instance, with their collections,
+project and sample attributes, samples, sample files and tasks, so reports can be run as
+SQL queries over a snapshot rather than by paging through the whole instance each time:
+
+    from mosaic_mirror import Mirror
+
+    mirror = Mirror('mosaic.db')
+    mirror.sync(mosaic)
+    for row in mirror.query('SELECT name, variant_count FROM projects WHERE is_collection = 0'):
+        print(row['name'], row['variant_count'])
+    mirror.close()
+
+sync() with no project ids mirrors every project the user can see, and removes projects
+that are no longer returned. Given project ids, only those projects are refreshed. Each
+project is replaced in a single transaction, so a query never sees a project half synced.
+
+Every table has a data column holding the record as returned by the API, as json, so
+fields without a column of their own can still be queried with json_extract, e.g.
+
+    SELECT id FROM tasks WHERE json_extract(data, '$.is_completed') = 0
+
+Once a mirror has been built, sync_changes() keeps it current at a cost that follows what
+has changed: it reads the activities of each project since the last one applied, and
+reads again only the resources those activities touch:
+
+    mirror.sync_changes(mosaic)
+
+sync_changes() only adds projects new to the instance once a full sync() has been run; a
+mirror of chosen projects stays limited to those projects.
+
+Project attribute values are stored against the project holding them. The values a
+collection returns for its projects are not stored with the collection, as each project
+is mirrored itself.
+"""
+
+import json
+import sqlite3
+import time
+
+from mosaic import Project, _map_ordered, _today
+
+# Increment when the schema changes. A mirror with a different version cannot be opened for
+# reading; it is rebuilt by the next full sync
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    nickname TEXT,
+    description TEXT,
+    reference TEXT,
+    is_collection INTEGER,
+    is_template INTEGER,
+    variant_count INTEGER,
+    synced_at TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS projects_name ON projects (name);
+
+CREATE TABLE IF NOT EXISTS collection_projects (
+    collection_id INTEGER,
+    project_id INTEGER,
+    PRIMARY KEY (collection_id, project_id)
+);
+CREATE INDEX IF NOT EXISTS collection_projects_project ON collection_projects (project_id);
+
+CREATE TABLE IF NOT EXISTS project_attributes (
+    project_id INTEGER,
+    attribute_id INTEGER,
+    uid TEXT,
+    name TEXT,
+    value_type TEXT,
+    is_longitudinal INTEGER,
+    data TEXT,
+    PRIMARY KEY (project_id, attribute_id)
+);
+CREATE INDEX IF NOT EXISTS project_attributes_name ON project_attributes (name);
+
+CREATE TABLE IF NOT EXISTS project_attribute_values (
+    project_id INTEGER,
+    attribute_id INTEGER,
+    value_id INTEGER,
+    value TEXT,
+    record_date TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS project_attribute_values_project ON project_attribute_values (project_id, attribute_id);
+CREATE INDEX IF NOT EXISTS project_attribute_values_value ON project_attribute_values (attribute_id, value);
+
+CREATE TABLE IF NOT EXISTS sample_attributes (
+    project_id INTEGER,
+    attribute_id INTEGER,
+    uid TEXT,
+    name TEXT,
+    value_type TEXT,
+    data TEXT,
+    PRIMARY KEY (project_id, attribute_id)
+);
+CREATE INDEX IF NOT EXISTS sample_attributes_name ON sample_attributes (name);
+
+CREATE TABLE IF NOT EXISTS sample_attribute_values (
+    project_id INTEGER,
+    attribute_id INTEGER,
+    sample_id INTEGER,
+    value TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS sample_attribute_values_sample ON sample_attribute_values (sample_id, attribute_id);
+CREATE INDEX IF NOT EXISTS sample_attribute_values_value ON sample_attribute_values (attribute_id, value);
+CREATE INDEX IF NOT EXISTS sample_attribute_values_project ON sample_attribute_values (project_id);
+
+CREATE TABLE IF NOT EXISTS samples (
+    id INTEGER PRIMARY KEY,
+    project_id INTEGER,
+    name TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS samples_project ON samples (project_id);
+CREATE INDEX IF NOT EXISTS samples_name ON samples (name);
+
+CREATE TABLE IF NOT EXISTS sample_files (
+    id INTEGER PRIMARY KEY,
+    project_id INTEGER,
+    sample_id INTEGER,
+    name TEXT,
+    type TEXT,
+    uri TEXT,
+    reference TEXT,
+    vcf_sample_name TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS sample_files_project ON sample_files (project_id);
+CREATE INDEX IF NOT EXISTS sample_files_sample ON sample_files (sample_id);
+CREATE INDEX IF NOT EXISTS sample_files_type ON sample_files (type);
+
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    project_id INTEGER,
+    type TEXT,
+    category TEXT,
+    variant_set_id INTEGER,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_project ON tasks (project_id);
+CREATE INDEX IF NOT EXISTS tasks_type ON tasks (type, category);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    project_id INTEGER PRIMARY KEY,
+    activity_id INTEGER,
+    activity_date TEXT
+);
+
+CREATE TABLE IF NOT EXISTS mirror_info (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# The resources mirrored for each project, and the tables holding their rows. tasks are
+# read for all projects at once, so are not in _PROJECT_RESOURCES
+_RESOURCE_TABLES = {
+    'collection_projects': [('collection_projects', 'collection_id')],
+    'attributes': [('project_attributes', 'project_id'), ('project_attribute_values', 'project_id')],
+    'sample_attributes': [('sample_attributes', 'project_id'), ('sample_attribute_values', 'project_id')],
+    'samples': [('samples', 'project_id')],
+    'sample_files': [('sample_files', 'project_id')],
+    'tasks': [('tasks', 'project_id')]
+}
+_PROJECT_RESOURCES = ['collection_projects', 'attributes', 'sample_attributes', 'samples', 'sample_files']
+
+# The tables holding rows for a project, and their project id column
+_PROJECT_TABLES = [table for tables in _RESOURCE_TABLES.values() for table in tables] + [('sync_state', 'project_id'), ('projects', 'id')]
+
+# The resources to read again after each type of activity, for sync_changes. Activities
+# of other types (e.g. comment_posted) change nothing that is mirrored. variants_added only
+# changes the variant count, which is refreshed from the projects list on every sync
+ACTIVITY_RESOURCES = {
+    'sample_added': ['samples', 'sample_attributes', 'sample_files'],
+    'attribute_added': ['sample_attributes'],
+    'project_attribute_added': ['attributes'],
+    'project_attribute_updated': ['attributes'],
+    'collection_projects_added': ['collection_projects'],
+    'collection_projects_removed': ['collection_projects'],
+    'experiment_added': ['sample_files'],
+    'task_completed': ['tasks']
+}
+
+
+class Mirror(object):
+    def __init__(self, path, *, rebuild=False):
+        """
+        Open the mirror at path, creating it if it does not exist. A mirror built with a
+        different schema version raises a ValueError, unless rebuild is set, when it is
+        left as it is until the next full sync() drops and rebuilds it.
+        """
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute('PRAGMA journal_mode=WAL')
+
+        version = self._info('schema_version')
+        self._out_of_date = version is not None and int(version) != SCHEMA_VERSION
+        if self._out_of_date:
+            if not rebuild:
+                self._connection.close()
+                raise ValueError(f'The mirror {path} has schema version {version} but version {SCHEMA_VERSION} is needed. Run mirror/sync_mirror.py to rebuild it')
+        else:
+            self._create_tables()
+
+
+    def __repr__(self):
+        return f'Mirror({self.path})'
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def close(self):
+        self._connection.close()
+
+
+    def query(self, sql, params=()):
+        """
+        Run a query against the mirror and return the rows. Rows can be indexed by
+        column name or position, and dict(row) gives a dict.
+        """
+        return self._connection.execute(sql, params).fetchall()
+
+
+    def project_ids(self):
+        return [row['id'] for row in self.query('SELECT id FROM projects ORDER BY id')]
+
+
+    def covers_all_projects(self):
+        """
+        Return True if the mirror holds every project of the instance, i.e. a full sync()
+        has been run, rather than only the projects given to sync(). synced_at in
+        mirror_info is only set by a full sync, so records this.
+        """
+        return self._info('synced_at') is not None
+
+
+    def synced_at(self):
+        """
+        Return the time of the last complete sync of the instance, or None if there has
+        not been one.
+        """
+        return self._info('synced_at')
+
+
+    def sync(self, mosaic, project_ids=None, *, workers=None, progress=None):
+        """
+        Mirror the given projects, or all projects if none are given. The projects are
+        read concurrently through the pooled session of mosaic (workers defaults to the
+        pool size), and written to the mirror as each is read. progress, if given, is
+        called with (project_id, error) after each project; error is None if the
+        project was mirrored, otherwise the exception raised, and the project's
+        existing rows are left in place. Returns the number of projects mirrored.
+        """
+        full = project_ids is None
+        if full:
+            projects = list(mosaic.get_projects())
+        else:
+            projects = list(mosaic.get_projects(project_ids=[int(project_id) for project_id in project_ids]))
+        tasks = self._tasks_by_project(mosaic)
+        if self._out_of_date:
+            self._drop_tables()
+            self._create_tables()
+            self._out_of_date = False
+
+        synced = 0
+        fetches = [(project_info, _PROJECT_RESOURCES) for project_info in projects]
+        for project_info, data, error in self._fetch_projects(mosaic, fetches, workers):
+            if not error:
+                data['tasks'] = tasks.get(project_info['id'], [])
+                self._write_project(project_info, data, _today())
+                synced += 1
+            if progress:
+                progress(project_info['id'], error)
+
+        # A full sync also removes the projects that no longer exist
+        if full:
+            current = {project_info['id'] for project_info in projects}
+            with self._connection:
+                for project_id in set(self.project_ids()) - current:
+                    self._delete_project(project_id)
+                self._set_info('synced_at', _now())
+
+        return synced
+
+
+    def sync_changes(self, mosaic, *, workers=None, progress=None):
+        """
+        Bring the mirror up to date by re-reading only what has changed. The activities
+        of each mirrored project since its high-water mark (the newest activity already
+        applied) are read, and only the resources those activities touch are read
+        again, e.g. the samples, sample attributes and sample files of a project with a
+        sample_added activity. Deleted projects are removed. The projects list itself is
+        read every time, which also refreshes the project fields (e.g. the variant count).
+
+        If the mirror covers all projects (a full sync() has been run), projects new to
+        the instance are mirrored in full. Otherwise only the projects already mirrored
+        are updated, and no others are added.
+
+        Changes that do not create an activity, such as an edit to a sample attribute
+        value, are only picked up by sync(), so a full sync should still be run from time
+        to time.
+
+        progress is as for sync(). Returns a dict with the ids of the projects 'added'
+        and 'removed', the resources re-read for each project 'updated', and the number
+        of 'activities' applied.
+        """
+        if self._out_of_date:
+            raise ValueError(f'The mirror {self.path} has an old schema version, and must be rebuilt by a full sync')
+        if self.covers_all_projects():
+            projects = list(mosaic.get_projects())
+        else:
+            mirrored = self.project_ids()
+            projects = list(mosaic.get_projects(project_ids=mirrored)) if mirrored else []
+        states = {row['project_id']: row for row in self.query('SELECT * FROM sync_state')}
+        summary = {'added': [], 'updated': {}, 'removed': [], 'activities': 0}
+
+        # Projects without a high-water mark have not been mirrored, so are read in full.
+        # The others are read from their activities
+        fetches = []
+        for project_info in projects:
+            state = states.get(project_info['id'])
+            fetches.append((project_info, _PROJECT_RESOURCES if state is None else (state['activity_id'], state['activity_date'])))
+
+        task_projects = []
+        for project_info, data, error in self._fetch_projects(mosaic, fetches, workers):
+            project_id = project_info['id']
+            if not error:
+                if project_id not in states:
+                    task_projects.append(project_id)
+                    data['tasks'] = []
+                    self._write_project(project_info, data, _today())
+                    summary['added'].append(project_id)
+                else:
+                    with self._connection:
+                        self._write_project_row(project_info)
+                        for resource in _PROJECT_RESOURCES:
+                            if resource in data['resources']:
+                                self._write_resource(project_id, resource, data[resource])
+                        if data['activity_id'] is not None:
+                            self._set_state(project_id, data['activity_id'], data['activity_date'])
+                    if 'tasks' in data['resources']:
+                        task_projects.append(project_id)
+                    if data['resources']:
+                        summary['updated'][project_id] = sorted(data['resources'])
+                    summary['activities'] += data['activities']
+            if progress:
+                progress(project_id, error)
+
+        # Tasks only come from the instance wide tasks route, so they are read once for all the
+        # projects that need them
+        if task_projects:
+            tasks = self._tasks_by_project(mosaic)
+            with self._connection:
+                for project_id in task_projects:
+                    self._write_resource(project_id, 'tasks', tasks.get(project_id, []))
+                    if project_id in summary['updated']:
+                        summary['updated'][project_id] = sorted(set(summary['updated'][project_id]) | {'tasks'})
+
+        # Remove the projects that no longer exist. For a partial mirror, only the mirrored
+        # projects were asked for, so any of them not returned no longer exist
+        current = {project_info['id'] for project_info in projects}
+        with self._connection:
+            for project_id in set(self.project_ids()) - current:
+                self._delete_project(project_id)
+                summary['removed'].append(project_id)
+            self._set_info('changes_synced_at', _now())
+
+        return summary
+
+
+    def _fetch_projects(self, mosaic, fetches, workers):
+        """
+        Read the data for each (project_info, what) pair on a pool of threads, yielding
+        (project_info, data, error) in order. what is either the resources to read or,
+        for an incremental sync, the project's high-water mark. The rows are written by
+        the caller, as sqlite connections cannot be shared between threads.
+        """
+        def fetch(fetch_info):
+            project_info, what = fetch_info
+            project = Project(mosaic=mosaic, project_data=project_info)
+            if isinstance(what, tuple):
+                return self._fetch_changes(project, *what)
+
+            return self._fetch_resources(project, what)
+
+        for (project_info, _), data, error in _map_ordered(fetch, fetches, workers if workers else mosaic._pool_size):
+            yield project_info, data, error
+
+
+    def _fetch_resources(self, project, resources):
+        data = {}
+        for resource in resources:
+            if resource == 'collection_projects':
+                data[resource] = (project.get_project().get('collection_project_ids') or []) if project.data.get('is_collection') else []
+            elif resource == 'attributes':
+                data[resource] = project.get_project_attributes()
+            elif resource == 'sample_attributes':
+                data[resource] = project.get_sample_attributes(include_values='true')
+            elif resource == 'samples':
+                data[resource] = project.get_samples()
+            elif resource == 'sample_files':
+                data[resource] = list(project.get_all_sample_files())
+
+        return data
+
+
+    def _fetch_changes(self, project, activity_id, activity_date):
+        """
+        Read the activities since the high-water mark and the resources they touch. The
+        activities are requested from the day of the mark, and those up to and including
+        the mark itself are skipped.
+        """
+        resources = set()
+        activities = 0
+        newest_id, newest_date = activity_id, activity_date
+        for activity in project.get_activities(from_date=activity_date):
+            if activity_id is not None and activity['id'] <= activity_id:
+                continue
+            activities += 1
+            resources.update(ACTIVITY_RESOURCES.get(activity['type'], []))
+            if newest_id is None or activity['id'] > newest_id:
+                newest_id = activity['id']
+            if activity.get('created_at'):
+                newest_date = max(newest_date or '', str(activity['created_at'])[:10])
+
+        data = self._fetch_resources(project, [resource for resource in _PROJECT_RESOURCES if resource in resources])
+        data['resources'] = resources
+        data['activities'] = activities
+        data['activity_id'] = newest_id
+        data['activity_date'] = newest_date
+
+        return data
+
+
+    def _tasks_by_project(self, mosaic):
+        tasks = {}
+        for task in mosaic.get_tasks():
+            tasks.setdefault(task['project_id'], []).append(task)
+
+        return tasks
+
+
+    def _write_project(self, project_info, data, activity_date):
+        """
+        Replace all the rows of a project. activity_date starts the high-water mark of the
+        project, so the next sync_changes applies the activities from that day on.
+        """
+        project_id = project_info['id']
+        with self._connection:
+            self._delete_project(project_id)
+            self._write_project_row(project_info)
+            for resource in _PROJECT_RESOURCES + ['tasks']:
+                self._write_resource(project_id, resource, data[resource])
+            self._set_state(project_id, None, activity_date)
+
+
+    def _write_project_row(self, project_info):
+        self._connection.execute('INSERT OR REPLACE INTO projects VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (
+            project_info['id'], project_info.get('name'), project_info.get('nickname'), project_info.get('description'),
+            project_info.get('reference'), _flag(project_info.get('is_collection')), _flag(project_info.get('is_template')),
+            project_info.get('variant_count'), _now(), _json(project_info)))
+
+
+    def _write_resource(self, project_id, resource, rows):
+        """
+        Replace the rows of one resource of a project.
+        """
+        for table, column in _RESOURCE_TABLES[resource]:
+            self._connection.execute(f'DELETE FROM {table} WHERE {column} = ?', (project_id,))
+
+        if resource == 'collection_projects':
+            self._connection.executemany('INSERT OR IGNORE INTO collection_projects VALUES (?, ?)',
+                [(project_id, sub_project_id) for sub_project_id in rows])
+        elif resource == 'attributes':
+            self._write_attributes(project_id, rows)
+        elif resource == 'sample_attributes':
+            self._write_sample_attributes(project_id, rows)
+        elif resource == 'samples':
+            self._connection.executemany('INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?)',
+                [(sample['id'], project_id, sample.get('name'), _json(sample)) for sample in rows])
+        elif resource == 'sample_files':
+            self._connection.executemany('INSERT OR REPLACE INTO sample_files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(sample_file['id'], project_id, sample_file.get('sample_id'), sample_file.get('name'), sample_file.get('type'),
+                  sample_file.get('uri'), sample_file.get('reference'), sample_file.get('vcf_sample_name'), _json(sample_file))
+                 for sample_file in rows])
+        elif resource == 'tasks':
+            self._connection.executemany('INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?, ?, ?)',
+                [(task['id'], project_id, task.get('type'), task.get('category'), task.get('variant_set_id'), _json(task))
+                 for task in rows])
+
+
+    def _write_attributes(self, project_id, attributes):
+        for attribute in attributes:
+            definition = {key: value for key, value in attribute.items() if key != 'values'}
+            self._connection.execute('INSERT OR REPLACE INTO project_attributes VALUES (?, ?, ?, ?, ?, ?, ?)', (
+                project_id, attribute['id'], attribute.get('uid'), attribute.get('name'), attribute.get('value_type'),
+                _flag(attribute.get('is_longitudinal')), _json(definition)))
+            self._connection.executemany('INSERT INTO project_attribute_values VALUES (?, ?, ?, ?, ?, ?)',
+                [(project_id, attribute['id'], value_info.get('id'), _text(value_info.get('value')), value_info.get('record_date'), _json(value_info))
+                 for value_info in attribute.get('values', []) if value_info.get('project_id', project_id) == project_id])
+
+
+    def _write_sample_attributes(self, project_id, attributes):
+        for attribute in attributes:
+            definition = {key: value for key, value in attribute.items() if key != 'values'}
+            self._connection.execute('INSERT OR REPLACE INTO sample_attributes VALUES (?, ?, ?, ?, ?, ?)', (
+                project_id, attribute['id'], attribute.get('uid'), attribute.get('name'), attribute.get('value_type'), _json(definition)))
+            self._connection.executemany('INSERT INTO sample_attribute_values VALUES (?, ?, ?, ?, ?)',
+                [(project_id, attribute['id'], value_info.get('sample_id'), _text(value_info.get('value')), _json(value_info))
+                 for value_info in attribute.get('values', [])])
+
+
+    def _set_state(self, project_id, activity_id, activity_date):
+        self._connection.execute('INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?)', (project_id, activity_id, activity_date))
+
+
+    def _delete_project(self, project_id):
+        for table, column in _PROJECT_TABLES:
+            self._connection.execute(f'DELETE FROM {table} WHERE {column} = ?', (project_id,))
+
+
+    def _create_tables(self):
+        self._connection.executescript(_SCHEMA)
+        self._set_info('schema_version', SCHEMA_VERSION)
+        self._connection.commit()
+
+
+    def _drop_tables(self):
+        for table, _ in _PROJECT_TABLES + [('mirror_info', None)]:
+            self._connection.execute(f'DROP TABLE IF EXISTS {table}')
+
+
+    def _info(self, key):
+        try:
+            row = self._connection.execute('SELECT value FROM mirror_info WHERE key = ?', (key,)).fetchone()
+        except sqlite3.OperationalError:
+            return None
+
+        return row['value'] if row else None
+
+
+    def _set_info(self, key, value):
+        self._connection.execute('INSERT OR REPLACE INTO mirror_info VALUES (?, ?)', (key, str(value)))
+
+
+def _now():
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+
+
+def _flag(value):
+    return None if value is None else int(bool(value))
+
+
+# Store lists and dicts as json, and anything else as text, so values compare as strings in queries
+def _text(value):
+    if value is None:
+        return None
+    if isinstance(value, (list, dict)):
+        return _json(value)
+
+    return str(value)
+
+
+def _json(value):
+    return json.dumps(value, default=str)
@@ -19,17 +19,8 @@ def main():
   except Exception as e:
     fail('Failed to open project. Error was: ' + str(e))
 
-  # Find the attribute
-  project_value_counts = {}
-  for attribute in project.get_project_attributes():
-    if attribute['id'] == int(args.attribute_id):
-
-      # Loop over all of the values and find all unique values
-      for value_info in attribute['values']:
-        if value_info['project_id'] not in project_value_counts:
-          project_value_counts[value_info['project_id']] = 1
-        else:
-          project_value_counts[value_info['project_id']] += 1
+  # Count the values each project has for the attribute
+  project_value_counts = project.attribute_value_index().value_counts_by_project(int(args.attribute_id))
 
   # Write out the results
   output_list = []
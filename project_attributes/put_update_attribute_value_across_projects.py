@@ -7,7 +7,7 @@ from datetime import datetime
 from pprint import pprint
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
-from _bootstrap import base_parser, init, fail
+from _bootstrap import base_parser, init, warning, fail
 
 def main():
   global project_info
@@ -16,7 +16,7 @@ def main():
   # Parse the command line
   args = parse_command_line()
 
-  api_mosaic = init(args)
+  api_mosaic = init(args, pool_size = args.workers)
 
   # Open an api client project object for the defined project
   collection = api_mosaic.get_project(args.project_id)
@@ -26,44 +26,37 @@ def main():
   # The same project can have multiple values, so keep track of which projects have already been seen
   observed_projects = []
 
-  # Loop over the attributes and populate project_info with all required project attribute values
-  for attribute in collection.get_project_attributes():
-    if attribute['id'] == int(args.attribute_id):
-      predefined_values = attribute['predefined_values']
-
-      # Check that the attribute value to change to is in the predefined values, or that the new value should
-      # be added to the predefined values
-      if args.change_value_to not in predefined_values and not args.ignore_predefined_values:
-        fail('The value to change to is not in the predefined values')
-
-      # Loop over the attribute values and check if they are in the predefined values
-      for value_info in attribute['values']:
-        if value_info['value'] == args.change_value_from:
-
-          # Open the relevant project and change the value
-          try:
-            project = api_mosaic.get_project(value_info['project_id'])
-          except Exception as e:
-            fail('Could not open project with id ' + str(value_info['project_id']))
-
-          for project_attribute in project.get_project_attributes():
-            if project_attribute['id'] == int(args.attribute_id):
-
-              # If this is a longitudinal attribute, a different route is required.
-              if project_attribute['is_longitudinal']:
-                for existing_value_info in project_attribute['values']:
-                  record_date = existing_value_info['record_date'] if existing_value_info['record_date'] else str(datetime.now()).split(' ')[0]
-                  value = existing_value_info['value']
-                  try:
-                    project.put_update_attribute_value(args.attribute_id, existing_value_info['id'], value = args.change_value_to, record_date = record_date)
-                  except Exception as e:
-                    fail('Failed to update project attribute for project ' + str(value_info['project_id']) + '. Error was: ' + str(e))
-              else:
-                try:
-                  project.put_project_attributes(args.attribute_id, value = args.change_value_to)
-                except Exception as e:
-                  fail('Failed to update project attribute for project ' + str(value_info['project_id']) + '. Error was: ' + str(e))
-      break
+  # Index the attribute values of all the projects in the collection
+  attribute_values = collection.attribute_value_index()
+  attribute = attribute_values.attribute(int(args.attribute_id))
+  if attribute:
+    predefined_values = attribute['predefined_values']
+
+    # Check that the attribute value to change to is in the predefined values, or that the new value should
+    # be added to the predefined values
+    if args.change_value_to not in predefined_values and not args.ignore_predefined_values:
+      fail('The value to change to is not in the predefined values')
+
+    # Build the changes from the values already in the collection's attributes, so no project needs to be read
+    # again. A longitudinal attribute is updated through its records, which need a record date
+    changes = []
+    for value_info in attribute_values.value_infos(attribute['id'], args.change_value_from):
+      change = {'project_id': value_info['project_id'], 'attribute_id': attribute['id'], 'value': args.change_value_to, 'is_longitudinal': attribute['is_longitudinal']}
+      if attribute['is_longitudinal']:
+        change['value_id'] = value_info['id']
+        change['record_date'] = value_info['record_date'] if value_info.get('record_date') else str(datetime.now()).split(' ')[0]
+      changes.append(change)
+
+    # Make the changes in parallel. As other changes will already have been made, report every failure rather than
+    # stopping at the first
+    failures = 0
+    for change, data, error in api_mosaic.bulk_update_attribute_values(changes, workers = args.workers):
+      if error:
+        warning('Failed to update project attribute for project ' + str(change['project_id']) + '. Error was: ' + str(error))
+        failures += 1
+    print('Updated ', len(changes) - failures, ' values from "', args.change_value_from, '" to "', args.change_value_to, '"', sep = '')
+    if failures:
+      fail('Failed to update ' + str(failures) + ' values')
 
 # Input options
 def parse_command_line():
@@ -85,6 +78,9 @@ def parse_command_line():
   # Choose to add the new value to the predefined values
   optional_arguments.add_argument('--ignore_predefined_values', '-ip', required = False, action = 'store_true', help = 'If set, the new value does not need to be a predefined value')
 
+  # The number of values to update at once
+  optional_arguments.add_argument('--workers', '-w', required = False, type = int, default = 10, metavar = 'integer', help = 'The number of values to update concurrently (default: 10)')
+
   return parser.parse_args()
 
 if __name__ == "__main__":
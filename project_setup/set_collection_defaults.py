@@ -1,5 +1,4 @@
 import os
-import json
 import sys
 
 from os.path import exists
@@ -7,6 +6,7 @@ from pprint import pprint
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 from _bootstrap import base_parser, init, warning, fail
+from project_setup.set_project_defaults import get_json_filename, read_json_file, write, get_settings_changes, get_annotation_versions, get_variant_table_ids
 
 def main():
   global version
@@ -21,11 +21,17 @@ def main():
   data = project.get_project()
   if not data['is_collection']:
     fail('supplied project id needs to be for a collection, not a project')
-  print('Setting collection defaults for ', project.name, ' (id:', project.id,')', sep = '')
+  if args.plan:
+    print('Changes needed to set collection defaults for ', project.name, ' (id:', project.id,')', sep = '')
+  else:
+    print('Setting collection defaults for ', project.name, ' (id:', project.id,')', sep = '')
 
-  # Get the json file
-  json_filename = get_json_filename(project, args)
+  # Get the current collection settings and the json file. The settings are compared with the defaults, and only the
+  # writes that change something are made. In plan mode, the changes are reported, but not made
+  settings = project.get_project_settings()
+  json_filename = get_json_filename(settings, args)
   json_info = read_json_file(json_filename)
+  writes = 0
 
   # Get all the sample attributes in the project
   sample_attribute_names = {}
@@ -40,12 +46,14 @@ def main():
     sample_attribute_uids[sample_attribute['uid']] = sample_attribute['id']
     sample_attribute_ids.append(sample_attribute['id'])
 
-  # Get all the annotations in the project
+  # Get all the annotations in the project, along with their versions
   annotation_uids = {}
   annotation_names = {}
+  annotation_versions = {}
   for annotation in project.get_variant_annotations():
     annotation_uids[annotation['uid']] = annotation['id']
     annotation_names[annotation['name']] = annotation['id']
+    annotation_versions[annotation['id']] = get_annotation_versions(annotation)
 
   #######
   #######
@@ -187,24 +195,34 @@ def main():
   # Remove any specified annotations
   #######
   #######
-  annotations_to_remove = []
   if 'remove_annotations' in json_info:
     for name in json_info['remove_annotations']:
       if name in annotation_names:
-        data = project.delete_variant_annotation(annotation_names[name])
+        writes += write(args.plan, 'delete annotation "' + str(name) + '"', project.delete_variant_annotation, annotation_names[name])
 
   # Set the variants table defaults. The json file can include annotation names, ids or version ids, but they must be
   # specified. If an annotation name, uid, or id is supplied, the "latest" annotation version id will be used, or, if this
   # doesn't exist, the "default" will be used
+  annotation_version_ids = []
   if 'annotations' in json_info:
-    annotation_version_ids = get_variant_table_ids(project, args.project_id, json_info['annotations'], annotation_names, annotation_uids)
-
-  # Set the project settings
-  data = project.put_collection_project_settings(selected_sample_attribute_column_ids = samples_table_columns, \
-         selected_collections_table_columns = projects_table_columns, \
-         selected_collection_attributes = projects_table_attribute_ids, \
-         selected_variant_annotation_version_ids = annotation_version_ids, \
-         selected_sample_attribute_chart_data = sample_attribute_chart_json)
+    annotation_version_ids, imports = get_variant_table_ids(project, args.project_id, json_info['annotations'], annotation_names, annotation_uids, annotation_versions, args.plan, strict = True)
+    writes += imports
+
+  # Update the collection settings that differ from the defaults
+  changed_settings = get_settings_changes(settings, {'selected_sample_attribute_column_ids': samples_table_columns,
+                                                     'selected_collections_table_columns': projects_table_columns,
+                                                     'selected_collection_attributes': projects_table_attribute_ids,
+                                                     'selected_variant_annotation_version_ids': annotation_version_ids,
+                                                     'selected_sample_attribute_chart_data': sample_attribute_chart_json})
+  if changed_settings:
+    writes += write(args.plan, 'update collection settings', project.put_collection_project_settings, **changed_settings)
+
+  # Report if the collection already matched the defaults
+  if not writes:
+    print('  Collection already matches the defaults')
+  elif args.plan:
+    print()
+    print(writes, ' write(s) would be made', sep = '')
 
 # Input options
 def parse_command_line():
@@ -219,125 +237,14 @@ def parse_command_line():
   # The project id to which the filter is to be added is required
   parser.add_argument('--project_id', '-p', required = True, metavar = 'integer', help = 'The Mosaic project id to upload attributes to')
 
+  # Only report the changes that would be made
+  parser.add_argument('--plan', '-n', required = False, action = 'store_true', help = 'If set, print the differences between the collection and the defaults, but do not change the collection')
+
   # Version
   parser.add_argument('--version', '-v', action="version", version='Calypso annotation pipeline version: ' + str(version))
 
   return parser.parse_args()
 
-# Build the json filename
-def get_json_filename(project, args):
-
-  # Build the name of the json file
-  if args.json:
-    json_filename = args.json
-  else:
-    if not args.json_path or not args.instance:
-      fail('No json file was supplied (--json, -j). If no json is supplied, both --json_path (-s) and --instance (-i) must be set so that the filename can be constructed')
-    if not args.json_path.endswith('/'):
-      args.json_path = args.json_path + '/'
-
-    # Get the project reference
-    data = project.get_project_settings()
-    reference = data['reference']
-    json_filename = args.json_path + 'project_defaults_' + str(args.instance) + '_' + str(reference) + '.json'
-
-  return json_filename
-
-# Check that the json containing the required defaults exists and read in the information
-def read_json_file(json_filename):
-  try:
-    json_file = open(json_filename, 'r')
-  except:
-    fail('Could not open the json file: ' + str(json_filename))
-  try:
-    json_info = json.load(json_file)
-  except:
-    fail('Could not read contents of json file ' + str(json_filename) + '. Check that this is a valid json')
-  json_file.close()
-
-  return json_info
-
-# Get the annotation version ids
-def get_variant_table_ids(project, project_id, data, annotation_names, annotation_uids):
-  annotation_version_ids = []
-  annotations_to_import = False
-  for annotation in data:
-    annotation_uid = data[annotation]['uid']
-    annotation_version = data[annotation]['version']
-    skip_missing = False
-    if 'skip_if_missing' in data[annotation]:
-      if data[annotation]['skip_if_missing']:
-        skip_missing = True
-
-    # There may be private annotations that should be included in the defaults. These will have a uid of False
-    if not annotation_uid:
-      if annotation not in annotation_names:
-        if not skip_missing:
-          fail('annotation "' + str(annotation) + '" has no uid provided (assumed to be a private annotation), but no annotation of this name exists in project ' + str(project_id))
-        else:
-          print('WARNING: Skipping "' + str(annotation) + '" as it is not present in the project and has no uid so cannot be imported - private annotation')
-          annotation_id = False
-      else:
-        annotation_id = annotation_names[annotation]
-
-    # If the uid does not correspond to an annotation in the project it will need to be imported
-    elif annotation_uid not in annotation_uids:
-
-      # If annotations_to_import doesn't exist, get all the annotations that can be imported.
-      # We only call this route if it's required, but once it exists, get the id of the annotation
-      # that has been specified and import it
-      if not annotations_to_import:
-        annotations_to_import = {}
-        for import_annotation in project.get_variant_annotations_to_import():
-          annotations_to_import[import_annotation['uid']] = import_annotation['id']
-
-      # Get the id of the annotation to import and import it
-      if annotation_uid not in annotations_to_import:
-        fail('annotation "' + str(annotation) + '" with uid "' + str(annotation_uid) + '" is not available for import')
-      annotation_id = annotations_to_import[annotation_uid]
-      try:
-        project.post_import_annotation(annotation_id)
-      except:
-        continue
-
-    # Otherwise, just get the annotation id for the annotation in the project
-    else:
-      annotation_id = annotation_uids[annotation_uid]
-
-    # If an annotation_id has been found
-    if annotation_id:
-
-      # Get the annotation versions
-      annotation_versions = {}
-      for version_info in project.get_variant_annotation_versions(annotation_id):
-        annotation_versions[version_info['version']] = version_info['id']
-
-      # Find the id for the required version, if the default version was specified...
-      if annotation_version == 'default':
-        if 'default' not in annotation_versions:
-          fail('annotation "' + str(annotation) + '" is set to use the "default" version, but this does not exist for this annotation')
-        annotation_version_ids.append(annotation_versions['default'])
-
-      # ... if the latest version was specified...
-      elif annotation_version == 'latest':
-        if 'Latest' not in annotation_versions:
-          fail('annotation "' + str(annotation) + '" is set to use the "latest" version, but this does not exist for this annotation')
-        annotation_version_ids.append(annotation_versions['Latest'])
-
-      # ... or if the version id was specified
-      else:
-        has_version_id = False
-        for version_info in annotation_versions:
-          if annotation_version == annotation_versions[version_info]:
-            annotation_version_ids.append(annotation_version)
-            has_version_id = True
-            break
-        if not has_version_id:
-          fail('annotation "' + str(annotation) + '" lists "' + str(annotation_version) + '" as the annotation version. This must be "default", "latest", or a valid annotation_version_id')
-
-  # Return the list of version ids
-  return annotation_version_ids
-
 # Throw a warning
 def warning(message):
   print('WARNING: ', message, sep = '')
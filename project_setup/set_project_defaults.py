@@ -26,15 +26,23 @@ def main():
   else:
     project_ids = [args.project_id]
 
-  # Loop over all the projects (for a collection) and apply the filters
+  # Loop over all the projects (for a collection) and apply the defaults. The current state of each project is read
+  # first and compared with the defaults, and only the writes that change something are made. In plan mode, the
+  # changes are reported, but not made
+  writes = 0
   for project_id in project_ids:
 
     project = api_mosaic.get_project(project_id)
-    print('Setting project defaults for ', project.name, ' (id:', project_id,')', sep = '')
+    if args.plan:
+      print('Changes needed to set project defaults for ', project.name, ' (id:', project_id,')', sep = '')
+    else:
+      print('Setting project defaults for ', project.name, ' (id:', project_id,')', sep = '')
 
-    # Get the json file
-    json_filename = get_json_filename(project, args)
+    # Get the current project settings and the json file
+    settings = project.get_project_settings()
+    json_filename = get_json_filename(settings, args)
     json_info = read_json_file(json_filename)
+    project_writes = 0
 
     # Get all the sample attributes in the project
     #sample_attribute_names = {}
@@ -49,12 +57,14 @@ def main():
       sample_attribute_uids[sample_attribute['uid']] = sample_attribute['id']
       sample_attribute_ids.append(sample_attribute['id'])
 
-    # Get all the annotations in the project
+    # Get all the annotations in the project, along with their versions
     annotation_uids = {}
     annotation_names = {}
+    annotation_versions = {}
     for annotation in project.get_variant_annotations():
       annotation_uids[annotation['uid']] = annotation['id']
       annotation_names[annotation['name']] = annotation['id']
+      annotation_versions[annotation['id']] = get_annotation_versions(annotation)
   
     #######
     #######
@@ -170,11 +180,10 @@ def main():
     # Remove any specified annotations
     #######
     #######
-    annotations_to_remove = []
     if 'remove_annotations' in json_info:
       for name in json_info['remove_annotations']:
         if name in annotation_names:
-          data = project.delete_variant_annotation(annotation_names[name])
+          project_writes += write(args.plan, 'delete annotation "' + str(name) + '"', project.delete_variant_annotation, annotation_names[name])
 
     # Set the variants table defaults. The json file can include annotation names, ids or version ids, but they must be
     # specified. If an annotation name, uid, or id is supplied, the "latest" annotation version id will be used, or, if this
@@ -182,9 +191,11 @@ def main():
     annotation_version_ids = []
     watchlist_version_ids = []
     if 'annotations'in json_info:
-      annotation_version_ids = get_variant_table_ids(project, project_id, json_info['annotations'], annotation_names, annotation_uids)
+      annotation_version_ids, imports = get_variant_table_ids(project, project_id, json_info['annotations'], annotation_names, annotation_uids, annotation_versions, args.plan)
+      project_writes += imports
     if 'watchlist_annotations'in json_info:
-      watchlist_version_ids = get_variant_table_ids(project, project_id, json_info['watchlist_annotations'], annotation_names, annotation_uids)
+      watchlist_version_ids, imports = get_variant_table_ids(project, project_id, json_info['watchlist_annotations'], annotation_names, annotation_uids, annotation_versions, args.plan)
+      project_writes += imports
 
     # Get the id of the variant watchlist if it is listed as to be pinned
     if 'pin_watchlist' in json_info:
@@ -205,19 +216,32 @@ def main():
                 is_pinned = True
 
           if not is_pinned:
-            print('Pinning watchlist to the dashboard')
-            project.post_project_dashboard(dashboard_type = 'variant_set', is_active = 'true', variant_set_id = watchlist_id)
+            project_writes += write(args.plan, 'pin the watchlist to the dashboard', project.post_project_dashboard, dashboard_type = 'variant_set', is_active = 'true', variant_set_id = watchlist_id)
 
-    # Set the project settings
-    data = project.put_project_settings(selected_sample_attribute_column_ids = samples_table_columns, \
-           selected_variant_annotation_version_ids = annotation_version_ids, \
-           selected_sample_attribute_chart_data = chart_json)
+    # Update the project settings that differ from the defaults
+    changed_settings = get_settings_changes(settings, {'selected_sample_attribute_column_ids': samples_table_columns,
+                                                       'selected_variant_annotation_version_ids': annotation_version_ids,
+                                                       'selected_sample_attribute_chart_data': chart_json})
+    if changed_settings:
+      project_writes += write(args.plan, 'update project settings', project.put_project_settings, **changed_settings)
 
-    # Get the id of the variant watchlist and update the columns
-    watchlist_id = project.get_variant_watchlist()['id']
+    # Update the columns of the variant watchlist, if they differ from the defaults
     if len(watchlist_version_ids) > 0:
-      data = project.post_variant_set_annotations(watchlist_id, watchlist_version_ids)
-  
+      watchlist = project.get_variant_watchlist()
+      if not is_same(watchlist.get('selected_variant_annotation_version_ids'), watchlist_version_ids):
+        describe_change('watchlist annotations', watchlist.get('selected_variant_annotation_version_ids'), watchlist_version_ids)
+        project_writes += write(args.plan, 'update watchlist annotations', project.post_variant_set_annotations, watchlist['id'], watchlist_version_ids)
+
+    # Report if the project already matched the defaults
+    if not project_writes:
+      print('  Project already matches the defaults')
+    writes += project_writes
+
+  # In plan mode, report the total number of writes that would be made
+  if args.plan:
+    print()
+    print(writes, ' write(s) would be made to ', len(project_ids), ' project(s)', sep = '')
+
 # Input options
 def parse_command_line():
   global version
@@ -231,13 +255,16 @@ def parse_command_line():
   # The project id to which the filter is to be added is required
   parser.add_argument('--project_id', '-p', required = True, metavar = 'integer', help = 'The Mosaic project id to upload attributes to')
 
+  # Only report the changes that would be made
+  parser.add_argument('--plan', '-n', required = False, action = 'store_true', help = 'If set, print the differences between the project and the defaults, but do not change the project')
+
   # Version
   parser.add_argument('--version', '-v', action="version", version='Calypso annotation pipeline version: ' + str(version))
 
   return parser.parse_args()
 
-# Build the json filename
-def get_json_filename(project, args):
+# Build the json filename. The project settings are used to get the reference
+def get_json_filename(settings, args):
 
   # Build the name of the json file
   if args.json:
@@ -249,8 +276,7 @@ def get_json_filename(project, args):
       args.json_path = args.json_path + '/'
 
     # Get the project reference
-    data = project.get_project_settings()
-    reference = data['reference']
+    reference = settings['reference']
     json_filename = args.json_path + 'project_defaults_' + str(args.instance) + '_' + str(reference) + '.json'
 
   return json_filename
@@ -269,10 +295,73 @@ def read_json_file(json_filename):
  
   return json_info
 
-# Get the annotation version ids
-def get_variant_table_ids(project, project_id, data, annotation_names, annotation_uids):
+# Make a write to the project, unless only planning the changes. Either way, describe the write and return
+# the number of writes (1), so the caller can count them
+def write(plan, description, request, *arguments, **keywords):
+  print('  ', description, sep = '')
+  if not plan:
+    request(*arguments, **keywords)
+
+  return 1
+
+# Describe the change to a value
+def describe_change(name, current, desired):
+  print('  ', name, ': ', current, ' -> ', desired, sep = '')
+
+# Check if a current value (from Mosaic) is the same as the desired value. Ids may be returned as integers or strings,
+# so compare them as strings. The order of lists is significant (e.g. the order of the columns in a table)
+def is_same(current, desired):
+  if isinstance(desired, list):
+    return isinstance(current, list) and [str(value) for value in current] == [str(value) for value in desired]
+
+  return str(current) == str(desired)
+
+# Compare the current settings with the desired settings, describe the differences, and return the settings that need
+# to be updated. Empty settings are never sent by the api client, so they are not compared. Chart data is compared on
+# the chart ids, as it may be returned as a json string
+def get_settings_changes(settings, desired_settings):
+  changes = {}
+  for name in desired_settings:
+    desired = desired_settings[name]
+    current = settings.get(name)
+    if not desired:
+      continue
+    if name == 'selected_sample_attribute_chart_data':
+      if isinstance(current, str):
+        try:
+          current = json.loads(current)
+        except json.JSONDecodeError:
+          current = None
+      current_chart_ids = current.get('chart_ids') if isinstance(current, dict) else None
+      if is_same(current_chart_ids, desired['chart_ids']):
+        continue
+      describe_change(name, current_chart_ids, desired['chart_ids'])
+    elif is_same(current, desired):
+      continue
+    else:
+      describe_change(name, current, desired)
+    changes[name] = desired
+
+  return changes
+
+# Get the versions of an annotation (as returned by get_variant_annotations) as a dictionary from the version
+# name to the version id
+def get_annotation_versions(annotation):
+  annotation_versions = {}
+  for version_info in annotation['annotation_versions']:
+    annotation_versions[version_info['version']] = version_info['id']
+
+  return annotation_versions
+
+# Get the annotation version ids, and the number of annotations imported. The versions of annotations already in the
+# project are in annotation_versions, so only the versions of newly imported annotations need to be requested. In plan
+# mode, annotations are not imported, so have no versions and are left out of the returned ids. If strict is set,
+# annotations that cannot be found cause a failure, rather than a warning
+def get_variant_table_ids(project, project_id, data, annotation_names, annotation_uids, annotation_versions, plan, strict = False):
+  report = fail if strict else warning
   annotation_version_ids = []
   annotations_to_import = False
+  imports = 0
   for annotation in data:
     annotation_id = False
     annotation_uid = data[annotation]['uid']
@@ -286,7 +375,7 @@ def get_variant_table_ids(project, project_id, data, annotation_names, annotatio
     if not annotation_uid:
       if annotation not in annotation_names:
         if not skip_missing:
-          warning('annotation "' + str(annotation) + '" has no uid provided (assumed to be a private annotation), but no annotation of this name exists in project ' + str(project_id))
+          report('annotation "' + str(annotation) + '" has no uid provided (assumed to be a private annotation), but no annotation of this name exists in project ' + str(project_id))
         else:
           warning('skipping "' + str(annotation) + '" as it is not present in the project and has no uid so cannot be imported - private annotation')
       else:
@@ -305,53 +394,63 @@ def get_variant_table_ids(project, project_id, data, annotation_names, annotatio
 
       # Get the id of the annotation to import and import it
       if annotation_uid not in annotations_to_import:
-        warning('annotation "' + str(annotation) + '" with uid "' + str(annotation_uid) + '" is not available for import')
-      else:
-        annotation_id = annotations_to_import[annotation_uid]
+        report('annotation "' + str(annotation) + '" with uid "' + str(annotation_uid) + '" is not available for import')
+        continue
+      annotation_id = annotations_to_import[annotation_uid]
       try:
-        project.post_import_annotation(annotation_id)
+        imports += write(plan, 'import annotation "' + str(annotation) + '" (uid: ' + str(annotation_uid) + ')', project.post_import_annotation, annotation_id)
       except:
         continue
 
+      # Record the imported annotation, so it is not imported again if it appears in another list. The versions of
+      # the imported annotation are not known until it has been imported
+      annotation_uids[annotation_uid] = annotation_id
+      if plan:
+        annotation_versions[annotation_id] = None
+      else:
+        annotation_versions[annotation_id] = {}
+        for version_info in project.get_variant_annotation_versions(annotation_id):
+          annotation_versions[annotation_id][version_info['version']] = version_info['id']
+
     # Otherwise, just get the annotation id for the annotation in the project
     else:
       annotation_id = annotation_uids[annotation_uid]
 
-    # If an annotation_id has been found
-    if annotation_id: 
+    # If an annotation_id has been found, get its versions. These are only unknown for an annotation that is
+    # yet to be imported, so in plan mode
+    if annotation_id:
+      versions = annotation_versions[annotation_id]
+      if versions is None:
+        print('  (annotation "' + str(annotation) + '" will be added to the list once imported)')
+        continue
 
-      # Get the annotation versions
-      annotation_versions = {}
-      for version_info in project.get_variant_annotation_versions(annotation_id):
-        annotation_versions[version_info['version']] = version_info['id']
-  
       # Find the id for the required version, if the default version was specified...
       if annotation_version == 'default':
-        if 'default' not in annotation_versions:
-          warning('annotation "' + str(annotation) + '" is set to use the "default" version, but this does not exist for this annotation')
+        if 'default' not in versions:
+          report('annotation "' + str(annotation) + '" is set to use the "default" version, but this does not exist for this annotation')
         else:
-          annotation_version_ids.append(annotation_versions['default'])
-  
+          annotation_version_ids.append(versions['default'])
+
       # ... if the latest version was specified...
       elif annotation_version == 'latest':
-        if 'Latest' not in annotation_versions:
-          warning('annotation "' + str(annotation) + '" is set to use the "latest" version, but this does not exist for this annotation')
+        if 'Latest' not in versions:
+          report('annotation "' + str(annotation) + '" is set to use the "latest" version, but this does not exist for this annotation')
         else:
-          annotation_version_ids.append(annotation_versions['Latest'])
-  
+          annotation_version_ids.append(versions['Latest'])
+
       # ... or if the version id was specified
       else:
         has_version_id = False
-        for version_info in annotation_versions:
-          if annotation_version == annotation_versions[version_info]:
+        for version_info in versions:
+          if annotation_version == versions[version_info]:
             annotation_version_ids.append(annotation_version)
             has_version_id = True
             break
         if not has_version_id:
           fail('annotation "' + str(annotation) + '" lists "' + str(annotation_version) + '" as the annotation version. This must be "default", "latest", or a valid annotation_version_id')
 
-  # Return the list of version ids
-  return annotation_version_ids
+  # Return the list of version ids and the number of imported annotations
+  return annotation_version_ids, imports
 
 # Throw a warning
 def warning(message):
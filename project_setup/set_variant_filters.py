@@ -1,31 +1,28 @@
 import os
-import copy
 import json
 import math
 import glob
 import importlib
 import sys
+import time
 
 from os.path import exists
 from pprint import pprint
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
-from _bootstrap import base_parser, init, warning, fail
+from _bootstrap import base_parser, init, run_in_parallel, warning, fail
 
-def main():
+def main(require_collection = False):
 
   # Parse the command line
   args = parse_command_line()
 
-  # Read the json file describing the filters
+  # Read the json file describing the filters, and validate everything that does not depend on the project once
+  # here, rather than for every project in a collection
   filters_info = read_variant_filters_json(args.variant_filters_json)
-  filter_categories, filters = get_filter_categories(filters_info)
+  filter_categories, compiled_filters = compile_filters(filters_info)
 
-  # The filters_info can be updated based on private annotations, so maintain a clean copy to reset to
-  # after each project
-  filters_info_original = copy.deepcopy(filters_info)
-
-  api_mosaic = init(args)
+  api_mosaic = init(args, pool_size = args.workers)
 
   # Open an api client project object for the defined project
   project = api_mosaic.get_project(args.project_id)
@@ -37,100 +34,134 @@ def main():
   data = project.get_project()
   if data['is_collection']:
     project_ids = data['collection_project_ids']
+  elif require_collection:
+    fail('supplied project id (' + str(args.project_id) + ') is for a project, not a collection')
   else:
     project_ids = [args.project_id]
 
-  # Loop over all the projects (for a collection) and apply the filters
-  for project_id in project_ids:
-    project = api_mosaic.get_project(project_id)
-    print('Setting filters for project ', project.name, ' (id:', project_id,')', sep = '')
-
-    # Get information on the sample available in the Mosaic project. Some variant filters require filtering on genotype. The variant filter
-    # description will contain terms like "Proband": "alt". Therefore, the term Proband needs to be converted to a Mosaic sample id. If
-    # genotype based filters are being omitted, this can be skipped
+  # Loop over all the projects (for a collection) and apply the filters. With more than one worker, the projects are
+  # processed concurrently, but the output for each project is still printed together and in order
+  def set_filters(project_id):
+    return set_project_filters(api_mosaic, project_id, args, filter_categories, compiled_filters)
+
+  summaries = []
+  for project_id, summary in run_in_parallel(set_filters, project_ids, args.workers):
+    summaries.append(summary)
+
+  # Summarise the changes made to all the projects
+  if len(summaries) > 1 or args.workers > 1:
+    print_summary(summaries)
+
+# Apply the filters to a single project and return a summary of the changes made
+def set_project_filters(api_mosaic, project_id, args, filter_categories, compiled_filters):
+  start_time = time.perf_counter()
+  project = api_mosaic.get_project(project_id)
+  print('Setting filters for project ', project.name, ' (id:', project_id,')', sep = '')
+
+  # Get information on the sample available in the Mosaic project. Some variant filters require filtering on genotype. The variant filter
+  # description will contain terms like "Proband": "alt". Therefore, the term Proband needs to be converted to a Mosaic sample id. If
+  # genotype based filters are being omitted, this can be skipped
+  samples = {}
+  has_proband = False
+  proband = False
+  if not args.no_genotype_filters: 
     samples = {}
-    has_proband = False
-    proband = False
-    if not args.no_genotype_filters: 
-      samples = {}
-      for sample in project.get_samples():
-        samples[sample['name']] = {'id': sample['id'], 'relation': False}
-        for attribute in project.get_attributes_for_sample(sample['id']):
-          if attribute['uid'] == 'relation':
-            for value in attribute['values']:
-              if value['sample_id'] == sample['id']:
-                samples[sample['name']]['relation'] = value['value']
-                if value['value'] == 'Proband':
-                  if has_proband: fail('Multiple samples in the Mosaic project are listed as the proband')
-                  has_proband = True
-                  proband = sample['name']
-                break
+    for sample in project.get_samples():
+      samples[sample['name']] = {'id': sample['id'], 'relation': False}
+      for attribute in project.get_attributes_for_sample(sample['id']):
+        if attribute['uid'] == 'relation':
+          for value in attribute['values']:
+            if value['sample_id'] == sample['id']:
+              samples[sample['name']]['relation'] = value['value']
+              if value['value'] == 'Proband':
+                if has_proband: fail('Multiple samples in the Mosaic project are listed as the proband')
+                has_proband = True
+                proband = sample['name']
+              break
   
-    # Get all of the annotations in the current project. When creating a filter, the project will be checked to ensure that it has all of the
-    # required annotations before creating the filter
-    annotation_uids = {}
-    for annotation in project.get_variant_annotations():
+  # Get all of the annotations in the current project. When creating a filter, the project will be checked to ensure that it has all of the
+  # required annotations before creating the filter
+  annotation_uids = {}
+  for annotation in project.get_variant_annotations():
   
-      # Loop over the annotation versions and get the latest (highest id)
+    # Loop over the annotation versions and get the latest (highest id)
 ################
 ################
 ################ REMOVE
 ################
 ################
 ################
-      #highest_annotation_version_id = False
-      #latest_annotation_version_id = False
-      annotation_versions = {}
-      for annotation_version in annotation['annotation_versions']:
-        annotation_versions[annotation_version['version']] = annotation_version['id']
-      #  if annotation_version['version'] == 'Latest':
-      #    latest_annotation_version_id = annotation_version['id']
-      #  if not highest_annotation_version_id:
-      #    highest_annotation_version_id = annotation_version['id']
-      #  elif annotation_version['id'] > highest_annotation_version_id:
-      #    highest_annotation_version_id = annotation_version['id']
-      #  if latest_annotation_version_id:
-      #    annotation_version_id = latest_annotation_version_id
-      #  else:
-      #    annotation_version_id = highest_annotation_version_id
+    #highest_annotation_version_id = False
+    #latest_annotation_version_id = False
+    annotation_versions = {}
+    for annotation_version in annotation['annotation_versions']:
+      annotation_versions[annotation_version['version']] = annotation_version['id']
+    #  if annotation_version['version'] == 'Latest':
+    #    latest_annotation_version_id = annotation_version['id']
+    #  if not highest_annotation_version_id:
+    #    highest_annotation_version_id = annotation_version['id']
+    #  elif annotation_version['id'] > highest_annotation_version_id:
+    #    highest_annotation_version_id = annotation_version['id']
+    #  if latest_annotation_version_id:
+    #    annotation_version_id = latest_annotation_version_id
+    #  else:
+    #    annotation_version_id = highest_annotation_version_id
   
-      annotation_uids[annotation['uid']] = {'id': annotation['id'], 
-                                            #'annotation_version_id': annotation_version_id, 
-                                            'annotation_versions': annotation_versions,
-                                            'name': annotation['name'], 
-                                            'type': annotation['value_type'], 
-                                            'privacy_level': annotation['privacy_level']}
-
-    # Create a dictionary of private annotation names with their uids
-    private_annotation_names = {}
-    for annotation_uid in annotation_uids:
-      if annotation_uids[annotation_uid]['privacy_level'] == 'private':
-        name = annotation_uids[annotation_uid]['name']
-        if name in private_annotation_names:
-          fail('ERROR: Multiple private annotations with the same name (' + str(name) + ' exist in the project, but there can only be one')
-        else:
-          private_annotation_names[name] = {'uid': annotation_uid, 'versions': annotation_uids[annotation_uid]['annotation_versions']}
+    annotation_uids[annotation['uid']] = {'id': annotation['id'], 
+                                          #'annotation_version_id': annotation_version_id, 
+                                          'annotation_versions': annotation_versions,
+                                          'name': annotation['name'], 
+                                          'type': annotation['value_type'], 
+                                          'privacy_level': annotation['privacy_level']}
+
+  # Create a dictionary of private annotation names with their uids
+  private_annotation_names = {}
+  for annotation_uid in annotation_uids:
+    if annotation_uids[annotation_uid]['privacy_level'] == 'private':
+      name = annotation_uids[annotation_uid]['name']
+      if name in private_annotation_names:
+        fail('ERROR: Multiple private annotations with the same name (' + str(name) + ' exist in the project, but there can only be one')
+      else:
+        private_annotation_names[name] = {'uid': annotation_uid, 'versions': annotation_uids[annotation_uid]['annotation_versions']}
   
-    # Determine all of the variant filters that are to be added; remove any filters that already exist with the same name; fill out variant
-    # filter details not in the json (e.g. the uids of private annotations); create the filters; and finally update the project settings to
-    # put the filters in the correct category and sort order. Note that the filters to be applied depend on the family structure. E.g. de novo
-    # filters won't be added to projects without parents
-    sample_map = create_sample_map(samples)
-    print('Processing filters...')
-    filters = get_filters(project, filters_info, filter_categories, filters, samples, sample_map, annotation_uids, private_annotation_names)#, hpo_terms)
-    print()
+  # Determine all of the variant filters that are to be added; remove any filters that already exist with the same name; fill out variant
+  # filter details not in the json (e.g. the uids of private annotations); create the filters; and finally update the project settings to
+  # put the filters in the correct category and sort order. Note that the filters to be applied depend on the family structure. E.g. de novo
+  # filters won't be added to projects without parents
+  sample_map = create_sample_map(samples)
+  print('Processing filters...')
+  filters = get_filters(project, filter_categories, compiled_filters, samples, sample_map, annotation_uids, private_annotation_names)
+  print()
   
-    # Get all of the filters that exist in the project, and check which of these share a name with a filter to be created
+  # In sync mode, compare the filters with those already in the project, and only update filters that differ, and create
+  # filters that are missing. Existing filters with other names are only deleted if all existing filters are to be deleted
+  if args.sync:
+    print('Synchronising filters...')
+    existing_filters, deleted = get_existing_filters(project, args.delete_existing_filters, filters)
+    counts = create_filters(project, annotation_uids, filter_categories, filters, existing_filters)
+
+  # Otherwise, get all of the filters that exist in the project, and check which of these share a name with a filter to
+  # be created. Then create all the required filters and update their categories and sort order in the project settings
+  else:
     if args.delete_existing_filters:
       print('Deleting filters...')
-    delete_filters(project, args.project_id, args.delete_existing_filters, filters)
-  
-    # Create all the required filters and update their categories and sort order in the project settings
+    deleted = delete_filters(project, args.project_id, args.delete_existing_filters, filters)
     print('Creating new filters...')
-    create_filters(project, annotation_uids, filter_categories, filters)
-
-    # Reset filters_info to it's original form
-    filters_info = copy.deepcopy(filters_info_original)
+    counts = create_filters(project, annotation_uids, filter_categories, filters)
+
+  # Return the summary for the project
+  counts.update({'id': project_id, 'name': project.name, 'deleted': deleted, 'seconds': time.perf_counter() - start_time})
+  return counts
+
+# Print the number of filters created, updated, left unchanged, deleted and skipped in each project, with the time taken
+def print_summary(summaries):
+  fields = ['created', 'updated', 'unchanged', 'deleted', 'skipped']
+  print()
+  print('Summary:')
+  for summary in summaries:
+    counts = ', '.join(field + ' ' + str(summary[field]) for field in fields)
+    print('  ', summary['name'], ' (id:', summary['id'], '): ', counts, ' in ', '{:.1f}'.format(summary['seconds']), 's', sep = '')
+  print('  Total: ', ', '.join(field + ' ' + str(sum(summary[field] for summary in summaries)) for field in fields), sep = '')
 
 # Input options
 def parse_command_line():
@@ -145,6 +176,12 @@ def parse_command_line():
   # Optional mosaic arguments
   parser.add_argument('--delete_existing_filters', '-d', required = False, action = 'store_true', help = 'If set, all filters that include genotypes will be omitted')
 
+  # Update existing filters in place rather than deleting and recreating them
+  parser.add_argument('--sync', '-sy', required = False, action = 'store_true', help = 'If set, only filters that differ from the json are updated, and only missing filters are created. With --delete_existing_filters, filters not in the json are deleted')
+
+  # The number of projects in a collection to process concurrently
+  parser.add_argument('--workers', '-w', required = False, type = int, default = 1, metavar = 'integer', help = 'The number of projects to set filters for concurrently (default: 1)')
+
   return parser.parse_args()
 
 # Process the json file describing the filters to apply
@@ -244,8 +281,11 @@ def create_annotation_map(annotations, reference):
   # Return the annotation map
   return annotation_map
 
-# Process all the information on the individual filters
-def get_filters(project, filters_info, categories, filters, samples, sample_map, annotation_uids, private_annotation_names):
+# Validate the filters json and compile each filter into the parts that do not depend on the project: the
+# template information, the requested variant set, and the parsed display. The template is not modified, so
+# it can be shared by every project
+def compile_filters(filters_info):
+  categories, filters = get_filter_categories(filters_info)
 
   # Check all required sections and no others are present
   for section in filters_info:
@@ -278,131 +318,163 @@ def get_filters(project, filters_info, categories, filters, samples, sample_map,
   for category in categories:
     for position in categories[category]:
       name = categories[category][position]
+      info = filters_info['filters'][name]
+      filters[name]['info'] = info
+      filters[name]['is_valid'] = True
+
+      # Check the genotype options and that the annotation_filters section exists
+      if 'genotypes' in info:
+        check_genotype_options(info, name)
+      if 'annotation_filters' not in info['filters']:
+        fail('Annotation filter ' + str(name) + ' does not contain the required "annotation_filters" section')
+
+      # Check if any variant sets are to be applied
+      filters[name]['variant_set_name'] = None
+      if 'variant_sets' in info:
+        if len(info['variant_sets']) > 1:
+          fail('ERROR: Filter "' + str(name) + '" includes multiple variant sets. Only 1 (or 0) variant sets can be included in a filter.')
+        filters[name]['variant_set_name'] = info['variant_sets'][0]
+
+      # Now check if display is present. If so, this will describe how to update the variant table if this filter is applied. The only
+      # allowable fields in this section are 'columns' which defines which column should show in the variant table, and 'sort' which
+      # determines which annotation should be sorted on and how (ascending / descending). Set the "set_display" flag if this is required.
+      # Annotations can be given with a version (uid@version), so store the annotation and version separately
+      filters[name]['set_display'] = 'display' in info
+      filters[name]['column_uids'] = []
+      filters[name]['sort'] = None
+      if filters[name]['set_display']:
+        for field in info['display']:
+
+          # Process the "columns" field. This must contain a list of annotation uids or private annotation names
+          if field == 'column_uids':
+            for value in info['display'][field]:
+              filters[name]['column_uids'].append(split_annotation_version(value))
+
+          # Process the "sort" field which defines the annotation to sort the table on
+          elif field == 'sort':
+            if 'column_uid' in info['display']['sort']:
+              if 'direction' not in info['display']['sort']:
+                warning('Field "direction" is missing from the "display" > "sort" section for filter ' + str(name))
+                filters[name]['is_valid'] = False
+                continue
+
+              # Check that the sort direction is valid
+              sort_direction = info['display']['sort']['direction']
+              if sort_direction != 'ascending' and sort_direction != 'descending':
+                warning('Sort direction must be "ascending" or "descending" for filter ' + str(name))
+                filters[name]['is_valid'] = False
+              sort_uid, version = split_annotation_version(info['display']['sort']['column_uid'])
+              filters[name]['sort'] = {'uid': sort_uid, 'version': version, 'direction': sort_direction}
+
+          else:
+            warning('Unknown field in the "display" section for filter ' + str(name))
+            filters[name]['is_valid'] = False
+
+  # Return the categories and compiled filters
+  return categories, filters
+
+# Split an annotation that may include a version (uid@version) into the annotation and the version
+def split_annotation_version(value):
+  if '@' in value:
+    return value.split('@')[0], value.split('@')[1]
+
+  return value, False
+
+# Copy the parts of a filter template that are modified when the filter is resolved for a project, so the template
+# itself can be reused for the next project
+def copy_filter_info(info):
+  info = dict(info)
+  info['filters'] = dict(info['filters'])
+  info['filters']['annotation_filters'] = [dict(annotation_filter) for annotation_filter in info['filters']['annotation_filters']]
+
+  return info
+
+# Index the variant sets in the project by name, giving the id of the set and whether it is published
+def get_variant_set_index(project):
+  variant_sets = {}
+  for variant_set in project.get_variant_sets():
+    variant_sets[str(variant_set['name'])] = (variant_set['id'], variant_set['is_public_to_project'])
+
+  return variant_sets
+
+# Resolve the compiled filters for a project: convert samples and private annotations to the ids in the project, and
+# find the requested variant sets. The variant sets are only fetched if a filter uses one, and then only once
+def get_filters(project, categories, compiled_filters, samples, sample_map, annotation_uids, private_annotation_names):
+  filters = {}
+  variant_sets = None
+
+  # Loop over the filters
+  for category in categories:
+    for position in categories[category]:
+      name = categories[category][position]
+      compiled_filter = compiled_filters[name]
+      filters[name] = {'category': category, 'sort_position': position, 'set_display': compiled_filter['set_display']}
 
-      # Check if this filter has any requirements, for example, does it require that the case has parents (for e.g. de novo filters)    
-      filters[name]['use_filter'] = check_requirements(filters_info['filters'][name], sample_map)
+      # Check if this filter has any requirements, for example, does it require that the case has parents (for e.g. de novo filters).
+      # Filters that failed validation when the json was compiled are never used
+      filters[name]['use_filter'] = compiled_filter['is_valid'] and check_requirements(compiled_filter['info'], sample_map)
 
       # If this filter is not to be applied to the project, the rest of the filter information can be ignored - e.g. if this is a
       # filter that requires the parents to be present, but they are not
-      if filters[name]['use_filter']:
-        filters[name]['info'] = filters_info['filters'][name]
-
-        # Check the genotype information for the filter
-        if 'genotypes' in filters[name]['info']:
-          filters[name]['info'] = check_genotype_filters(filters[name]['info'], name, list(samples.keys()), sample_map)
-
-        # Check all of the annotation filters
-        filters[name]['info'], filters[name]['use_filter'] = check_annotation_filters(filters[name]['info'], name, annotation_uids, private_annotation_names)
-
-        # Check if any variant sets are to be applied
-        if 'variant_sets' in filters[name]['info']:
-          if len(filters[name]['info']['variant_sets']) > 1:
-            fail('ERROR: Filter "' + str(name) + '" includes multiple variant sets. Only 1 (or 0) variant sets can be included in a filter.')
-          variant_set_name = filters[name]['info']['variant_sets'][0]
-          if variant_set_name:
-
-            # Get the variant sets in the project, then check that only one set is requested in the json and find its id. Also make sure
-            # that the variant set is not a Draft
-            variant_set_id = False
-            for variant_set in project.get_variant_sets():
-              if str(variant_set['name']) == str(variant_set_name):
-                if not variant_set['is_public_to_project']:
-                  fail('ERROR: Filter "' + str(name) + '" includes a Draft variant set (' + str(variant_set_name) + '). Only Published variant sets can be included in filters')
-                variant_set_id = variant_set['id']
-
-            # If the variant set does not exist, do not create the filter
-            if not variant_set_id:
-              filters[name]['use_filter'] = False
-            else:
-              filters[name]['info']['filters']['variant_set_id'] = variant_set_id
-
-        # Now check if display is present. If so, this will describe how to update the variant table if this filter is applied. The only
-        # allowable fields in this section are 'columns' which defines which column should show in the variant table, and 'sort' which
-        # determines which annotation should be sorted on and how (ascending / descending). Set the "setDisplay" flag if this is required
-        if 'display' in filters_info['filters'][name]:
-          filters[name]['set_display'] = True
-          for field in filters_info['filters'][name]['display']:
-
-            # Process the "columns" field. This must contain a list of available annotation uids
-            if field == 'column_uids':
-
-              # Create a new list as some uids will need to be replaced in the list, but the order needs to be preserved
-              ordered_uids = []
-              filters[name]['column_uids'] = filters_info['filters'][name]['display'][field]
-              for value in filters[name]['column_uids']: 
-                uid = False
-
-                # The annotation version can be encoded in the column_uid, so remove this if necessary for this check
-                version = False
-                if '@' in value:
-                  version = value.split('@')[1]
-                  value = value.split('@')[0]
-                if value in annotation_uids:
-                  if version:
-                    uid = str(value) + '@' + str(version)
-                  else:
-                    uid = str(value)
-                else:
-
-                  # Instead of a uid, this could be the name of a private annotation
-                  if value in private_annotation_names:
-                    if version:
-                      uid = str(private_annotation_names[value]['uid']) + '@' + str(version)
-                    else:
-                      uid = private_annotation_names[value]['uid']
-                  else:
-                    warning('unknown value (' + str(value) + ') in "display" > "column_uids" for variant filter ' + str(name))
-                if uid:
-                  ordered_uids.append(uid)
-              filters[name]['column_uids'] = ordered_uids
-
-            # Process the "sort" field which defines the annotation to sort the table on
-            elif field == 'sort':
-              if 'column_uid' not in filters_info['filters'][name]['display']['sort']:
-                filters[name]['sort_column_uid'] = None
-              else:
-                if 'direction' not in filters_info['filters'][name]['display']['sort']:
-                  warning('Field "direction" is missing from the "display" > "sort" section for filter ' + str(name))
-                  filters[name]['use_filter'] = False
-
-                # Check the column to sort on is a valid uid, or is defined in the annotation map
-                # The annotation version can be encoded in the column_uid, so remove this if necessary for this check
-                sort_uid = filters_info['filters'][name]['display'][field]['column_uid']
-                version = False
-                if '@' in sort_uid:
-                  version = sort_uid.split('@')[1]
-                  sort_uid = sort_uid.split('@')[0]
-                if sort_uid in annotation_uids:
-                  if version:
-                    if version not in annotation_uids[value]['versions']:
-                      fail('version "' + str(version) + '" in the sort for filter "' + str(name) + '" does not exist')
-                    sort_uid = str(sort_uid)+ '@' + str(version)
-
-                # If this annotation is a private annotation
-                else:
-                  if sort_uid in private_annotation_names:
-                    if version:
-                      if version not in private_annotation_names[sort_uid]['versions']:
-                        fail('version "' + str(version) + '" in the sort for filter "' + str(name) + '" does not exist')
-                      sort_uid = private_annotation_names[sort_uid]['uid'] + '@' + version
-                    else:
-                      sort_uid = private_annotation_names[sort_uid]['uid']
-                  else:
-                    warning('Unknown uid (' + str(sort_uid) + ') in "display" > "sort" > "column_uid" for variant filter ' + str(name))
-                    filters[name]['use_filter'] = False
-                filters[name]['sort_column_uid'] = sort_uid 
-  
-                # Check that the sort direction is valid
-                filters[name]['sort_direction'] = filters_info['filters'][name]['display'][field]['direction']
-                if filters[name]['sort_direction'] != 'ascending' and filters[name]['sort_direction'] != 'descending':
-                  warning('Sort direction must be "ascending" or "descending" for filter ' + str(name))
-                  filters[name]['use_filter'] = False
-
-            else:
-              warning('Unknown field in the "display" section for filter ' + str(name))
-              filters[name]['use_filter'] = False
+      if not filters[name]['use_filter']:
+        continue
+      info = copy_filter_info(compiled_filter['info'])
+
+      # Check the genotype information for the filter
+      if 'genotypes' in info:
+        info = check_genotype_filters(info, name, list(samples.keys()), sample_map)
+
+      # Check all of the annotation filters
+      info, filters[name]['use_filter'] = check_annotation_filters(info, name, annotation_uids, private_annotation_names)
+      filters[name]['info'] = info
+
+      # Check if a variant set is to be applied. Find its id, and make sure that the variant set is not a Draft
+      variant_set_name = compiled_filter['variant_set_name']
+      if variant_set_name:
+        if variant_sets is None:
+          variant_sets = get_variant_set_index(project)
+
+        # If the variant set does not exist, do not create the filter
+        if str(variant_set_name) not in variant_sets:
+          filters[name]['use_filter'] = False
         else:
-          filters[name]['set_display'] = False
+          variant_set_id, is_public_to_project = variant_sets[str(variant_set_name)]
+          if not is_public_to_project:
+            fail('ERROR: Filter "' + str(name) + '" includes a Draft variant set (' + str(variant_set_name) + '). Only Published variant sets can be included in filters')
+          info['filters']['variant_set_id'] = variant_set_id
+
+      # Resolve the display columns, preserving their order. Instead of a uid, a column can be the name of a private annotation
+      if filters[name]['set_display']:
+        filters[name]['column_uids'] = []
+        for value, version in compiled_filter['column_uids']:
+          uid = False
+          if value in annotation_uids:
+            uid = str(value)
+          elif value in private_annotation_names:
+            uid = str(private_annotation_names[value]['uid'])
+          else:
+            warning('unknown value (' + str(value) + ') in "display" > "column_uids" for variant filter ' + str(name))
+          if uid:
+            filters[name]['column_uids'].append(uid + '@' + str(version) if version else uid)
+
+        # Resolve the column to sort on, which must be a valid uid or the name of a private annotation
+        filters[name]['sort_column_uid'] = None
+        sort = compiled_filter['sort']
+        if sort:
+          sort_uid = sort['uid']
+          version = sort['version']
+          if sort_uid in annotation_uids:
+            if version and version not in annotation_uids[sort_uid]['annotation_versions']:
+              fail('version "' + str(version) + '" in the sort for filter "' + str(name) + '" does not exist')
+          elif sort_uid in private_annotation_names:
+            if version and version not in private_annotation_names[sort_uid]['versions']:
+              fail('version "' + str(version) + '" in the sort for filter "' + str(name) + '" does not exist')
+            sort_uid = private_annotation_names[sort_uid]['uid']
+          else:
+            warning('Unknown uid (' + str(sort_uid) + ') in "display" > "sort" > "column_uid" for variant filter ' + str(name))
+            filters[name]['use_filter'] = False
+          filters[name]['sort_column_uid'] = str(sort_uid) + '@' + str(version) if version else sort_uid
+          filters[name]['sort_direction'] = sort['direction']
 
   # Return the filter information
   return filters
@@ -423,8 +495,8 @@ def check_requirements(filters_info, sample_map):
   # Return whether this filter passes all requirements
   return use_filter
 
-# Get information on the genotype filters and check they are valid
-def check_genotype_filters(data, name, sample_ids, sample_map):
+# Check that the genotype filters only use the allowed genotype options, and that each lists samples
+def check_genotype_options(data, name):
 
   # Store the allowed genotype options for saved filters
   genotype_options = []
@@ -433,18 +505,24 @@ def check_genotype_filters(data, name, sample_ids, sample_map):
   genotype_options.append('het_samples')
   genotype_options.append('hom_samples')
 
-  # Check what genotype filters need to be applied and that the supplied genotypes are valid
+  # Check that the supplied genotypes are valid
   for genotype in data['genotypes']:
     if genotype not in genotype_options:
       fail('Mosaic variant filter with the name ' + str(name) + ', contains an unknown genotype option: ' + str(genotype))
+    if data['genotypes'][genotype] and type(data['genotypes'][genotype]) != list:
+      fail('Mosaic variant filter with the name ' + str(name) + ' has an invalid genotypes section')
+
+# Get information on the genotype filters for the project. The genotype options were checked by check_genotype_options
+def check_genotype_filters(data, name, sample_ids, sample_map):
+
+  # Check what genotype filters need to be applied
+  for genotype in data['genotypes']:
     if not data['genotypes'][genotype]:
       continue
 
     # Check which samples need to have the requested genotype and add to the command. Use the supplied sampleIds
     # list to check that these samples are in the project
     sample_list = []
-    if type(data['genotypes'][genotype]) != list:
-      fail('Mosaic variant filter with the name ' + str(name) + ' has an invalid genotypes section')
     for sample in data['genotypes'][genotype]:
 
       # The genotype filter must either contain a valid sample id for the project, or the value in the json (e.g. proband)
@@ -632,19 +710,88 @@ def check_hpo(data, name, hpo_terms):
 # Get all of the filters that exist in the project, and check which of these share a name with a filter to be created
 def delete_filters(project, project_id, delete_existing, filters):
 
+  deleted = 0
+
   # If the user requested deleting all filters
   if delete_existing:
     for existing_filter in project.get_variant_filters():
       project.delete_variant_filter(existing_filter['id'])
+      deleted += 1
 
   # Otherwise, only delete those that are being recreated
   else:
     for existing_filter in project.get_variant_filters():
       if existing_filter['name'] in filters.keys():
         project.delete_variant_filter(existing_filter['id'])
-
-# Create all the required filters and update their categories and sort order in the project settings
-def create_filters(project, annotation_uids, categories, filters):
+        deleted += 1
+
+  # Return the number of deleted filters
+  return deleted
+
+# In sync mode, get the filters that exist in the project, keyed by name. Filters that share a name with another existing
+# filter are deleted, as are filters that are not being created if all existing filters are to be deleted
+def get_existing_filters(project, delete_existing, filters):
+  existing_filters = {}
+  deleted = 0
+  for existing_filter in project.get_variant_filters():
+    if existing_filter['name'] in existing_filters or (delete_existing and existing_filter['name'] not in filters):
+      project.delete_variant_filter(existing_filter['id'])
+      deleted += 1
+    else:
+      existing_filters[existing_filter['name']] = existing_filter
+
+  # Return the existing filters and the number of deleted filters
+  return existing_filters, deleted
+
+# Build the data describing a filter, as it is sent to Mosaic to create or update the filter. If the variant table
+# display is getting modified, this includes the ids of the columns to show in the table as an array, the id of the
+# column to sort on and the sort direction
+def get_filter_data(annotation_uids, name, category, filter_info):
+  column_ids = []
+  sort_column_id = None
+  sort_direction = None
+  if filter_info['set_display']:
+    for column_uid in filter_info['column_uids']:
+
+      # The uid can contain the version. If so, parse this out and get the annotation version id
+      column_uid, annotation_version = split_annotation_version(column_uid)
+      column_ids.append(get_annotation_version_id(annotation_uids, annotation_version, column_uid))
+    if filter_info['sort_column_uid']:
+      column_uid, annotation_version = split_annotation_version(filter_info['sort_column_uid'])
+      sort_column_id = get_annotation_version_id(annotation_uids, annotation_version, column_uid)
+      if filter_info['sort_direction'] == 'ascending':
+        sort_direction = 'ASC'
+      elif filter_info['sort_direction'] == 'descending':
+        sort_direction = 'DESC'
+
+  return {'name': name,
+          'category': category,
+          'selected_view_columns_annotation_versions': column_ids,
+          'sort_by_column_id': sort_column_id,
+          'sort_dir': sort_direction,
+          'filter': filter_info['info']['filters']}
+
+# Check if an existing filter differs from the filter data. Ids may be returned as integers or strings, so compare
+# them as strings
+def is_filter_changed(existing_filter, data):
+  for field in data:
+    existing = existing_filter.get(field)
+    if field == 'selected_view_columns_annotation_versions':
+      if [str(value) for value in existing or []] != [str(value) for value in data[field]]:
+        return True
+    elif field == 'sort_by_column_id':
+      if (str(existing) if existing else None) != (str(data[field]) if data[field] else None):
+        return True
+    elif existing != data[field]:
+      return True
+
+  return False
+
+# Create all the required filters and update their categories and sort order in the project settings. If existing
+# filters are supplied (sync mode), filters that already exist are only updated if they differ from the json, and the
+# project settings are only updated if the sort order has changed
+def create_filters(project, annotation_uids, categories, filters, existing_filters = None):
+  counts = {'created': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
   sorted_filters = []
   for category in categories:
     record = {'category': category, 'sort_order': []}
@@ -655,44 +802,31 @@ def create_filters(project, annotation_uids, categories, filters):
       # Create the filter, unless it has been marked as not to be added
       if not filters[name]['use_filter']:
         warning('filter with name ' + str(name) + ' was not created because of errors. See previous warnings')
-      else:
+        counts['skipped'] += 1
+        continue
+      data = get_filter_data(annotation_uids, name, category, filters[name])
+
+      # If the filter already exists, update it if anything has changed
+      if existing_filters and name in existing_filters:
+        filter_id = existing_filters[name]['id']
+        if is_filter_changed(existing_filters[name], data):
+          project.update_variant_filter(filter_id, data)
+          counts['updated'] += 1
+        else:
+          counts['unchanged'] += 1
 
-        # If the variant table display is getting modified, get the ids of the columns to show in the table as an array,
-        # the id of the column to sort on and the sort direction
-        column_ids = []
-        sort_column_id = None
-        sort_direction = None
-        if filters[name]['set_display']:
-          for column_uid in filters[name]['column_uids']:
-
-            # The uid can contain the version. If so, parse this out and get the annotation version id
-            annotation_version = False
-            if '@' in column_uid:
-              annotation_version = column_uid.split('@')[1]
-              column_uid = column_uid.split('@')[0]
-            annotation_version_id = get_annotation_version_id(annotation_uids, annotation_version, column_uid)
-            column_ids.append(annotation_version_id)
-          if filters[name]['sort_column_uid']:
-            version = False
-            column_uid = filters[name]['sort_column_uid']
-            if '@' in column_uid:
-              annotation_version = column_uid.split('@')[1]
-              column_uid = column_uid.split('@')[0]
-            sort_column_version_id = get_annotation_version_id(annotation_uids, annotation_version, column_uid)
-            if filters[name]['sort_direction'] == 'ascending':
-              sort_direction = 'ASC'
-            elif filters[name]['sort_direction'] == 'descending':
-              sort_direction = 'DESC'
-
-        filter_info = project.post_variant_filter(name = name, 
-                                                  category = category, 
-                                                  column_ids = column_ids, 
-                                                  sort_column_id = sort_column_version_id, 
-                                                  sort_direction = sort_direction, 
-                                                  filter_data = filters[name]['info']['filters'])
+      # Otherwise create the filter
+      else:
+        filter_info = project.post_variant_filter(name = name,
+                                                  category = category,
+                                                  column_ids = data['selected_view_columns_annotation_versions'],
+                                                  sort_column_id = data['sort_by_column_id'],
+                                                  sort_direction = data['sort_dir'],
+                                                  filter_data = data['filter'])
         filter_id = filter_info['id']
-        record['sort_order'].append(str(filter_id))
-        use_category = True
+        counts['created'] += 1
+      record['sort_order'].append(str(filter_id))
+      use_category = True
 
     # Populate the object used to update the Mosaic project settings. If no filters from this category passed the
     # requirements to be added, skip this step
@@ -709,8 +843,17 @@ def create_filters(project, annotation_uids, categories, filters):
         text += ', ["VARIANT_FILTERS|' + str(filters['category']) + '", [' + ','.join(filters['sort_order']) + ']]'
     sorted_annotations = {'sorted_annotations' : {}}
     sorted_annotations['sorted_annotations'] = {'variant_filters': text}
+
+    # In sync mode, the sort order is only set if it has changed
+    if existing_filters is not None:
+      current_sort_order = (project.get_project_settings().get('sorted_annotations') or {}).get('variant_filters')
+      if current_sort_order == text:
+        return counts
     project_settings = project.put_project_settings(sorted_annotations = sorted_annotations)
 
+  # Return the number of created, updated, unchanged and skipped filters
+  return counts
+
 # If the script fails, provide an error message and exit
 def warning(message):
   print('  WARNING: ', message, sep = '')
@@ -28,11 +28,12 @@ def main():
   # Loop over all of the samples in the project
   print()
   print('Sample files:')
-  for sample in project.get_samples():
+  sample_files = project.sample_file_index()
+  for sample in sample_files.samples.values():
     print('  Sample ', sample['name'], ' (', sample['id'], ')', sep = '')
 
     # Get all of the sample files for each sample
-    for sample_file in project.get_sample_files(sample['id']):
+    for sample_file in sample_files.by_sample_id(sample['id']):
       updated_uri = args.uri + sample_file['name']
       print('    ', sample_file['uri'], ' > ', updated_uri, sep = '')
       success = project.put_sample_file(sample['id'], sample_file['id'], name=sample_file['name'], reference=sample_file['reference'], file_type=sample_file['type'], uri=updated_uri)
@@ -5,6 +5,7 @@ from pprint import pprint
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 from _bootstrap import base_parser, init, fail
+from mosaic_mirror import Mirror
 
 def main():
   global allowed_references
@@ -19,8 +20,19 @@ def main():
     if args.reference not in allowed_references:
       fail('Unknown reference genome: ' + str(args.reference))
 
-  # Get all the available projects
-  for project_info in api_mosaic.get_projects(search = args.search):
+  # Get all the available projects, from a local mirror if one is given
+  if args.mirror:
+    if not os.path.exists(args.mirror):
+      fail('The mirror database does not exist: ' + str(args.mirror))
+    try:
+      mirror = Mirror(args.mirror)
+    except ValueError as e:
+      fail(str(e))
+    with mirror:
+      projects = [dict(row) for row in mirror.query('SELECT name, variant_count, is_template, is_collection FROM projects WHERE name LIKE ? ORDER BY id', ('%' + (args.search or '') + '%',))]
+  else:
+    projects = api_mosaic.get_projects(search = args.search)
+  for project_info in projects:
     display = True
     if args.reference:
       display = False
@@ -60,6 +72,7 @@ def parse_command_line():
 
   # Query params
   optional_arguments.add_argument('--search', '-s', required = False, metavar = 'string', help = 'Term to search on')
+  optional_arguments.add_argument('--mirror', '-db', required = False, metavar = 'string', help = 'Read the projects from this local mirror database (see mirror/sync_mirror.py) rather than from Mosaic')
 
   # Display params
   display_arguments.add_argument('--min_variants', '-min', required = False, metavar = 'integer', help = 'Only output projects with a minimum of this number of variants')
@@ -16,13 +16,10 @@ def main():
   # Open an api client project object for the defined project
   project = api_mosaic.get_project(args.project_id)
 
-  # Get the sample ids
-  for sample in project.get_samples():
-
-    # Loop over all sample files for each sample
-    for sample_file in project.get_sample_files(sample['id']):
-      if sample_file['name'].endswith(args.extension):
-        project.put_sample_file(sample['id'], sample_file['id'], file_type = args.file_type)
+  # Loop over all sample files in the project
+  for sample_file in project.sample_file_index():
+    if sample_file['name'].endswith(args.extension):
+      project.put_sample_file(sample_file['sample_id'], sample_file['id'], file_type = args.file_type)
 
 # Input options
 def parse_command_line():
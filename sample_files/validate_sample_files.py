@@ -14,10 +14,13 @@ def main():
   # Open an api client project object for the defined project
   project = api_mosaic.get_project(args.project_id)
 
+  # Get all of the sample files in the project in a few paged requests
+  sample_files = project.sample_file_index()
+
   # Loop over all samples in the project
-  for sample in project.get_samples():
+  for sample in sample_files.samples.values():
     no_files = 0
-    for sample_file in project.get_sample_files(sample['id']):
+    for sample_file in sample_files.by_sample_id(sample['id']):
       no_files += 1
 
       # If the file does not have a type, throw a warning
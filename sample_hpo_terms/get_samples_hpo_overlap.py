@@ -0,0 +1,75 @@
+import os
+import sys
+
+from itertools import combinations
+from pprint import pprint
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from _bootstrap import base_parser, init, fail
+from hpo_ontology import HpoOntology, samples_hpo_terms
+
+def main():
+
+  # Parse the command line
+  args = parse_command_line()
+
+  api_mosaic = init(args)
+
+  # Open an api client project object for the defined project
+  try:
+    project = api_mosaic.get_project(args.project_id)
+  except Exception as e:
+    fail('Failed to open project. Error was: ' + str(e))
+
+  # Load the ontology, from an obo file if one is given, otherwise from Mosaic or the cache
+  try:
+    hpo = HpoOntology.from_obo(args.obo_file) if args.obo_file else HpoOntology.load(api_mosaic, cache_dir = args.cache_dir)
+  except Exception as e:
+    fail('Failed to load the HPO terms. Error was: ' + str(e))
+
+  # Get the HPO terms of all the samples, and the sample names
+  sample_terms = samples_hpo_terms(project)
+  samples = {}
+  for sample in project.get_samples():
+    samples[sample['id']] = sample['name']
+
+  # If a term is given, output the samples with that term, or a more specific one
+  if args.hpo_id:
+    if args.hpo_id not in hpo:
+      fail('Unknown HPO term: ' + str(args.hpo_id))
+    for sample_id in sample_terms:
+      matches = [hpo_id for hpo_id in sample_terms[sample_id] if hpo_id in hpo and hpo.is_a(hpo_id, args.hpo_id)]
+      if matches:
+        print(samples.get(sample_id, sample_id), ', '.join(matches), sep = '\t')
+
+  # Otherwise output the similarity of the terms of each pair of samples, and their most specific shared terms
+  else:
+    print('sample_a', 'sample_b', 'similarity', 'shared_terms', sep = '\t')
+    for sample_a, sample_b in combinations(sorted(sample_terms), 2):
+      similarity = hpo.similarity(sample_terms[sample_a], sample_terms[sample_b])
+      if similarity < args.min_similarity:
+        continue
+      specific = hpo.most_specific(hpo.overlap(sample_terms[sample_a], sample_terms[sample_b]))
+      print(samples.get(sample_a, sample_a), samples.get(sample_b, sample_b), round(similarity, 3), ', '.join([hpo_id + ' (' + str(hpo.label(hpo_id)) + ')' for hpo_id in sorted(specific)]), sep = '\t')
+
+# Input options
+def parse_command_line():
+  parser, groups = base_parser()
+  project_arguments = groups.project
+  optional_arguments = groups.optional
+
+  # The project whose samples are compared
+  project_arguments.add_argument('--project_id', '-p', required = True, metavar = 'integer', help = 'The Mosaic project id')
+
+  # What to output
+  optional_arguments.add_argument('--hpo_id', '-i', required = False, metavar = 'string', help = 'Only output the samples with this HPO term or a more specific one, e.g. HP:0001250')
+  optional_arguments.add_argument('--min_similarity', '-m', required = False, type = float, default = 0, metavar = 'float', help = 'Only output pairs of samples with at least this similarity (0 to 1). Default: 0')
+
+  # Where to read the ontology from
+  optional_arguments.add_argument('--obo_file', '-o', required = False, metavar = 'string', help = 'Read the ontology from this hp.obo file rather than from Mosaic')
+  optional_arguments.add_argument('--cache_dir', '-cd', required = False, metavar = 'string', help = 'A directory to cache the HPO terms in, so they are only read from Mosaic once')
+
+  return parser.parse_args()
+
+if __name__ == "__main__":
+  main()
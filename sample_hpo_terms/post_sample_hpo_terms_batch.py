@@ -0,0 +1,143 @@
+import os
+import sys
+
+from pprint import pprint
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from _bootstrap import base_parser, init, warning, fail
+from hpo_ontology import HpoOntology, samples_hpo_terms
+
+def main():
+
+  # Parse the command line
+  args = parse_command_line()
+
+  api_mosaic = init(args, pool_size = args.workers)
+
+  # Open an api client project object for the defined project
+  try:
+    project = api_mosaic.get_project(args.project_id)
+  except Exception as e:
+    fail('Failed to open a project with the given id')
+
+  # Read the terms to assign. Samples can be given by name or id
+  samples = {}
+  for sample in project.get_samples():
+    samples[str(sample['id'])] = sample['id']
+    samples[sample['name']] = sample['id']
+  assignments = read_terms(args.terms, samples)
+
+  # Load the ontology, from an obo file if one is given, otherwise from Mosaic or the cache
+  try:
+    hpo = HpoOntology.from_obo(args.obo_file) if args.obo_file else HpoOntology.load(api_mosaic, cache_dir = args.cache_dir)
+  except Exception as e:
+    fail('Failed to load the HPO terms. Error was: ' + str(e))
+
+  # Check every term before anything is posted. Alternative ids are replaced by the term that replaced them, and
+  # terms the sample already has, or that are listed twice, are skipped. The terms a sample already has are mapped the
+  # same way, so a sample holding an alternative id is not given the term that replaced it again
+  existing = {sample_id: {hpo.term_id(hpo_id) or hpo_id for hpo_id in hpo_ids} for sample_id, hpo_ids in samples_hpo_terms(project).items()}
+  queued = set()
+  results = []
+  to_post = []
+  for sample, sample_id, hpo_id, sources in assignments:
+    term_id = hpo.term_id(hpo_id)
+    if sample_id is None:
+      results.append([sample, hpo_id, 'invalid', 'Unknown sample'])
+    elif term_id is None:
+      results.append([sample, hpo_id, 'invalid', 'Unknown HPO term'])
+    elif term_id in existing.get(sample_id, set()):
+      results.append([sample, hpo_id, 'skipped', 'Already assigned'])
+    elif (sample_id, term_id) in queued:
+      results.append([sample, hpo_id, 'skipped', 'Listed more than once'])
+    else:
+      queued.add((sample_id, term_id))
+      to_post.append((sample_id, term_id, sources))
+      results.append([sample, hpo_id, None, 'Replaced by ' + term_id if term_id != hpo_id else ''])
+  invalid = [result for result in results if result[2] == 'invalid']
+  if invalid and not args.skip_invalid:
+    for sample, hpo_id, status, message in invalid:
+      warning(message + ': ' + str(sample) + ', ' + str(hpo_id))
+    fail(str(len(invalid)) + ' of the ' + str(len(results)) + ' terms are invalid. Use --skip_invalid / -si to post the others')
+
+  # Post the new terms concurrently, and fill in their results in the same order
+  posted = None if args.validate_only else project.post_samples_hpo_terms(to_post, workers = args.workers)
+  for result in results:
+    if result[2] is None:
+      if posted is None:
+        result[2] = 'to_add'
+        continue
+      assignment, data, error = next(posted)
+      result[2] = 'failed' if error else 'added'
+      if error:
+        result[3] = str(error)
+
+  # Write the report and a summary
+  counts = {}
+  for result in results:
+    counts[result[2]] = counts.get(result[2], 0) + 1
+  if args.report:
+    try:
+      with open(args.report, 'w') as report:
+        print('sample', 'hpo_id', 'status', 'message', sep = '\t', file = report)
+        for result in results:
+          print(*result, sep = '\t', file = report)
+    except OSError as e:
+      fail('Failed to write the report. Error was: ' + str(e))
+  else:
+    for result in results:
+      if result[2] in ['failed', 'invalid']:
+        print(*result, sep = '\t')
+  print(', '.join([str(counts[status]) + ' ' + status for status in ['added', 'to_add', 'skipped', 'invalid', 'failed'] if status in counts]))
+  if counts.get('failed'):
+    fail(str(counts['failed']) + ' terms failed to post')
+
+# Read the tab separated terms file. Each line holds a sample name or id, a comma separated list of HPO ids and,
+# optionally, a comma separated list of sources. Blank lines and lines starting with # are ignored. Returns a list of
+# (sample, sample_id, hpo_id, sources), with sample_id None for an unknown sample
+def read_terms(filename, samples):
+  assignments = []
+  try:
+    with open(filename) as f:
+      for line_number, line in enumerate(f, 1):
+        if not line.strip() or line.startswith('#'):
+          continue
+        fields = line.rstrip('\r\n').split('\t')
+        if len(fields) < 2:
+          fail('Line ' + str(line_number) + ' of ' + str(filename) + ' must contain a sample and HPO ids')
+        sources = [source.strip() for source in fields[2].split(',') if source.strip()] if len(fields) > 2 else []
+        for hpo_id in fields[1].split(','):
+          if hpo_id.strip():
+            assignments.append((fields[0], samples.get(fields[0]), hpo_id.strip(), sources if sources else None))
+  except OSError as e:
+    fail('Failed to open the terms file. Error was: ' + str(e))
+
+  return assignments
+
+# Input options
+def parse_command_line():
+  parser, groups = base_parser()
+  project_arguments = groups.project
+  required_arguments = groups.required
+  optional_arguments = groups.optional
+
+  # The project holding the samples
+  project_arguments.add_argument('--project_id', '-p', required = True, metavar = 'integer', help = 'The project id')
+
+  # The terms to assign
+  required_arguments.add_argument('--terms', '-t', required = True, metavar = 'string', help = 'A tab separated file with a line per sample: the sample name or id, a comma separated list of HPO ids and, optionally, a comma separated list of sources')
+
+  # Validation
+  optional_arguments.add_argument('--validate_only', '-vo', required = False, action = 'store_true', help = 'Only check the terms and report what would be added, without posting anything')
+  optional_arguments.add_argument('--skip_invalid', '-si', required = False, action = 'store_true', help = 'Post the valid terms even if some are invalid, rather than posting nothing')
+  optional_arguments.add_argument('--obo_file', '-o', required = False, metavar = 'string', help = 'Check the terms against this hp.obo file rather than the HPO terms in Mosaic')
+  optional_arguments.add_argument('--cache_dir', '-cd', required = False, metavar = 'string', help = 'A directory to cache the HPO terms in, so they are only read from Mosaic once')
+
+  # Output and concurrency
+  optional_arguments.add_argument('--report', '-r', required = False, metavar = 'string', help = 'Write the result for every term to this tab separated file. Otherwise only the failures are printed')
+  optional_arguments.add_argument('--workers', '-w', required = False, type = int, default = 10, metavar = 'integer', help = 'The number of terms to post at once. Default: 10')
+
+  return parser.parse_args()
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,123 @@
+"""
+Count and export Mosaic tasks in a single pass over Mosaic.get_tasks, without holding the
+tasks in memory. Only the counts of each group are kept, so memory follows the number of
+groups rather than the number of tasks:
+
+    from task_analytics import TaskAggregator, attribute_key
+
+    site = attribute_key(collection.attribute_value_index(), 'Clinical Site')
+    with open('tasks.csv', 'w') as output:
+        aggregator = TaskAggregator([site, 'type'], csv_file=output, csv_columns=['project_name', 'project_id', 'type'])
+        aggregator.consume(mosaic.get_tasks(workers=4))
+    for (site_name, task_type), count in aggregator.rows():
+        print(site_name, task_type, count)
+
+Group keys and csv columns are each either the name of a task field, or a (name,
+function) pair, where function is called with the task. attribute_key builds the pair for
+the value of a project attribute, looked up in an AttributeValueIndex, so tasks can be
+grouped by e.g. the clinical site of their project with no request per project.
+
+Rows are written to the csv as each task is read, so a csv of any number of tasks can be
+written. Passing workers to get_tasks requests the following pages ahead while the
+current one is processed.
+"""
+
+import csv
+
+from collections import Counter
+
+
+class TaskAggregator(object):
+    def __init__(self, group_by, *, csv_file=None, csv_columns=None, csv_header=True):
+        self.group_by = [_column(key) for key in group_by]
+        self.counts = Counter()
+        self.total = 0
+
+        self._writer = None
+        if csv_file is not None:
+            self.csv_columns = [_column(column) for column in csv_columns] if csv_columns else self.group_by
+            self._writer = csv.writer(csv_file)
+            if csv_header:
+                self._writer.writerow([name for name, _ in self.csv_columns])
+
+
+    def __repr__(self):
+        return f'TaskAggregator({self.total} tasks, {len(self.counts)} groups)'
+
+
+    def add(self, task):
+        """
+        Count a task, and write it to the csv if there is one.
+        """
+        self.counts[tuple(function(task) for _, function in self.group_by)] += 1
+        self.total += 1
+        if self._writer:
+            self._writer.writerow([function(task) for _, function in self.csv_columns])
+
+
+    def consume(self, tasks):
+        """
+        Add every task from an iterable, e.g. Mosaic.get_tasks, and return the aggregator.
+        """
+        for task in tasks:
+            self.add(task)
+
+        return self
+
+
+    def rows(self):
+        """
+        Return a list of (key, count) pairs, in order of the keys, where key is a tuple
+        holding the value of each group_by key. Keys that cannot be compared (e.g. a mix
+        of None and strings) are ordered as strings.
+        """
+        try:
+            return sorted(self.counts.items())
+        except TypeError:
+            return sorted(self.counts.items(), key=lambda item: tuple('' if value is None else str(value) for value in item[0]))
+
+
+    def totals(self, level=1):
+        """
+        Return the counts for the first level group_by keys, summed over the others, as
+        a dictionary from a tuple of those keys' values to the count, e.g. the counts per
+        site from an aggregator grouped by site and type.
+        """
+        totals = Counter()
+        for key, count in self.counts.items():
+            totals[key[:level]] += count
+
+        return dict(totals)
+
+
+    def write_counts(self, output):
+        """
+        Write the counts as a csv, with a column for each group_by key and a count.
+        """
+        writer = csv.writer(output)
+        writer.writerow([name for name, _ in self.group_by] + ['count'])
+        for key, count in self.rows():
+            writer.writerow(list(key) + [count])
+
+
+def attribute_key(attribute_values, attribute, *, name=None, default=None):
+    """
+    Return a (name, function) group key giving the value of a project attribute for the
+    project of a task, from an AttributeValueIndex. If a project has several values (e.g.
+    a longitudinal attribute), the first is used, and default if it has none.
+    """
+    attribute_id = attribute_values.attribute_id(attribute)
+    if attribute_id is None:
+        raise ValueError(f'Unknown project attribute: {attribute}')
+    values = {}
+    for value_info in attribute_values.value_infos(attribute_id):
+        values.setdefault(value_info['project_id'], value_info['value'])
+
+    return (name if name else attribute_values.attribute(attribute_id)['name'], lambda task: values.get(task['project_id'], default))
+
+
+def _column(column):
+    if isinstance(column, str):
+        return column, lambda task: task.get(column)
+
+    return column
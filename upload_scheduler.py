@@ -0,0 +1,102 @@
+"""
+Schedule uploads that create Mosaic jobs (e.g. variant uploads) so they do not flood
+the job queue.
+
+Uploads are added to a local queue with a priority, and run() starts them only while
+the number of jobs in the Mosaic queue that are waiting or active is below max_depth.
+When the queue is full, it checks again every poll_interval seconds:
+
+    from upload_scheduler import UploadScheduler
+
+    scheduler = UploadScheduler(mosaic, max_depth=20)
+    for project_id, vcf in uploads:
+        project = mosaic.get_project(project_id)
+        scheduler.add(vcf, lambda project=project, vcf=vcf: project.post_variant_file(vcf, upload_type='allele'))
+    for name, result, error in scheduler.run():
+        print(name, error if error else result)
+    print(scheduler.summary())
+
+Uploads with a higher priority are started first, and uploads with the same priority
+are started in the order they were added.
+"""
+
+import heapq
+import itertools
+import time
+
+
+class UploadScheduler(object):
+    def __init__(self, mosaic, *, max_depth=20, statuses=('waiting', 'active'), poll_interval=30):
+        self._mosaic = mosaic
+        self.max_depth = max_depth
+        self.statuses = statuses
+        self.poll_interval = poll_interval
+        self._queue = []
+        self._order = itertools.count()
+        self._stats = {'uploaded': 0, 'failed': 0, 'seconds': 0.0, 'queue_wait_seconds': 0.0}
+
+
+    def __len__(self):
+        return len(self._queue)
+
+
+    def add(self, name, upload, *, priority=0):
+        """
+        Add an upload to the local queue. upload is called with no arguments to start the
+        upload, and its return value (normally the response of the post) is yielded by
+        run().
+        """
+        heapq.heappush(self._queue, (-priority, next(self._order), name, upload))
+
+
+    def queue_depth(self):
+        """
+        Return the number of jobs in the Mosaic queue with one of the scheduler's statuses.
+        Only up to max_depth jobs of each status are requested, as more are not needed to
+        know the queue is full.
+        """
+        jobs = self._mosaic.get_queue_status(per_status_end=self.max_depth)['jobs']
+
+        return sum(1 for job in jobs if job['status'] in self.statuses)
+
+
+    def run(self):
+        """
+        Start the queued uploads, yielding (name, result, error) for each as it is
+        started. If an upload raises an exception, result is None and error is the
+        exception; the remaining uploads still run.
+        """
+        start_time = time.perf_counter()
+        try:
+            while self._queue:
+                free = self.max_depth - self.queue_depth()
+                if free <= 0:
+                    wait_start = time.perf_counter()
+                    time.sleep(self.poll_interval)
+                    self._stats['queue_wait_seconds'] += time.perf_counter() - wait_start
+                    continue
+
+                for _ in range(min(free, len(self._queue))):
+                    _, _, name, upload = heapq.heappop(self._queue)
+                    try:
+                        result = upload()
+                    except Exception as e:
+                        self._stats['failed'] += 1
+                        yield name, None, e
+                    else:
+                        self._stats['uploaded'] += 1
+                        yield name, result, None
+        finally:
+            self._stats['seconds'] += time.perf_counter() - start_time
+
+
+    def summary(self):
+        """
+        Return the number of uploads started and failed, the time spent in run() and
+        waiting for the queue, and the number of uploads started per minute.
+        """
+        summary = dict(self._stats)
+        minutes = summary['seconds'] / 60
+        summary['uploads_per_minute'] = summary['uploaded'] / minutes if minutes else 0.0
+
+        return summary
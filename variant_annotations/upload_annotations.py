@@ -1,82 +1,91 @@
 import os
+import re
+import json
 import sys
 
+from multiprocessing import Pool
 from pprint import pprint
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
-from _bootstrap import base_parser, init, fail
+from _bootstrap import base_parser, init, run_in_parallel, warning, fail
+from mosaic import FINAL_JOB_STATUSES
+
+# The first 5 columns of the tsv are coordinate information
+coordinate_columns = 5
+
+# The characters allowed in the ref and alt columns
+allele_pattern = re.compile(r'^[ACGTNacgtn*.-]+$')
+
+# The most errors to report when validating the tsv
+max_errors = 20
 
 def main():
 
   # Parse the command line
   args = parse_command_line()
 
-  api_mosaic = init(args)
+  api_mosaic = init(args, pool_size = args.workers)
 
   # Get the project ids of the GRCh37 and GRCh38 annotations
   grch37_annotations_project_id = api_mosaic.get_config('Project ids', 'annotations_grch37')
   grch38_annotations_project_id = api_mosaic.get_config('Project ids', 'annotations_grch38')
 
-  # Get the uids of all annotations that originate in these projects
+  # Get all annotations that originate in these projects
   available_annotations = {}
   grch37_project = api_mosaic.get_project(grch37_annotations_project_id)
   for annotation in grch37_project.get_variant_annotations():
-    available_annotations[annotation['uid']] = annotation['original_project_id']
+    available_annotations[annotation['uid']] = annotation
 
-  grch38_annotations = {}
   grch38_project = api_mosaic.get_project(grch38_annotations_project_id)
   for annotation in grch38_project.get_variant_annotations():
-    available_annotations[annotation['uid']] = annotation['original_project_id']
-  
-  # Get the uids of all the annotations in the tsv and determine their original project id
-  upload_project_id = None
-  user_defined_project = False
-  user_project_uids = []
+    available_annotations[annotation['uid']] = annotation
+
+  # Read the header of the tsv. Only the first line is read, however large the file
   try:
     with open(args.tsv) as f:
-      for line in f.readlines():
-        fields = line.rstrip().split('\t')
-
-        # Loop over the annotation uids. The first 5 fields are coordinate information
-        for uid in fields[5:]:
-          if uid in available_annotations:
-
-            # If this is the first uid in the tsv, set the upload_project_id to the original project id for this annotation
-            if not upload_project_id:
-              upload_project_id = available_annotations[uid]
-
-            # Otherwise, check that this uid is for an annotation with the same original project id. The tsv file must
-            # contain annotations being uploaded to the same project
-            else:
-              if int(available_annotations[uid]) != int(upload_project_id):
-                fail('All annotation uids in the tsv must have the same original project id')
-
-          # Private or custom annotations will not be in the globals projects. In this case, the user will need to supply the
-          # project id to upload annotations to
-          else:
-
-            # If no project id is set, fail
-            if not args.project_id:
-              fail('Annotation with uid ' + str(uid) + ' is not from the GRCh37 or GRCh38 annotation projects. Please supply the project id (-p) to upload annotations to')
-
-            # Otherwise check that the annotation is in the specified project
-            else:
-
-              # If this is the first annotation, set the upload_project_id to the id provided by the user
-              if not upload_project_id:
-                upload_project_id = args.project_id
-                user_defined_project = True
-
-              # Otherwise, check there are not annotations for multiple projects
-              else:
-                if int(args.project_id) != int(upload_project_id):
-                  fail('All annotation uids in the tsv must have the same original project id')
-
-              # Store the uid as it will need to be checked that it exists in the user defined project
-              user_project_uids.append(uid)
-        break
+      header = f.readline().rstrip('\r\n').split('\t')
   except Exception as e:
     fail('Failed to open tsv file. Check the file is valid. Error was: ' + str(e))
+  if len(header) <= coordinate_columns:
+    fail('The tsv header must contain ' + str(coordinate_columns) + ' coordinate columns followed by annotation uids')
+
+  # Get the uids of all the annotations in the tsv and determine their original project id. The uids may include the
+  # annotation version, as uid@version
+  upload_project_id = None
+  user_defined_project = False
+  header_annotations = []
+  for file_uid in header[coordinate_columns:]:
+    uid, _, version = file_uid.strip().partition('@')
+    header_annotations.append((file_uid, uid, version))
+    if uid in available_annotations:
+
+      # If this is the first uid in the tsv, set the upload_project_id to the original project id for this annotation
+      if not upload_project_id:
+        upload_project_id = available_annotations[uid]['original_project_id']
+
+      # Otherwise, check that this uid is for an annotation with the same original project id. The tsv file must
+      # contain annotations being uploaded to the same project
+      else:
+        if int(available_annotations[uid]['original_project_id']) != int(upload_project_id):
+          fail('All annotation uids in the tsv must have the same original project id')
+
+    # Private or custom annotations will not be in the globals projects. In this case, the user will need to supply the
+    # project id to upload annotations to
+    else:
+
+      # If no project id is set, fail
+      if not args.project_id:
+        fail('Annotation with uid ' + str(uid) + ' is not from the GRCh37 or GRCh38 annotation projects. Please supply the project id (-p) to upload annotations to')
+
+      # If this is the first annotation, set the upload_project_id to the id provided by the user
+      if not upload_project_id:
+        upload_project_id = args.project_id
+        user_defined_project = True
+
+      # Otherwise, check there are not annotations for multiple projects
+      else:
+        if int(args.project_id) != int(upload_project_id):
+          fail('All annotation uids in the tsv must have the same original project id')
 
   # If there is no upload_project_id, it is unknown which project to upload to
   if not upload_project_id:
@@ -85,47 +94,281 @@ def main():
   # Otherwise open this project ready for annotation upload
   project = api_mosaic.get_project(upload_project_id)
 
-  # If the annotations are being uploaded to a user defined project, ensure the annotations exist
+  # If the annotations are being uploaded to a user defined project, the annotations must exist in that project
+  project_annotations = available_annotations
   if user_defined_project:
-    existing_uids = {}
-
-    # Get all the annotations in the project
+    project_annotations = {}
     for annotation in project.get_variant_annotations():
-      existing_uids[annotation['uid']] = {'id': annotation['id'], 'versions': annotation['annotation_versions']}
-
-    # Check all the required annotations exist. Note that the annotation uid may contain the version id. If
-    # this is the case, also check that the version exists
-    for file_uid in user_project_uids:
-
-      # Trim leading or traling spaces
-      file_uid = file_uid.lstrip().rstrip()
-      uid = file_uid
-      version = None
-      if '@' in file_uid:
-        uid = uid.split('@')[0]
-        version = file_uid.split('@')[1]
-      if uid not in existing_uids:
-        fail('Annotation with uid ' + str(uid) + ' does not exist in the project specified with -p')
-
-      # If there is a defined version, check that the version exists
-      has_version = False
-      if version:
-        for version_info in existing_uids[uid]['versions']:
-          if str(version) == str(version_info['version']):
-            has_version = True
-            break
-        if not has_version:
-          fail('Annotation with uid ' + str(uid) + ' does not have a version with the name ' + str(version))
-
-  # Upload the variant annotations
+      project_annotations[annotation['uid']] = annotation
+
+  # Check all the annotations exist and, if the header includes the version, that the version exists. Store the type
+  # of each annotation column for validation
+  value_types = []
+  for file_uid, uid, version in header_annotations:
+    if uid not in project_annotations:
+      fail('Annotation with uid ' + str(uid) + ' does not exist in the project specified with -p')
+    annotation = project_annotations[uid]
+    if version:
+      versions = [str(version_info['version']) for version_info in annotation.get('annotation_versions', [])]
+      if str(version) not in versions:
+        fail('Annotation with uid ' + str(uid) + ' does not have a version with the name ' + str(version))
+    value_types.append(annotation.get('value_type'))
+
+  # Check the contents of the tsv before uploading, so a bad file is rejected here rather than by a failed upload job
+  if not args.skip_validation:
+    errors = validate_tsv(args.tsv, len(header), value_types, args.workers)
+    if errors:
+      for line_number, message in errors:
+        print('  line ', line_number, ': ', message, sep = '')
+      fail('The tsv file ' + str(args.tsv) + ' is not valid (showing at most ' + str(max_errors) + ' errors)')
+    print('The tsv file ', args.tsv, ' is valid', sep = '')
+  if args.validate_only:
+    return
+
+  # Upload the variant annotations, in chunks if requested
   allow_deletion = 'true' if args.allow_deletion else 'false'
   disable_successful_notification = 'true' if args.disable_successful_notification else 'false'
+  if args.chunk_lines or args.resume:
+    upload_chunks(api_mosaic, project, args, allow_deletion, disable_successful_notification)
+    return
   try:
     data = project.post_annotation_file(args.tsv, allow_deletion = allow_deletion, disable_successful_notification = disable_successful_notification)
     print(data['message'], '. Annotation upload job id: ', data['redis_job_id'], ', file: ', args.tsv, sep = '')
   except Exception as e:
     fail('Failed to upload annotations. Error was: ' + str(e))
 
+# Upload the tsv as a set of smaller tsv files (chunks), each holding chunk_lines lines of the original and the header.
+# The chunks are uploaded concurrently and each upload job is followed until it completes or fails. The state of every
+# chunk is kept in a file in the chunk directory, so that a run that was interrupted, or had chunks that failed, can be
+# continued with --resume, which only uploads the chunks that have not already completed
+def upload_chunks(api_mosaic, project, args, allow_deletion, disable_successful_notification):
+  chunk_dir = args.chunk_dir if args.chunk_dir else args.tsv + '.chunks'
+  state_file = os.path.join(chunk_dir, 'upload_state.json')
+  if args.resume:
+    if not os.path.exists(state_file):
+      fail('There is no chunked upload to resume in ' + str(chunk_dir))
+    with open(state_file) as f:
+      state = json.load(f)
+    if state['tsv_size'] != os.path.getsize(args.tsv):
+      fail('The tsv file has changed since its chunks were created in ' + str(chunk_dir))
+    if int(state['project_id']) != int(project.id):
+      fail('The chunks in ' + str(chunk_dir) + ' were uploaded to project ' + str(state['project_id']))
+  else:
+    if os.path.exists(state_file):
+      fail('A chunked upload already exists in ' + str(chunk_dir) + '. Use --resume to continue it, or remove the directory')
+    os.makedirs(chunk_dir, exist_ok = True)
+    state = {'tsv': os.path.abspath(args.tsv), 'tsv_size': os.path.getsize(args.tsv), 'project_id': project.id, 'chunk_lines': args.chunk_lines}
+    state['chunks'] = split_tsv(args.tsv, chunk_dir, args.chunk_lines)
+    write_state(state_file, state)
+    print('Split ', args.tsv, ' into ', len(state['chunks']), ' chunks in ', chunk_dir, sep = '')
+
+  # Upload every chunk that has not been uploaded, or whose upload or job failed. Annotation uploads overwrite existing
+  # values, so uploading a chunk again is safe
+  def upload_chunk(chunk):
+    try:
+      data = project.post_annotation_file(os.path.join(chunk_dir, chunk['file']), allow_deletion = allow_deletion, disable_successful_notification = disable_successful_notification)
+    except Exception as e:
+      warning('Failed to upload ' + chunk['file'] + '. Error was: ' + str(e))
+      return None
+    print('Uploaded ', chunk['file'], '. Annotation upload job id: ', data['redis_job_id'], sep = '')
+    return data['redis_job_id']
+
+  to_upload = [chunk for chunk in state['chunks'] if chunk['status'] in ['pending', 'upload_failed', 'failed', 'unknown']]
+  for chunk, job_id in run_in_parallel(upload_chunk, to_upload, args.workers):
+    chunk['job_id'] = job_id
+    chunk['status'] = 'waiting' if job_id else 'upload_failed'
+    write_state(state_file, state)
+
+  # Follow the jobs until they have all finished, then report
+  track_jobs(api_mosaic, state, state_file)
+  print_chunk_report(state)
+  incomplete = [chunk for chunk in state['chunks'] if chunk['status'] != 'completed']
+  if incomplete:
+    fail(str(len(incomplete)) + ' of ' + str(len(state['chunks'])) + ' chunks did not complete. Run again with --resume to upload them again')
+
+# Split the tsv into chunk files of chunk_lines lines, each starting with the header. Returns the state of each chunk
+def split_tsv(tsv, chunk_dir, chunk_lines):
+  chunks = []
+  name = os.path.basename(tsv)
+  name = name[:-4] if name.endswith('.tsv') else name
+  chunk = None
+  with open(tsv, 'rb') as f:
+    header = f.readline()
+    for line in f:
+      if not chunk or chunks[-1]['lines'] == chunk_lines:
+        if chunk:
+          chunk.close()
+        chunks.append({'file': name + '.chunk_' + str(len(chunks) + 1).zfill(4) + '.tsv', 'lines': 0, 'job_id': None, 'status': 'pending'})
+        chunk = open(os.path.join(chunk_dir, chunks[-1]['file']), 'wb')
+        chunk.write(header)
+      chunk.write(line)
+      chunks[-1]['lines'] += 1
+  if chunk:
+    chunk.close()
+
+  return chunks
+
+# Write the upload state, replacing the previous state in a single step so an interrupted write cannot lose it
+def write_state(state_file, state):
+  with open(state_file + '.tmp', 'w') as f:
+    json.dump(state, f, indent = 2)
+  os.replace(state_file + '.tmp', state_file)
+
+# Check the status of the upload jobs until all have finished, reporting each change of status
+def track_jobs(api_mosaic, state, state_file):
+  pending = [chunk for chunk in state['chunks'] if chunk['job_id'] and chunk['status'] not in FINAL_JOB_STATUSES]
+  chunks = {chunk['job_id']: chunk for chunk in pending}
+  for job_id, status, job in api_mosaic.wait_for_jobs(chunks):
+    chunk = chunks[job_id]
+    if status != chunk['status']:
+      print(chunk['file'], ' (job ', job_id, '): ', status, sep = '')
+      chunk['status'] = status
+      write_state(state_file, state)
+
+# Print the number of chunks and lines with each status
+def print_chunk_report(state):
+  statuses = {}
+  for chunk in state['chunks']:
+    if chunk['status'] not in statuses:
+      statuses[chunk['status']] = {'chunks': 0, 'lines': 0}
+    statuses[chunk['status']]['chunks'] += 1
+    statuses[chunk['status']]['lines'] += chunk['lines']
+  print('Upload of ', state['tsv'], ':', sep = '')
+  for status in statuses:
+    print('  ', status, ': ', statuses[status]['chunks'], ' chunks, ', statuses[status]['lines'], ' lines', sep = '')
+  for chunk in state['chunks']:
+    if chunk['status'] != 'completed':
+      print('  ', chunk['file'], ' (job ', chunk['job_id'], '): ', chunk['status'], sep = '')
+
+# Validate the tsv, returning a list of up to max_errors (line number, message) pairs. The file is split into ranges of
+# whole lines that are validated independently (using several processes if workers is more than 1), each reading its
+# range a line at a time, so memory use does not depend on the size of the file. The ranges are then stitched together
+# to check the sort order across their boundaries
+def validate_tsv(tsv, columns, value_types, workers):
+  ranges = get_line_ranges(tsv, workers * 4 if workers > 1 else 1)
+  jobs = [(tsv, start, end, columns, value_types) for start, end in ranges]
+  if workers > 1:
+    with Pool(workers) as pool:
+      results = pool.starmap(validate_range, jobs)
+  else:
+    results = [validate_range(*job) for job in jobs]
+
+  # Convert the line numbers in each range to line numbers in the file (the header is line 1), and join up the runs of
+  # records on each chromosome
+  errors = []
+  runs = []
+  line_offset = 1
+  for result in results:
+    errors += [(line_offset + line, message) for line, message in result['errors']]
+    for chromosome, first_start, last_start, first_line in result['runs']:
+      first_line += line_offset
+      if runs and runs[-1][0] == chromosome:
+        if first_start < runs[-1][2]:
+          errors.append((first_line, 'Records are not sorted: start ' + str(first_start) + ' follows ' + str(runs[-1][2]) + ' on chromosome ' + chromosome))
+        runs[-1][2] = last_start
+      else:
+        runs.append([chromosome, first_start, last_start, first_line])
+    line_offset += result['lines']
+
+  # Each chromosome must be in a single block of the file
+  seen = set()
+  for chromosome, _, _, first_line in runs:
+    if chromosome in seen:
+      errors.append((first_line, 'Records are not sorted: chromosome ' + chromosome + ' appears again after other chromosomes'))
+    seen.add(chromosome)
+
+  return sorted(errors)[:max_errors]
+
+# Split the body of the tsv (everything after the header) into about the requested number of byte ranges, each starting
+# at the beginning of a line
+def get_line_ranges(tsv, number):
+  size = os.path.getsize(tsv)
+  with open(tsv, 'rb') as f:
+    f.readline()
+    boundaries = [f.tell()]
+    step = max(1, (size - boundaries[0]) // number)
+    for i in range(1, number):
+      position = boundaries[0] + i * step
+      if position <= boundaries[-1]:
+        continue
+      f.seek(position - 1)
+      f.readline()
+      if f.tell() >= size:
+        break
+      boundaries.append(f.tell())
+  boundaries.append(size)
+
+  return [(boundaries[i], boundaries[i + 1]) for i in range(len(boundaries) - 1) if boundaries[i] < boundaries[i + 1]]
+
+# Validate the lines in a byte range of the tsv. Returns the number of lines, errors (with line numbers relative to the
+# start of the range), and the runs of consecutive records on the same chromosome as (chromosome, first start, last
+# start, first line), which are used to check the sort order between ranges
+def validate_range(tsv, start, end, columns, value_types):
+  result = {'lines': 0, 'errors': [], 'runs': []}
+  errors = result['errors']
+  runs = result['runs']
+  with open(tsv, 'rb') as f:
+    f.seek(start)
+    position = start
+    while position < end:
+      line = f.readline()
+      if not line:
+        break
+      position += len(line)
+      result['lines'] += 1
+      line_number = result['lines']
+      if len(errors) >= max_errors:
+        continue
+
+      fields = line.decode(errors = 'replace').rstrip('\r\n').split('\t')
+      if len(fields) != columns:
+        errors.append((line_number, 'Expected ' + str(columns) + ' columns, found ' + str(len(fields))))
+        continue
+
+      # Check the coordinates
+      chromosome, record_start, record_end, ref, alt = fields[:coordinate_columns]
+      if not chromosome or chromosome != chromosome.strip():
+        errors.append((line_number, 'Invalid chromosome "' + chromosome + '"'))
+        continue
+      try:
+        record_start = int(record_start)
+        record_end = int(record_end)
+      except ValueError:
+        errors.append((line_number, 'Start and end must be integers, found "' + fields[1] + '" and "' + fields[2] + '"'))
+        continue
+      if record_start < 0 or record_end < record_start:
+        errors.append((line_number, 'Invalid coordinates: start ' + str(record_start) + ', end ' + str(record_end)))
+      if not allele_pattern.match(ref) or not allele_pattern.match(alt):
+        errors.append((line_number, 'Invalid ref or alt: "' + ref + '", "' + alt + '"'))
+
+      # Check the records are sorted within the range
+      if runs and runs[-1][0] == chromosome:
+        if record_start < runs[-1][2]:
+          errors.append((line_number, 'Records are not sorted: start ' + str(record_start) + ' follows ' + str(runs[-1][2]) + ' on chromosome ' + chromosome))
+        runs[-1][2] = record_start
+      else:
+        runs.append([chromosome, record_start, record_start, line_number])
+
+      # Check the values have the type of their annotation. Empty values are allowed
+      for index, value in enumerate(fields[coordinate_columns:]):
+        if value and not is_valid_value(value, value_types[index]):
+          errors.append((line_number, 'Value "' + value + '" in column ' + str(index + coordinate_columns + 1) + ' is not a valid ' + str(value_types[index])))
+          break
+
+  return result
+
+# Check a value is valid for an annotation's value_type
+def is_valid_value(value, value_type):
+  try:
+    if value_type == 'float':
+      float(value)
+    elif value_type == 'integer':
+      int(value)
+  except ValueError:
+    return False
+
+  return True
+
 # Input options
 def parse_command_line():
   parser, groups = base_parser()
@@ -140,6 +383,16 @@ def parse_command_line():
   optional_arguments.add_argument('--allow_deletion', '-d', required = False, action = 'store_true', help = 'If tsv file contains blank annotation, overwrite the existing value in the database will null. Default: false')
   optional_arguments.add_argument('--disable_successful_notification', '-n', required = False, action = 'store_false', help = 'Only send notifications if the upload fails. Default: true')
 
+  # Validation of the tsv before upload
+  optional_arguments.add_argument('--validate_only', '-vo', required = False, action = 'store_true', help = 'Validate the tsv file, but do not upload it')
+  optional_arguments.add_argument('--skip_validation', '-sv', required = False, action = 'store_true', help = 'Upload the tsv file without validating it first')
+  optional_arguments.add_argument('--workers', '-w', required = False, type = int, default = 1, metavar = 'integer', help = 'The number of processes to use to validate the tsv file, and the number of chunks to upload at once (default: 1)')
+
+  # Upload the tsv in chunks
+  optional_arguments.add_argument('--chunk_lines', '-cl', required = False, type = int, metavar = 'integer', help = 'Upload the tsv as chunks of this many lines, each with the header, and follow each upload job to completion')
+  optional_arguments.add_argument('--chunk_dir', '-cd', required = False, metavar = 'string', help = 'The directory to write the chunks and the upload state to. Default: the tsv file name with .chunks appended')
+  optional_arguments.add_argument('--resume', '-r', required = False, action = 'store_true', help = 'Continue a chunked upload, uploading only the chunks that have not completed')
+
   return parser.parse_args()
 
 if __name__ == "__main__":
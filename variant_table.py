@@ -0,0 +1,377 @@
+"""
+Hold the variants of a project in a compact, columnar table, rather than as a dict per
+variant, so that millions of variants fit comfortably in memory.
+
+Each integer column (the variant id, start, end and length) is a typed array, and each
+string column (chr, ref, alt and var_type) is an array of indexes into a table of the
+distinct strings in that column, so repeated values, e.g. the chromosome names, are only
+stored once:
+
+    from variant_table import VariantTable
+
+    table = VariantTable.from_variants(project.get_project_variants_list())
+    table.write_tsv('variants.tsv')
+    table.write_binary('variants.mvt')
+
+    table = VariantTable.read_binary('variants.mvt')
+    other = VariantTable.read_binary('other_project.mvt')
+    shared = set(table.keys()) & set(other.keys())
+
+Only the columns below are kept; any other fields of the variants are dropped.
+
+PositionIndex keeps a table sorted by position, so variants can be found by position with
+a binary search instead of a call to Project.get_variant_by_position for each. It is saved
+to disk in the binary format, and refresh() adds the variants created since it was built:
+
+    index = PositionIndex.load('project_12.mvt') if os.path.exists('project_12.mvt') else PositionIndex.build(project)
+    index.refresh(project)
+    index.save('project_12.mvt')
+    variant_ids = index.lookup('1', 69134, 'A', 'G')
+
+The binary format is the magic bytes MVT1, the length of a json header as an unsigned
+32-bit little endian integer, the json header itself, which gives the number of rows and,
+for each column, its name, array type code and (for string columns) its strings, and then
+the data of each column in turn, as little endian arrays.
+"""
+
+import bisect
+import json
+import struct
+import sys
+
+from array import array
+
+# The columns, and whether each holds integers or strings
+INTEGER_COLUMNS = ['id', 'r_start', 'r_end', 'length']
+STRING_COLUMNS = ['chr', 'ref', 'alt', 'var_type']
+COLUMNS = ['id', 'chr', 'r_start', 'r_end', 'ref', 'alt', 'var_type', 'length']
+
+_MAGIC = b'MVT1'
+
+
+class VariantTable(object):
+    def __init__(self):
+        self._integers = {name: array('q') for name in INTEGER_COLUMNS}
+        self._indexes = {name: array('I') for name in STRING_COLUMNS}
+        self._strings = {name: [] for name in STRING_COLUMNS}
+        self._string_ids = {name: {} for name in STRING_COLUMNS}
+
+
+    def __len__(self):
+        return len(self._integers['id'])
+
+
+    def __repr__(self):
+        return f'VariantTable({len(self)} variants)'
+
+
+    @classmethod
+    def from_variants(cls, variants):
+        """
+        Build a table from an iterable of variant dicts, e.g. the pages streamed by
+        Project.get_project_variants_list. Only one variant is held as a dict at a time.
+        """
+        table = cls()
+        for variant in variants:
+            table.append(variant)
+
+        return table
+
+
+    def append(self, variant):
+        for name in INTEGER_COLUMNS:
+            self._integers[name].append(int(variant[name]))
+        for name in STRING_COLUMNS:
+            value = variant[name]
+            string_ids = self._string_ids[name]
+            if value not in string_ids:
+                string_ids[value] = len(self._strings[name])
+                self._strings[name].append(value)
+            self._indexes[name].append(string_ids[value])
+
+
+    def column(self, name):
+        """
+        Return a column as a list of values.
+        """
+        if name in self._integers:
+            return self._integers[name].tolist()
+        strings = self._strings[name]
+
+        return [strings[index] for index in self._indexes[name]]
+
+
+    def row(self, i):
+        """
+        Return row i as a dict, like those of get_project_variants_list.
+        """
+        return {name: self._value(name, i) for name in COLUMNS}
+
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.row(i)
+
+
+    def keys(self):
+        """
+        Yield (chr, r_start, ref, alt) for each variant, for comparing the variants of
+        different tables.
+        """
+        chromosomes, refs, alts = self._strings['chr'], self._strings['ref'], self._strings['alt']
+        for chromosome, start, ref, alt in zip(self._indexes['chr'], self._integers['r_start'], self._indexes['ref'], self._indexes['alt']):
+            yield chromosomes[chromosome], start, refs[ref], alts[alt]
+
+
+    def take(self, rows):
+        """
+        Return a new table holding the given rows, in the given order.
+        """
+        table = VariantTable()
+        for name in INTEGER_COLUMNS:
+            column = self._integers[name]
+            table._integers[name] = array('q', (column[i] for i in rows))
+        for name in STRING_COLUMNS:
+            column = self._indexes[name]
+            table._indexes[name] = array('I', (column[i] for i in rows))
+            table._strings[name] = list(self._strings[name])
+            table._string_ids[name] = dict(self._string_ids[name])
+
+        return table
+
+
+    def _value(self, name, i):
+        if name in self._integers:
+            return self._integers[name][i]
+
+        return self._strings[name][self._indexes[name][i]]
+
+
+    def write_tsv(self, destination):
+        """
+        Write the table as a tsv with a header line to a path or text file object.
+        """
+        output = open(destination, 'w') if isinstance(destination, str) else destination
+        try:
+            output.write('\t'.join(COLUMNS) + '\n')
+            columns = [self._integers[name] if name in self._integers else _StringColumn(self._strings[name], self._indexes[name]) for name in COLUMNS]
+            for i in range(len(self)):
+                output.write('\t'.join(str(column[i]) for column in columns) + '\n')
+        finally:
+            if output is not destination:
+                output.close()
+
+
+    def write_binary(self, destination):
+        """
+        Write the table in the binary columnar format to a path or binary file object.
+        """
+        header = {'rows': len(self), 'columns': []}
+        data = []
+        for name in COLUMNS:
+            if name in self._integers:
+                values = self._integers[name]
+                header['columns'].append({'name': name, 'type': values.typecode})
+            else:
+                values = self._indexes[name]
+                header['columns'].append({'name': name, 'type': values.typecode, 'strings': self._strings[name]})
+            data.append(_little_endian(values))
+        header = json.dumps(header).encode()
+
+        output = open(destination, 'wb') if isinstance(destination, str) else destination
+        try:
+            output.write(_MAGIC + struct.pack('<I', len(header)) + header)
+            for values in data:
+                if output is destination:
+                    output.write(values.tobytes())
+                else:
+                    values.tofile(output)
+        finally:
+            if output is not destination:
+                output.close()
+
+
+    @classmethod
+    def read_binary(cls, source):
+        """
+        Read a table written by write_binary from a path or binary file object.
+        """
+        input_file = open(source, 'rb') if isinstance(source, str) else source
+        try:
+            if input_file.read(4) != _MAGIC:
+                raise ValueError(f'{source} is not a variant table')
+            header_length = struct.unpack('<I', input_file.read(4))[0]
+            header = json.loads(input_file.read(header_length))
+
+            table = cls()
+            for column in header['columns']:
+                values = array(column['type'])
+                values.frombytes(input_file.read(values.itemsize * header['rows']))
+                if len(values) != header['rows']:
+                    raise ValueError(f'{source} is truncated')
+                values = _little_endian(values)
+                name = column['name']
+                if name in table._integers:
+                    table._integers[name] = values
+                else:
+                    table._indexes[name] = values
+                    table._strings[name] = column['strings']
+                    table._string_ids[name] = {value: i for i, value in enumerate(column['strings'])}
+        finally:
+            if input_file is not source:
+                input_file.close()
+
+        return table
+
+
+class PositionIndex(object):
+    """
+    A VariantTable sorted by chromosome and start, with the rows of each chromosome
+    found by binary search.
+    """
+    def __init__(self, table):
+        self.table = table
+        self._chromosomes = {}
+        chromosomes = table._indexes['chr']
+        strings = table._strings['chr']
+        first = 0
+        for i in range(1, len(table) + 1):
+            if i == len(table) or chromosomes[i] != chromosomes[first]:
+                self._chromosomes[strings[chromosomes[first]]] = (first, i)
+                first = i
+
+
+    def __len__(self):
+        return len(self.table)
+
+
+    def __repr__(self):
+        return f'PositionIndex({len(self)} variants)'
+
+
+    @classmethod
+    def build(cls, project):
+        """
+        Build the index from all the variants in a project.
+        """
+        return cls.from_table(VariantTable.from_variants(project.get_project_variants_list()))
+
+
+    @classmethod
+    def from_table(cls, table):
+        # Sort on a single integer per row (the chromosome's rank, then the start) to keep
+        # the memory needed for sorting small
+        strings = table._strings['chr']
+        ranks = {index: rank for rank, index in enumerate(sorted(range(len(strings)), key=lambda index: str(strings[index])))}
+        chromosomes, starts = table._indexes['chr'], table._integers['r_start']
+        rows = sorted(range(len(table)), key=lambda i: (ranks[chromosomes[i]] << 40) + starts[i])
+
+        return cls(table.take(rows))
+
+
+    @classmethod
+    def load(cls, path):
+        return cls(VariantTable.read_binary(path))
+
+
+    def save(self, path):
+        self.table.write_binary(path)
+
+
+    def refresh(self, project):
+        """
+        Add the variants created in the project since the index was built or last
+        refreshed, and return the number added. Variants are requested newest first, and
+        requests stop once a variant already in the index has been followed by an older
+        one, confirming the order. A ValueError is raised if the variants do not arrive
+        newest first, rather than missing new variants. Deleted variants are not removed;
+        build a new index to remove them.
+        """
+        ids = self.table._integers['id']
+        newest = max(ids) if ids else None
+        table = self.table.take(range(len(self.table)))
+        added = 0
+        previous = None
+        for variant in project.get_project_variants_list(order_by='id', order_dir='desc'):
+            variant_id = int(variant['id'])
+            if previous is not None and variant_id > previous:
+                raise ValueError('The variants were not returned newest first, so the index cannot be refreshed')
+            if previous is not None and newest is not None and previous <= newest:
+                break
+            previous = variant_id
+            if newest is None or variant_id > newest:
+                table.append(variant)
+                added += 1
+        if added:
+            index = PositionIndex.from_table(table)
+            self.table, self._chromosomes = index.table, index._chromosomes
+
+        return added
+
+
+    def _rows(self, chromosome, start, end):
+        """
+        Return the range of rows on chromosome with start <= r_start <= end. A 'chr'
+        prefix is ignored if the index does not use one.
+        """
+        chromosome = str(chromosome)
+        if chromosome not in self._chromosomes:
+            chromosome = chromosome[3:] if chromosome.startswith('chr') else 'chr' + chromosome
+            if chromosome not in self._chromosomes:
+                return range(0)
+        first, last = self._chromosomes[chromosome]
+        starts = self.table._integers['r_start']
+
+        return range(bisect.bisect_left(starts, start, first, last), bisect.bisect_right(starts, end, first, last))
+
+
+    def lookup(self, chromosome, start, ref=None, alt=None):
+        """
+        Return the ids of the variants at start (r_start) on chromosome, only including
+        those with the given ref and alt, if they are given.
+        """
+        table = self.table
+        ids = []
+        for i in self._rows(chromosome, start, start):
+            if ref is not None and table._value('ref', i) != ref:
+                continue
+            if alt is not None and table._value('alt', i) != alt:
+                continue
+            ids.append(table._integers['id'][i])
+
+        return ids
+
+
+    def lookup_many(self, variants):
+        """
+        Look up (chr, start, ref, alt) tuples, returning a dictionary from each to the list
+        of matching variant ids.
+        """
+        return {variant: self.lookup(*variant) for variant in variants}
+
+
+    def range(self, chromosome, start, end):
+        """
+        Yield the variants (as dicts) with start <= r_start <= end on chromosome, in order.
+        """
+        for i in self._rows(chromosome, start, end):
+            yield self.table.row(i)
+
+
+# Index access to a string column, for writing rows
+class _StringColumn(object):
+    def __init__(self, strings, indexes):
+        self.strings = strings
+        self.indexes = indexes
+
+    def __getitem__(self, i):
+        return self.strings[self.indexes[i]]
+
+
+# Arrays are stored little endian. Swapping is its own inverse, so this converts in both directions
+def _little_endian(values):
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+
+    return values
@@ -18,18 +18,31 @@ def main():
   except Exception as e:
     fail('failed to open project. Error was: ' + str(e))
 
-  # Get the variants
+  # Stream the variants to the output file. The file is gzipped if requested, or if its name ends with .gz
+  compress = args.gzip or args.tsv.endswith('.gz')
+  if args.resume and compress:
+    fail('--resume cannot be used with a gzipped output file')
   try:
-    with open(args.tsv, "wb") as f:
-      f.write(project.get_download_variants_tsv())
+    written = project.download_variants_tsv(args.tsv, resume = args.resume, compress = compress, progress = print_progress if args.progress else None)
   except Exception as e:
     fail('failed to get variants. Error was: ' + str(e))
+  if args.progress:
+    print()
+  print('Downloaded ', written, ' bytes to ', args.tsv, sep = '')
+
+# Print the progress of the download over the previous line
+def print_progress(written, total, bytes_per_second):
+  message = 'Downloaded ' + str(round(written / 1048576, 1)) + ' MB'
+  if total:
+    message += ' of ' + str(round(total / 1048576, 1)) + ' MB'
+  print('\r', message, ' (', round(bytes_per_second / 1048576, 2), ' MB/s)', sep = '', end = '', flush = True)
 
 # Input options
 def parse_command_line():
   parser, groups = base_parser()
   project_arguments = groups.project
   required_arguments = groups.required
+  optional_arguments = groups.optional
 
   # The project id to which the filter is to be added is required
   project_arguments.add_argument('--project_id', '-p', required = True, metavar = 'integer', help = 'The Mosaic project id to download variants for')
@@ -37,6 +50,11 @@ def parse_command_line():
   # The output file
   required_arguments.add_argument('--tsv', '-t', required = True, metavar = 'string', help = 'The output tsv file')
 
+  # Download options
+  optional_arguments.add_argument('--gzip', '-z', required = False, action = 'store_true', help = 'Gzip the output. This is also done if the output file name ends with .gz')
+  optional_arguments.add_argument('--resume', '-r', required = False, action = 'store_true', help = 'Continue a download that was interrupted, rather than starting again')
+  optional_arguments.add_argument('--progress', '-g', required = False, action = 'store_true', help = 'Show the progress and rate of the download')
+
   return parser.parse_args()
 
 if __name__ == "__main__":
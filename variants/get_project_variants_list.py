@@ -4,6 +4,7 @@ from pprint import pprint
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 from _bootstrap import base_parser, init, fail
+from variant_table import VariantTable
 
 def main():
 
@@ -18,6 +19,19 @@ def main():
   except Exception as e:
     fail('failed to open project. Error was: ' + str(e))
 
+  # Export the variants to a file, holding them in a compact table rather than as a dict per variant
+  if args.output:
+    try:
+      table = VariantTable.from_variants(project.get_project_variants_list())
+    except Exception as e:
+      fail('failed to get variants. Error was: ' + str(e))
+    if args.format == 'binary':
+      table.write_binary(args.output)
+    else:
+      table.write_tsv(args.output)
+    print('Wrote ', len(table), ' variants to ', args.output, sep = '')
+    return
+
   # Get the variants
   try:
     for variant in project.get_project_variants_list():
@@ -28,11 +42,16 @@ def main():
 
 # Input options
 def parse_command_line():
-  parser, _ = base_parser()
+  parser, groups = base_parser()
+  optional_arguments = groups.optional
 
   # The project id to which the filter is to be added is required
   parser.add_argument('--project_id', '-p', required = True, metavar = 'integer', help = 'The Mosaic project id to add variant filters to')
 
+  # Export the variants to a file instead of printing them
+  optional_arguments.add_argument('--output', '-o', required = False, metavar = 'string', help = 'Write the variants to this file rather than printing them')
+  optional_arguments.add_argument('--format', '-f', required = False, default = 'tsv', choices = ['tsv', 'binary'], help = 'The format of the output file: tsv, or binary (a compact columnar format that can be read with variant_table.VariantTable.read_binary). Default: tsv')
+
   return parser.parse_args()
 
 if __name__ == "__main__":
@@ -4,6 +4,7 @@ from pprint import pprint
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 from _bootstrap import base_parser, init, fail
+from variant_table import PositionIndex
 
 def main():
 
@@ -15,21 +16,62 @@ def main():
   # Open an api client project object for the defined project
   project = api_mosaic.get_project(args.project_id)
 
+  # With a local position index, look up the variants without further requests. The index is built if it does not
+  # exist, and otherwise brought up to date with any new variants in the project
+  if args.index:
+    if os.path.exists(args.index):
+      index = PositionIndex.load(args.index)
+      added = index.refresh(project)
+    else:
+      index = PositionIndex.build(project)
+      added = len(index)
+    if added:
+      index.save(args.index)
+
+    # Get the positions to look up, from the command line or a file of chromosome, position, and optionally ref and alt
+    positions = []
+    if args.chromosome and args.position:
+      positions.append((args.chromosome, int(args.position), args.ref, args.alt))
+    if args.positions_file:
+      try:
+        with open(args.positions_file) as f:
+          for line in f:
+            fields = line.rstrip('\r\n').split('\t')
+            if line.strip() and not line.startswith('#'):
+              positions.append((fields[0], int(fields[1]), fields[2] if len(fields) > 2 and fields[2] else None, fields[3] if len(fields) > 3 and fields[3] else None))
+      except (OSError, ValueError, IndexError) as e:
+        fail('Failed to read the positions file. Error was: ' + str(e))
+    if not positions:
+      fail('A chromosome and position (--chromosome, --position) or a positions file (--positions_file) is required')
+    for chromosome, position, ref, alt in positions:
+      variant_ids = index.lookup(chromosome, position, ref, alt)
+      print(chromosome, position, ref if ref else '', alt if alt else '', ','.join([str(variant_id) for variant_id in variant_ids]), sep = '\t')
+    return
+
   # Build the coordinates of the variant
+  if not args.chromosome or not args.position:
+    fail('A chromosome (--chromosome) and position (--position) are required')
   chromosome = args.chromosome.replace('chr', '') if 'chr' in args.chromosome else args.chromosome
   variant_position = str(chromosome) + ':' + str(args.position)
   print(project.get_variant_by_position(variant_position))
 
 # Input options
 def parse_command_line():
-  parser, _ = base_parser()
+  parser, groups = base_parser()
+  optional_arguments = groups.optional
 
   # The project id to which the filter is to be added is required
   parser.add_argument('--project_id', '-p', required = True, metavar = 'integer', help = 'The Mosaic project id to add variant filters to')
 
   # Get the chromosome and coordiante of the variant
-  parser.add_argument('--chromosome', '-r', required = True, metavar = 'string', help = 'The chromosome, the variant is on')
-  parser.add_argument('--position', '-o', required = True, metavar = 'integer', help = 'The variants position')
+  parser.add_argument('--chromosome', '-r', required = False, metavar = 'string', help = 'The chromosome, the variant is on')
+  parser.add_argument('--position', '-o', required = False, metavar = 'integer', help = 'The variants position')
+
+  # Look up variants in a local index of the project's variants rather than through the api
+  optional_arguments.add_argument('--index', '-i', required = False, metavar = 'string', help = 'A local position index file for the project, which is created if it does not exist and updated if it does. Variant ids are then looked up locally')
+  optional_arguments.add_argument('--ref', '-f', required = False, metavar = 'string', help = 'Only return variants with this ref (with --index)')
+  optional_arguments.add_argument('--alt', '-l', required = False, metavar = 'string', help = 'Only return variants with this alt (with --index)')
+  optional_arguments.add_argument('--positions_file', '-s', required = False, metavar = 'string', help = 'A tab separated file of chromosome, position and optionally ref and alt, to look up with --index')
 
   return parser.parse_args()
 
@@ -3,7 +3,8 @@ import sys
 from pprint import pprint
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
-from _bootstrap import base_parser, init, fail
+from _bootstrap import base_parser, init, warning, fail
+from vcf_reader import read_vcf_header
 
 def main():
 
@@ -15,6 +16,23 @@ def main():
   # Open an api client project object for the defined project
   project = api_mosaic.get_project(args.project_id)
 
+  # Check the project and vcf file are ready for the upload
+  check_upload(api_mosaic, project, args.vcf, args.sample_map)
+
+  # Set the sample map and notifications
+  sample_map = args.sample_map if args.sample_map else None
+  notifications = 'false' if args.enable_notifications else 'true'
+
+  # Upload the variants
+  try:
+    data = project.post_variant_file(args.vcf, upload_type = args.method, disable_successful_notification = notifications, sample_map=sample_map)
+  except Exception as e:
+    fail('Failed to upload variants. Error: ' + str(e))
+
+# Check a project and vcf file are ready for the variants to be uploaded, failing if not. This is also used by
+# upload_variants_batch.py to check all of its uploads before starting any
+def check_upload(api_mosaic, project, vcf, sample_map):
+
   # Check if the project is in any collections and if so, if variants are turned on
   for collection_info in project.get_project()['member_of_collections']:
     collection = api_mosaic.get_project(collection_info['id'])
@@ -22,27 +40,37 @@ def main():
     if info['enable_variant_view']:
       fail('Collection "' + collection.name + '" has variants turned on. Please turn off prior to upload')
 
-  # Check the vcf files
+  # Check the vcf file exists and get the samples from its header
+  if not os.path.exists(vcf):
+    fail('Could not find file ' + vcf)
+  try:
+    vcf_samples = read_vcf_header(vcf).samples
+  except (OSError, ValueError) as e:
+    fail('Could not read the header of ' + vcf + ': ' + str(e))
+
+  # Check the vcf files attached to the project, and record their vcf sample names
   has_vcfs = False
-  for sample in project.get_samples():
-    for sample_file in project.get_sample_files(sample['id']):
+  vcf_sample_names = set()
+  sample_files = project.sample_file_index(file_types = ['vcf'])
+  for sample_id in sample_files.samples:
+    for sample_file in sample_files.by_sample_id(sample_id):
       if sample_file['type'] == 'vcf':
         if not sample_file['vcf_sample_name']:
           fail('Vcf file attached to the project does not have the vcf_sample_field set. This is required for the upload to complete')
+        vcf_sample_names.add(sample_file['vcf_sample_name'])
         has_vcfs = True
         break
-  if not has_vcfs and not args.sample_map:
+  if not has_vcfs and not sample_map:
     fail('project has no associated vcf files and so a sample map (--sample_map, -s) is required')
 
-  # Set the sample map and notifications
-  sample_map = args.sample_map if args.sample_map else None
-  notifications = 'false' if args.enable_notifications else 'true'
-
-  # Upload the variants
-  try:
-    data = project.post_variant_file(args.vcf, upload_type = args.method, disable_successful_notification = notifications, sample_map=sample_map)
-  except Exception as e:
-    fail('Failed to upload variants. Error: ' + str(e))
+  # Without a sample map, the samples in the vcf are matched to Mosaic samples using vcf_sample_name.
+  # Check this before uploading, rather than finding out once the upload has been processed
+  if not sample_map:
+    unmatched = [sample for sample in vcf_samples if sample not in vcf_sample_names]
+    if vcf_samples and len(unmatched) == len(vcf_samples):
+      fail('None of the samples in ' + vcf + ' match the vcf_sample_name of a vcf file attached to the project')
+    for sample in unmatched:
+      warning('Sample ' + sample + ' in ' + vcf + ' does not match the vcf_sample_name of any vcf file attached to the project')
 
 # Input options
 def parse_command_line():
@@ -0,0 +1,105 @@
+import os
+import sys
+
+from pprint import pprint
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from _bootstrap import base_parser, init, warning, fail
+from upload_scheduler import UploadScheduler
+from variants.upload_variants import check_upload
+
+def main():
+
+  # Parse the command line
+  args = parse_command_line()
+
+  api_mosaic = init(args)
+
+  # Read the uploads to perform
+  uploads = read_uploads(args.uploads)
+  if not uploads:
+    fail('No uploads are listed in ' + str(args.uploads))
+
+  # Check every project and vcf file before starting any uploads, so a problem with one upload is found before the
+  # others are in the queue
+  notifications = 'false' if args.enable_notifications else 'true'
+  scheduler = UploadScheduler(api_mosaic, max_depth = args.max_queue_depth, poll_interval = args.poll_interval)
+  for upload in uploads:
+    project = api_mosaic.get_project(upload['project_id'])
+    print('Checking ', upload['vcf'], ' for project ', project.name, ' (id:', project.id, ')', sep = '')
+    check_upload(api_mosaic, project, upload['vcf'], upload['sample_map'])
+    name = str(project.id) + ': ' + upload['vcf']
+    def post(project = project, upload = upload):
+      return project.post_variant_file(upload['vcf'], upload_type = args.method, disable_successful_notification = notifications, sample_map = upload['sample_map'])
+    scheduler.add(name, post, priority = upload['priority'])
+
+  # Start the uploads, only letting a new one in while the Mosaic queue is below the target depth
+  job_ids = []
+  for name, data, error in scheduler.run():
+    if error:
+      warning('Failed to upload variants for ' + name + '. Error: ' + str(error))
+    else:
+      job_id = data.get('redis_job_id') if isinstance(data, dict) else None
+      if job_id:
+        job_ids.append(job_id)
+      print('Uploaded ', name, '. Job id: ', job_id, sep = '')
+
+  # Report the throughput
+  summary = scheduler.summary()
+  print('Uploaded ', summary['uploaded'], ' files (', summary['failed'], ' failed) in ', round(summary['seconds']), ' seconds, ', round(summary['uploads_per_minute'], 2), ' per minute. ', round(summary['queue_wait_seconds']), ' seconds were spent waiting for the queue', sep = '')
+
+  # Optionally wait for all the upload jobs to finish
+  if args.wait and job_ids:
+    statuses = {}
+    for job_id, status, job in api_mosaic.wait_for_jobs(job_ids):
+      statuses[job_id] = status
+      print(job_id, ': ', status, sep = '')
+    failed = [job_id for job_id in job_ids if statuses[job_id] != 'completed']
+    if failed:
+      fail(str(len(failed)) + ' upload jobs did not complete: ' + ', '.join([str(job_id) for job_id in failed]))
+  if summary['failed']:
+    fail(str(summary['failed']) + ' uploads failed')
+
+# Read the tab separated uploads file. Each line holds a project id and a vcf file, and optionally a priority (uploads
+# with a higher priority start first) and a sample map. Blank lines and lines starting with # are ignored
+def read_uploads(filename):
+  uploads = []
+  try:
+    with open(filename) as f:
+      for line_number, line in enumerate(f, 1):
+        if not line.strip() or line.startswith('#'):
+          continue
+        fields = line.rstrip('\r\n').split('\t')
+        if len(fields) < 2:
+          fail('Line ' + str(line_number) + ' of ' + str(filename) + ' must contain a project id and a vcf file')
+        try:
+          priority = int(fields[2]) if len(fields) > 2 and fields[2] else 0
+        except ValueError:
+          fail('The priority on line ' + str(line_number) + ' of ' + str(filename) + ' must be an integer')
+        sample_map = fields[3] if len(fields) > 3 and fields[3] else None
+        uploads.append({'project_id': fields[0], 'vcf': fields[1], 'priority': priority, 'sample_map': sample_map})
+  except OSError as e:
+    fail('Failed to open the uploads file. Error was: ' + str(e))
+
+  return uploads
+
+# Input options
+def parse_command_line():
+  parser, groups = base_parser()
+  required_arguments = groups.required
+  optional_arguments = groups.optional
+
+  # The uploads to perform
+  required_arguments.add_argument('--uploads', '-u', required = True, metavar = 'string', help = 'A tab separated file with a line per upload: project id, vcf file, and optionally a priority (higher first) and a sample map')
+  required_arguments.add_argument('--method', '-m', required = True, metavar = 'string', help = 'The variant upload method: "allele, no-validation, position, raw, sv-no-validation"')
+  optional_arguments.add_argument('--enable_notifications', '-e', required = False, action = 'store_true', help = 'If set, notifications will be provided. Otherwise, notifications will only be provided for failures')
+
+  # Control of the Mosaic queue
+  optional_arguments.add_argument('--max_queue_depth', '-q', required = False, type = int, default = 20, metavar = 'integer', help = 'Only start an upload while fewer than this many jobs are waiting or active in the Mosaic queue. Default: 20')
+  optional_arguments.add_argument('--poll_interval', '-i', required = False, type = int, default = 30, metavar = 'integer', help = 'The number of seconds between checks of a full queue. Default: 30')
+  optional_arguments.add_argument('--wait', '-w', required = False, action = 'store_true', help = 'Wait for all the upload jobs to complete')
+
+  return parser.parse_args()
+
+if __name__ == "__main__":
+  main()
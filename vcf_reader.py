@@ -0,0 +1,381 @@
+"""
+Read vcf files from Python, without running bcftools or tabix.
+
+read_vcf_header() reads the header of a plain, gzipped or bgzipped vcf, stopping as soon
+as the #CHROM line is reached, so only the start of the file is ever decompressed:
+
+    from vcf_reader import read_vcf_header, VcfReader
+
+    header = read_vcf_header('family.vcf.gz')
+    print(header.samples)
+
+VcfReader looks up records in a bgzipped, tabix indexed vcf (e.g. the ClinVar vcf). The
+file and its index are opened once, and then any number of variants can be looked up:
+
+    clinvar = VcfReader('clinvar_20240101.vcf.gz')
+    records = clinvar.lookup([('1', 69134, 'A', 'G'), ('2', 1000, 'C', 'T')])
+    for record in records[('1', 69134, 'A', 'G')]:
+        print(record.info_fields().get('CLNSIG'))
+
+lookup() sorts the requested variants by position and serves each chromosome in a
+single pass through the file, only seeking forwards when the next variant is in a part
+of the file not yet reached. Thousands of lookups therefore cost about the same as
+reading the parts of the file that contain them.
+
+Only the Python standard library is used.
+"""
+
+import gzip
+import struct
+import zlib
+
+from collections import defaultdict, namedtuple
+
+# The size of the windows in the tabix linear index
+_LINEAR_SHIFT = 14
+
+
+class BgzfReader(object):
+    """
+    Random access to a BGZF compressed file (as written by bgzip) using the virtual
+    offsets stored in tabix indexes: the offset of a compressed block in the file,
+    shifted left 16 bits, plus the offset within the uncompressed block.
+    """
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._block_offset = 0
+        self._next_block_offset = 0
+        self._data = b''
+        self._position = 0
+
+
+    def close(self):
+        self._file.close()
+
+
+    def _read_block(self, block_offset):
+        """
+        Read the block at block_offset, returning False if there is none (the end of
+        the file). A block may hold no data, e.g. the end of file marker block, or
+        where bgzipped files have been concatenated, without being the end of the file.
+        """
+        self._file.seek(block_offset)
+        header = self._file.read(12)
+        if not header:
+            self._data = b''
+        else:
+            if len(header) < 12 or header[:4] != b'\x1f\x8b\x08\x04':
+                raise ValueError(f'Not a BGZF block at offset {block_offset} of {self._file.name}')
+
+            # The block size is held in the BC subfield of the gzip extra field
+            extra_length = struct.unpack('<H', header[10:12])[0]
+            extra = self._file.read(extra_length)
+            block_size = None
+            i = 0
+            while i < extra_length:
+                subfield_id = extra[i:i + 2]
+                subfield_length = struct.unpack('<H', extra[i + 2:i + 4])[0]
+                if subfield_id == b'BC':
+                    block_size = struct.unpack('<H', extra[i + 4:i + 6])[0] + 1
+                i += 4 + subfield_length
+            if block_size is None:
+                raise ValueError(f'BGZF block at offset {block_offset} of {self._file.name} has no block size')
+
+            compressed = self._file.read(block_size - 12 - extra_length - 8)
+            self._file.read(8)
+            self._data = zlib.decompress(compressed, -15)
+
+        self._block_offset = block_offset
+        self._next_block_offset = self._file.tell()
+        self._position = 0
+
+        return bool(header)
+
+
+    def seek(self, virtual_offset):
+        block_offset = virtual_offset >> 16
+        if block_offset != self._block_offset or not self._data:
+            self._read_block(block_offset)
+        self._position = virtual_offset & 0xFFFF
+
+
+    def tell(self):
+        return (self._block_offset << 16) | self._position
+
+
+    def readline(self):
+        """
+        Return the next line, including the newline, or b'' at the end of the file.
+        Lines can run across blocks.
+        """
+        parts = []
+        while True:
+            if self._position >= len(self._data):
+                if not self._read_block(self._next_block_offset):
+                    break
+                continue
+            end = self._data.find(b'\n', self._position)
+            if end == -1:
+                parts.append(self._data[self._position:])
+                self._position = len(self._data)
+            else:
+                parts.append(self._data[self._position:end + 1])
+                self._position = end + 1
+                break
+
+        return b''.join(parts)
+
+
+class TabixIndex(object):
+    """
+    A tabix (.tbi) index, giving the virtual offsets of the parts of a BGZF file that
+    can hold records overlapping a region.
+    """
+    def __init__(self, path):
+        with gzip.open(path, 'rb') as index_file:
+            data = index_file.read()
+
+        if data[:4] != b'TBI\x01':
+            raise ValueError(f'{path} is not a tabix index')
+        n_ref, _, _, _, _, meta, _, names_length = struct.unpack('<8i', data[4:36])
+        self.meta = chr(meta)
+        self.names = [name.decode() for name in data[36:36 + names_length].split(b'\x00') if name]
+        self._references = {name: i for i, name in enumerate(self.names)}
+
+        # Read the binning and linear index for each reference
+        self._bins = []
+        self._linear = []
+        offset = 36 + names_length
+        for _ in range(n_ref):
+            bins = {}
+            n_bin = struct.unpack('<i', data[offset:offset + 4])[0]
+            offset += 4
+            for _ in range(n_bin):
+                bin_number, n_chunk = struct.unpack('<Ii', data[offset:offset + 8])
+                offset += 8
+                chunks = struct.unpack(f'<{2 * n_chunk}Q', data[offset:offset + 16 * n_chunk])
+                offset += 16 * n_chunk
+                bins[bin_number] = list(zip(chunks[0::2], chunks[1::2]))
+            n_intv = struct.unpack('<i', data[offset:offset + 4])[0]
+            offset += 4
+            linear = struct.unpack(f'<{n_intv}Q', data[offset:offset + 8 * n_intv])
+            offset += 8 * n_intv
+            self._bins.append(bins)
+            self._linear.append(linear)
+
+
+    def contig(self, name):
+        """
+        Return the name used in the index for a chromosome, allowing for a 'chr' prefix
+        being present in one of the index or the name but not the other, or None.
+        """
+        name = str(name)
+        for candidate in (name, name[3:] if name.startswith('chr') else 'chr' + name):
+            if candidate in self._references:
+                return candidate
+
+        return None
+
+
+    def min_offset(self, contig, begin):
+        """
+        Return the lowest virtual offset that can hold a record overlapping the
+        0-based position begin on contig, or None if no record can.
+        """
+        if contig not in self._references:
+            return None
+        reference = self._references[contig]
+        linear = self._linear[reference]
+        window = begin >> _LINEAR_SHIFT
+        linear_offset = linear[min(window, len(linear) - 1)] if linear else 0
+
+        offsets = []
+        bins = self._bins[reference]
+        for bin_number in _region_to_bins(begin, begin + 1):
+            for chunk_begin, chunk_end in bins.get(bin_number, []):
+                if chunk_end > linear_offset:
+                    offsets.append(max(chunk_begin, linear_offset))
+
+        return min(offsets) if offsets else None
+
+
+# The bins that can hold records overlapping the 0-based, half open region [begin, end)
+def _region_to_bins(begin, end):
+    end -= 1
+    bins = [0]
+    for shift, first_bin in ((26, 1), (23, 9), (20, 73), (17, 585), (14, 4681)):
+        bins.extend(range(first_bin + (begin >> shift), first_bin + (end >> shift) + 1))
+
+    return bins
+
+
+class VcfHeader(namedtuple('VcfHeader', ['meta', 'columns', 'samples'])):
+    """
+    A vcf header: the ## meta information lines (without the leading ##), the column
+    names from the #CHROM line, and the sample names (the columns after FORMAT).
+    """
+    __slots__ = ()
+
+
+def read_vcf_header(path):
+    """
+    Return the VcfHeader of the plain or gzip/BGZF compressed vcf at path. Reading stops
+    at the #CHROM line. Raises ValueError if the file has no #CHROM line before the
+    first record.
+    """
+    with open(path, 'rb') as vcf_file:
+        is_compressed = vcf_file.read(2) == b'\x1f\x8b'
+
+    meta = []
+    with (gzip.open(path, 'rb') if is_compressed else open(path, 'rb')) as vcf_file:
+        for line in vcf_file:
+            line = line.decode().rstrip('\r\n')
+            if line.startswith('##'):
+                meta.append(line[2:])
+            elif line.startswith('#CHROM'):
+                columns = line[1:].split('\t')
+                return VcfHeader(meta, columns, columns[9:])
+            else:
+                break
+
+    raise ValueError(f'{path} does not have a vcf header (no #CHROM line)')
+
+
+class VcfRecord(namedtuple('VcfRecord', ['chrom', 'pos', 'id', 'ref', 'alt', 'qual', 'filter', 'info'])):
+    """
+    A vcf record, up to and including the INFO field, which is left unparsed. pos is
+    the 1-based vcf position.
+    """
+    __slots__ = ()
+
+    def info_fields(self):
+        """
+        Return the INFO field as a dictionary. Flags have the value True.
+        """
+        fields = {}
+        if self.info and self.info != '.':
+            for field in self.info.split(';'):
+                key, separator, value = field.partition('=')
+                fields[key] = value if separator else True
+
+        return fields
+
+
+def _parse_record(line):
+    fields = line.rstrip(b'\r\n').split(b'\t', 8)
+    if len(fields) < 8:
+        return None
+
+    return VcfRecord(fields[0].decode(), int(fields[1]), fields[2].decode(), fields[3].decode(), fields[4].decode(), fields[5].decode(), fields[6].decode(), fields[7].decode())
+
+
+class VcfReader(object):
+    """
+    A bgzipped vcf file and its tabix index, opened once for any number of lookups. The
+    index is taken from path + '.tbi' unless index_path is given.
+    """
+    def __init__(self, path, index_path=None):
+        self.path = path
+        self._index = TabixIndex(index_path if index_path else str(path) + '.tbi')
+        self._reader = BgzfReader(path)
+
+
+    def __repr__(self):
+        return f"VcfReader('{self.path}')"
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exception):
+        self.close()
+
+
+    def close(self):
+        self._reader.close()
+
+
+    def lookup(self, variants):
+        """
+        Look up (chr, pos, ref, alt) variants, where pos is the 1-based vcf position, and
+        return a dictionary from each variant to the list of records at that position with
+        that ref and alt. A record with several alts matches any of them.
+
+        The variants are sorted, and each chromosome is read in a single forward pass. A
+        variant given more than once is looked up once.
+        """
+        results = {}
+        by_contig = defaultdict(lambda: defaultdict(list))
+        for variant in dict.fromkeys(variants):
+            chrom, pos, ref, alt = variant
+            results[variant] = []
+            contig = self._index.contig(chrom)
+            if contig is not None:
+                by_contig[contig][int(pos)].append(variant)
+
+        for contig in by_contig:
+            positions = by_contig[contig]
+            for pos, records in self._sweep(contig, sorted(positions)):
+                for variant in positions[pos]:
+                    ref, alt = str(variant[2]), str(variant[3])
+                    for record in records:
+                        if record.ref == ref and alt in record.alt.split(','):
+                            results[variant].append(record)
+
+        return results
+
+
+    def fetch(self, chrom, pos):
+        """
+        Return all the records at the 1-based vcf position pos.
+        """
+        contig = self._index.contig(chrom)
+        if contig is None:
+            return []
+        for _, records in self._sweep(contig, [int(pos)]):
+            return records
+
+        return []
+
+
+    def _sweep(self, contig, positions):
+        """
+        For each of the sorted positions, yield the position and the records at that
+        position. Reading continues forwards from the previous position unless the index
+        shows the next position starts further on in the file, in which case the reader
+        seeks forwards to it.
+        """
+        reader = self._reader
+        pending = None
+        current = None
+        for pos in positions:
+            offset = self._index.min_offset(contig, pos - 1)
+            if offset is None:
+                yield pos, []
+                continue
+            if current is None or offset > current:
+                reader.seek(offset)
+                pending = None
+
+            # Read records until one is beyond the position. That record is kept for the
+            # next position
+            records = []
+            while True:
+                if pending is None:
+                    line = reader.readline()
+                    if not line:
+                        break
+                    if line.startswith(b'#'):
+                        continue
+                    pending = _parse_record(line)
+                    if pending is None:
+                        continue
+                if pending.chrom != contig or pending.pos > pos:
+                    break
+                if pending.pos == pos:
+                    records.append(pending)
+                pending = None
+            current = reader.tell()
+
+            yield pos, records